@@ -0,0 +1,32 @@
+"""Reference long completions in the blob store by hash
+
+Completions stored in the blob store have a NULL completion and the blob
+key in completion_hash, so completion becomes nullable. Columns added to
+the partitioned parent are added to every partition. Existing rows are
+moved to the blob store by scripts/offload_completions.py.
+
+Revision ID: 20261018_completion_blobs
+Revises: 20261018_partition_evaluations
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_completion_blobs'
+down_revision = '20261018_partition_evaluations'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('evaluations', sa.Column('completion_hash', sa.String(length=64), nullable=True))
+    op.add_column('evaluations', sa.Column('completion_size', sa.Integer(), nullable=True))
+    op.alter_column('evaluations', 'completion', existing_type=sa.Text(), nullable=True)
+
+def downgrade() -> None:
+    # Blob-stored completions must be inlined again first (offload_completions.py --restore)
+    op.execute("UPDATE evaluations SET completion = '' WHERE completion IS NULL")
+    op.alter_column('evaluations', 'completion', existing_type=sa.Text(), nullable=False)
+    op.drop_column('evaluations', 'completion_size')
+    op.drop_column('evaluations', 'completion_hash')
@@ -0,0 +1,31 @@
+"""Record detached evaluations partitions
+
+The archive job detaches expired partitions in one transaction and
+archives and drops them in later ones. Detached partitions are recorded
+here so a run that fails midway is resumed from this table, rather than
+from table names that any other table could match.
+
+Revision ID: 20261018_detached_partitions
+Revises: 20261018_evaluation_retries
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_detached_partitions'
+down_revision = '20261018_evaluation_retries'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'detached_partitions',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('detached_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+def downgrade() -> None:
+    op.drop_table('detached_partitions')
@@ -0,0 +1,31 @@
+"""Add composite indexes for keyset pagination of evaluations
+
+Revision ID: 20261018_evaluation_keyset_indexes
+Revises: 20261018_prompt_embeddings
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_evaluation_keyset_indexes'
+down_revision = '20261018_prompt_embeddings'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Pages are ordered by (created_at, id); the model and prompt indexes also
+    # serve plain model_id / prompt_id lookups, so they replace the old ones
+    op.create_index('ix_evaluations_created_at_id', 'evaluations', ['created_at', 'id'], unique=False)
+    op.create_index('ix_evaluations_model_id_created_at_id', 'evaluations', ['model_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_evaluations_prompt_id_created_at_id', 'evaluations', ['prompt_id', 'created_at', 'id'], unique=False)
+    op.drop_index(op.f('ix_evaluations_model_id'), table_name='evaluations')
+    op.drop_index(op.f('ix_evaluations_prompt_id'), table_name='evaluations')
+
+def downgrade() -> None:
+    op.create_index(op.f('ix_evaluations_prompt_id'), 'evaluations', ['prompt_id'], unique=False)
+    op.create_index(op.f('ix_evaluations_model_id'), 'evaluations', ['model_id'], unique=False)
+    op.drop_index('ix_evaluations_prompt_id_created_at_id', table_name='evaluations')
+    op.drop_index('ix_evaluations_model_id_created_at_id', table_name='evaluations')
+    op.drop_index('ix_evaluations_created_at_id', table_name='evaluations')
@@ -0,0 +1,28 @@
+"""Record deferred retries on evaluations
+
+Evaluations that fail on a transient provider error are requeued with a
+delay instead of retried in the worker. retry_count is the number of
+requeues so far and next_retry_at is set while one is pending. Columns
+added to the partitioned parent are added to every partition.
+
+Revision ID: 20261018_evaluation_retries
+Revises: 20261018_completion_blobs
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_evaluation_retries'
+down_revision = '20261018_completion_blobs'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('evaluations', sa.Column('retry_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('evaluations', sa.Column('next_retry_at', sa.DateTime(timezone=True), nullable=True))
+
+def downgrade() -> None:
+    op.drop_column('evaluations', 'next_retry_at')
+    op.drop_column('evaluations', 'retry_count')
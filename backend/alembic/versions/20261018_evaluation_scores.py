@@ -0,0 +1,45 @@
+"""Add evaluation_scores table
+
+Revision ID: 20261018_evaluation_scores
+Revises: 20261018_evaluation_keyset_indexes
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_evaluation_scores'
+down_revision = '20261018_evaluation_keyset_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'evaluation_scores',
+        sa.Column('evaluation_id', sa.String(), nullable=False),
+        sa.Column('metric', sa.String(), nullable=False),
+        sa.Column('value', sa.Float(), nullable=False),
+        sa.Column('model_id', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['evaluation_id'], ['evaluations.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('evaluation_id', 'metric')
+    )
+    op.create_index('ix_evaluation_scores_model_id_metric_value', 'evaluation_scores', ['model_id', 'metric', 'value'], unique=False)
+    op.create_index('ix_evaluation_scores_metric_value', 'evaluation_scores', ['metric', 'value'], unique=False)
+    op.create_index('ix_evaluation_scores_model_id_created_at', 'evaluation_scores', ['model_id', 'created_at'], unique=False)
+
+    # Backfill from the scores JSON of existing evaluations
+    op.execute("""
+        INSERT INTO evaluation_scores (evaluation_id, metric, value, model_id, created_at)
+        SELECT e.id, s.key, s.value::float, e.model_id, e.created_at
+        FROM evaluations e,
+             json_each_text(CASE WHEN json_typeof(e.scores) = 'object' THEN e.scores ELSE '{}'::json END) s
+        WHERE s.value ~ '^-?[0-9]+(\\.[0-9]+)?([eE][-+]?[0-9]+)?$'
+    """)
+
+def downgrade() -> None:
+    op.drop_index('ix_evaluation_scores_model_id_created_at', table_name='evaluation_scores')
+    op.drop_index('ix_evaluation_scores_metric_value', table_name='evaluation_scores')
+    op.drop_index('ix_evaluation_scores_model_id_metric_value', table_name='evaluation_scores')
+    op.drop_table('evaluation_scores')
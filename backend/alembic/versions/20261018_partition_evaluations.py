@@ -0,0 +1,102 @@
+"""Range-partition evaluations by created_at
+
+The existing table is attached as the first partition, covering everything
+before the start of next month, so no rows are copied. New rows go to
+monthly partitions created ahead of time by the partition maintenance job.
+
+Partitioned tables can't have a unique constraint on id alone, so the
+primary key becomes (id, created_at) and the foreign keys pointing at
+evaluations.id are dropped.
+
+Revision ID: 20261018_partition_evaluations
+Revises: 20261018_evaluation_scores
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from datetime import date
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261018_partition_evaluations'
+down_revision = '20261018_evaluation_scores'
+branch_labels = None
+depends_on = None
+
+# Monthly partitions created after the legacy one
+PREMAKE_MONTHS = 3
+
+INDEXES = {
+    'ix_evaluations_created_at_id': '(created_at, id)',
+    'ix_evaluations_model_id_created_at_id': '(model_id, created_at, id)',
+    'ix_evaluations_prompt_id_created_at_id': '(prompt_id, created_at, id)',
+}
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+def upgrade() -> None:
+    op.drop_constraint('failure_cases_evaluation_id_fkey', 'failure_cases', type_='foreignkey')
+    op.drop_constraint('evaluation_scores_evaluation_id_fkey', 'evaluation_scores', type_='foreignkey')
+
+    # Keep the old table, with its indexes renamed, as the legacy partition.
+    # Its indexes are reused by the parent's; the primary key must match the parent's.
+    op.execute("ALTER TABLE evaluations RENAME TO evaluations_legacy")
+    for name in INDEXES:
+        op.execute(f"ALTER INDEX {name} RENAME TO {name.replace('ix_evaluations', 'ix_evaluations_legacy')}")
+    op.execute("UPDATE evaluations_legacy SET created_at = now() WHERE created_at IS NULL")
+    op.execute("ALTER TABLE evaluations_legacy ALTER COLUMN created_at SET NOT NULL")
+    op.execute("ALTER TABLE evaluations_legacy DROP CONSTRAINT evaluations_pkey")
+    op.execute("ALTER TABLE evaluations_legacy ADD CONSTRAINT evaluations_legacy_pkey PRIMARY KEY (id, created_at)")
+
+    op.execute("""
+        CREATE TABLE evaluations (
+            LIKE evaluations_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER TABLE evaluations ADD PRIMARY KEY (id, created_at)")
+    op.execute("ALTER TABLE evaluations ADD FOREIGN KEY (model_id) REFERENCES models (id)")
+    op.execute("ALTER TABLE evaluations ADD FOREIGN KEY (prompt_id) REFERENCES prompts (id)")
+    for name, columns in INDEXES.items():
+        op.execute(f"CREATE INDEX {name} ON evaluations {columns}")
+
+    cutover = _add_months(date.today().replace(day=1), 1)
+    # Checking the bound scans the legacy table once, under a lock
+    op.execute(f"""
+        ALTER TABLE evaluations ATTACH PARTITION evaluations_legacy
+        FOR VALUES FROM (MINVALUE) TO ('{cutover.isoformat()}')
+    """)
+    for offset in range(PREMAKE_MONTHS):
+        start = _add_months(cutover, offset)
+        end = _add_months(start, 1)
+        op.execute(f"""
+            CREATE TABLE evaluations_y{start.year}m{start.month:02d}
+            PARTITION OF evaluations FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')
+        """)
+    op.execute("CREATE TABLE evaluations_default PARTITION OF evaluations DEFAULT")
+
+def downgrade() -> None:
+    op.execute("""
+        CREATE TABLE evaluations_unpartitioned (
+            LIKE evaluations INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+        )
+    """)
+    op.execute("INSERT INTO evaluations_unpartitioned SELECT * FROM evaluations")
+    op.execute("DROP TABLE evaluations CASCADE")
+    op.execute("ALTER TABLE evaluations_unpartitioned RENAME TO evaluations")
+    op.execute("ALTER TABLE evaluations ADD CONSTRAINT evaluations_pkey PRIMARY KEY (id)")
+    op.execute("ALTER TABLE evaluations ADD FOREIGN KEY (model_id) REFERENCES models (id)")
+    op.execute("ALTER TABLE evaluations ADD FOREIGN KEY (prompt_id) REFERENCES prompts (id)")
+    op.execute("ALTER TABLE evaluations ALTER COLUMN created_at DROP NOT NULL")
+    for name, columns in INDEXES.items():
+        op.execute(f"CREATE INDEX {name} ON evaluations {columns}")
+
+    op.execute("DELETE FROM evaluation_scores WHERE evaluation_id NOT IN (SELECT id FROM evaluations)")
+    op.create_foreign_key(
+        'evaluation_scores_evaluation_id_fkey', 'evaluation_scores', 'evaluations',
+        ['evaluation_id'], ['id'], ondelete='CASCADE'
+    )
+    op.create_foreign_key(
+        'failure_cases_evaluation_id_fkey', 'failure_cases', 'evaluations',
+        ['evaluation_id'], ['id']
+    )
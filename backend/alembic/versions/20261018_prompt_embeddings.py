@@ -0,0 +1,34 @@
+"""Add prompt_embeddings table
+
+Revision ID: 20261018_prompt_embeddings
+Revises: 20240322_initial
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_prompt_embeddings'
+down_revision = '20240322_initial'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'prompt_embeddings',
+        sa.Column('prompt_id', sa.String(), nullable=False),
+        sa.Column('embedding_model', sa.String(), nullable=False),
+        sa.Column('text_hash', sa.String(length=64), nullable=False),
+        sa.Column('dimensions', sa.Integer(), nullable=False),
+        sa.Column('vector', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['prompt_id'], ['prompts.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('prompt_id', 'embedding_model')
+    )
+    op.create_index(op.f('ix_prompt_embeddings_embedding_model'), 'prompt_embeddings', ['embedding_model'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_prompt_embeddings_embedding_model'), table_name='prompt_embeddings')
+    op.drop_table('prompt_embeddings')
@@ -5,6 +5,7 @@ LLM API endpoints for text generation.
 from typing import Optional
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
+from models.circuit_breaker import CircuitOpenError
 from models.llm_client import llm_client
 from config import settings
 
@@ -16,6 +17,8 @@ class GenerateRequest(BaseModel):
     model: Optional[str] = None
     max_tokens: Optional[int] = 1000
     temperature: Optional[float] = 0.7
+    bypass_cache: bool = False  # skip the completion cache lookup
+    hedge: Optional[bool] = None  # send a second request if the first is slow; HEDGE_ENABLED if unset
 
 class GenerateResponse(BaseModel):
     """Response model for text generation."""
@@ -31,13 +34,36 @@ async def generate_text(request: GenerateRequest):
             model=request.model,
             max_tokens=request.max_tokens,
             temperature=request.temperature,
+            bypass_cache=request.bypass_cache,
+            hedge=request.hedge,
         )
         return GenerateResponse(
             text=text,
             model=request.model or settings.DEFAULT_MODEL,
         )
+    except CircuitOpenError as e:
+        # The model and its fallback are both failing
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error generating text: {str(e)}"
-        ) 
\ No newline at end of file
+        ) 
+
+@router.get("/cache/stats")
+async def completion_cache_stats():
+    """Hit rate and saved tokens and cost of the completion cache, and coalesced calls."""
+    return {
+        **llm_client.completion_cache.stats(),
+        "single_flight": llm_client.single_flight.stats(),
+    }
+
+@router.get("/circuits")
+async def circuit_breaker_stats():
+    """State, error rate and latency of the circuit breaker of each provider and model."""
+    return llm_client.circuit_breakers.stats()
+
+@router.get("/hedging")
+async def hedging_stats():
+    """Hedge rate, tokens and cost spent on requests that lost the race, and hedging delays."""
+    return llm_client.hedger.stats()
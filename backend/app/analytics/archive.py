@@ -0,0 +1,72 @@
+import json
+import os
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+import pyarrow as pa
+from sqlalchemy import JSON, DateTime, text
+from sqlalchemy.engine import Connection
+from app.analytics.export import BASE_SCHEMA, dataset_path, to_record, write_partition
+from app.core.config import settings
+
+# Archived rows keep everything needed to restore or audit them
+ARCHIVE_SCHEMA = (
+    BASE_SCHEMA
+    .append(pa.field("completion", pa.string()))
+    # Blob-stored completions stay in the blob store and are referenced by hash
+    .append(pa.field("completion_hash", pa.string()))
+    .append(pa.field("completion_size", pa.int64()))
+    .append(pa.field("scores", pa.string()))
+    .append(pa.field("metadata", pa.string()))
+)
+
+def archive_table(
+    conn: Connection,
+    table_name: str,
+    root: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    schema: Optional[str] = None
+) -> int:
+    """
+    Write every row of a detached evaluations partition, in schema if given,
+    to the archive dataset, partitioned by model and month like the analytics
+    export and zstd-compressed. Files are named after the table, so
+    re-archiving a table overwrites them. Returns the number of rows written.
+    """
+    path = dataset_path(root, archive=True)
+    batch_size = batch_size or settings.PARQUET_EXPORT_BATCH_SIZE
+    table = f'"{schema}"."{table_name}"' if schema else f'"{table_name}"'
+    query = text(f"""
+        SELECT e.*, p.type AS evaluation_type
+        FROM {table} e LEFT JOIN prompts p ON p.id = e.prompt_id
+        ORDER BY e.created_at, e.id
+    """).columns(created_at=DateTime(timezone=True), scores=JSON, metadata=JSON)
+    result = conn.execution_options(yield_per=settings.EXPORT_BATCH_SIZE).execute(query)
+
+    rows = 0
+    batch = 0
+    partitions: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+
+    def flush() -> None:
+        nonlocal batch
+        for (model_id, month), records in partitions.items():
+            write_partition(path, model_id, month, records, f"{table_name}/{batch}", ARCHIVE_SCHEMA)
+        partitions.clear()
+        batch += 1
+
+    for row in result:
+        record = to_record(row)
+        record["completion"] = row.completion
+        # Partitions detached before blob storage was added have no hash columns
+        record["completion_hash"] = getattr(row, "completion_hash", None)
+        record["completion_size"] = getattr(row, "completion_size", None)
+        record["scores"] = json.dumps(row.scores) if row.scores is not None else None
+        record["metadata"] = json.dumps(row.metadata) if row.metadata is not None else None
+        partitions[(row.model_id, record["created_at"].strftime("%Y-%m"))].append(record)
+        rows += 1
+        if rows % batch_size == 0:
+            flush()
+
+    if partitions:
+        flush()
+    os.makedirs(path, exist_ok=True)
+    return rows
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Row, and_, not_, or_, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.evaluators.writer import numeric_scores
+from app.models.models import Evaluation, EvaluationType, Prompt
+
+logger = logging.getLogger(__name__)
+
+SCORE_PREFIX = "score_"
+WATERMARK_FILE = "_watermark.json"
+
+# Columns of every exported file; score_<metric> columns are added per file
+BASE_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("prompt_id", pa.string()),
+    ("evaluation_type", pa.string()),
+    ("created_at", pa.timestamp("us", tz="UTC")),
+    ("duration_ms", pa.int64()),
+    ("token_count", pa.int64()),
+    ("error", pa.string()),
+])
+
+def dataset_path(root: Optional[str] = None, archive: bool = False) -> str:
+    """The analytics dataset, or with archive=True the dataset of archived partitions."""
+    base = root or settings.LOCAL_STORAGE_PATH
+    return os.path.join(base, "archive", "evaluations") if archive else os.path.join(base, "evaluations")
+
+def read_watermark(path: str) -> Optional[Tuple[datetime, str]]:
+    """The (created_at, id) of the last exported evaluation, if any."""
+    try:
+        with open(os.path.join(path, WATERMARK_FILE)) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    return datetime.fromisoformat(state["created_at"]), state["id"]
+
+def write_watermark(path: str, created_at: datetime, evaluation_id: str) -> None:
+    tmp_path = os.path.join(path, WATERMARK_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"created_at": created_at.isoformat(), "id": evaluation_id}, f)
+    os.replace(tmp_path, os.path.join(path, WATERMARK_FILE))
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def _type_value(evaluation_type: Any) -> Optional[str]:
+    if isinstance(evaluation_type, EvaluationType):
+        return evaluation_type.value
+    # Raw SQL returns the enum's stored name
+    if evaluation_type in EvaluationType.__members__:
+        return EvaluationType[evaluation_type].value
+    return evaluation_type
+
+def to_record(row: Row) -> Dict[str, Any]:
+    """Flatten an evaluation row into Parquet columns, with one score_<metric> column per metric."""
+    record = {
+        "id": row.id,
+        "prompt_id": row.prompt_id,
+        "evaluation_type": _type_value(row.evaluation_type),
+        "created_at": _as_utc(row.created_at),
+        "duration_ms": row.duration_ms,
+        "token_count": row.token_count,
+        "error": row.error,
+    }
+    for metric, value in numeric_scores(row.scores).items():
+        record[SCORE_PREFIX + metric] = value
+    return record
+
+def write_partition(
+    path: str,
+    model_id: str,
+    month: str,
+    records: List[Dict[str, Any]],
+    batch_key: str,
+    base_schema: pa.Schema = BASE_SCHEMA
+) -> str:
+    """Write records of one model and month as a Parquet file named after batch_key."""
+    metrics = sorted({key for record in records for key in record if key.startswith(SCORE_PREFIX)})
+    schema = base_schema
+    for metric in metrics:
+        schema = schema.append(pa.field(metric, pa.float64()))
+    table = pa.Table.from_pylist(records, schema=schema)
+
+    directory = os.path.join(path, f"model_id={model_id}", f"month={month}")
+    os.makedirs(directory, exist_ok=True)
+    # Named after the batch so re-running an export that died before saving
+    # its watermark overwrites the same files instead of duplicating rows
+    digest = hashlib.sha1(f"{batch_key}/{model_id}/{month}".encode("utf-8")).hexdigest()[:16]
+    file_path = os.path.join(directory, f"part-{digest}.parquet")
+    pq.write_table(table, file_path + ".tmp", compression="zstd")
+    os.replace(file_path + ".tmp", file_path)
+    return file_path
+
+def _after(created_at: datetime, evaluation_id: str) -> Any:
+    """Evaluations after the given one in export order."""
+    return or_(
+        Evaluation.created_at > created_at,
+        and_(Evaluation.created_at == created_at, Evaluation.id > evaluation_id)
+    )
+
+def _before(created_at: datetime, evaluation_id: str) -> Any:
+    """Evaluations before the given one in export order."""
+    return or_(
+        Evaluation.created_at < created_at,
+        and_(Evaluation.created_at == created_at, Evaluation.id < evaluation_id)
+    )
+
+def _finished() -> Any:
+    """Evaluations with their final result: scores, or an error that will not be retried."""
+    return and_(
+        or_(Evaluation.scores.isnot(None), Evaluation.error.isnot(None)),
+        Evaluation.next_retry_at.is_(None)
+    )
+
+def export_evaluations(
+    db: Session,
+    root: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    lag: Optional[timedelta] = None
+) -> Dict[str, int]:
+    """
+    Append evaluations created since the last export to a Parquet dataset
+    partitioned by model_id and month, with scores flattened into score_<metric>
+    columns. Rows are appended once, in (created_at, id) order, so the export
+    stops before the oldest evaluation that has not finished, i.e. has neither
+    scores nor a final error, and the watermark stays behind it. One still
+    unfinished after PARQUET_EXPORT_MAX_PENDING_HOURS is exported as it is, so
+    a lost evaluation cannot hold back the export for good. Rows newer than
+    lag are not looked at. Returns the number of rows and files written.
+    """
+    path = dataset_path(root)
+    os.makedirs(path, exist_ok=True)
+    batch_size = batch_size or settings.PARQUET_EXPORT_BATCH_SIZE
+    lag = lag if lag is not None else timedelta(minutes=settings.PARQUET_EXPORT_LAG_MINUTES)
+    cutoff = datetime.now(timezone.utc) - lag
+    stale = datetime.now(timezone.utc) - timedelta(hours=settings.PARQUET_EXPORT_MAX_PENDING_HOURS)
+
+    watermark = read_watermark(path)
+    query = (
+        select(
+            Evaluation.id,
+            Evaluation.model_id,
+            Evaluation.prompt_id,
+            Prompt.type.label("evaluation_type"),
+            Evaluation.created_at,
+            Evaluation.duration_ms,
+            Evaluation.token_count,
+            Evaluation.error,
+            Evaluation.scores
+        )
+        .join(Prompt, Prompt.id == Evaluation.prompt_id)
+        .where(Evaluation.created_at < cutoff)
+        .order_by(Evaluation.created_at, Evaluation.id)
+        .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+    )
+    if watermark:
+        query = query.where(_after(*watermark))
+
+    # Export only up to the oldest evaluation still waiting for its result
+    unfinished = (
+        select(Evaluation.created_at, Evaluation.id)
+        .where(Evaluation.created_at < cutoff, Evaluation.created_at >= stale, not_(_finished()))
+        .order_by(Evaluation.created_at, Evaluation.id)
+        .limit(1)
+    )
+    if watermark:
+        unfinished = unfinished.where(_after(*watermark))
+    oldest_unfinished = db.execute(unfinished).first()
+    if oldest_unfinished:
+        query = query.where(_before(*oldest_unfinished))
+
+    rows = 0
+    files = 0
+    partitions: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+    buffered = 0
+    last: Optional[Tuple[datetime, str]] = None
+    batch_key = f"{watermark[0].isoformat()}/{watermark[1]}" if watermark else "start"
+
+    def flush() -> None:
+        nonlocal buffered, files, partitions, batch_key
+        for (model_id, month), records in partitions.items():
+            write_partition(path, model_id, month, records, batch_key)
+            files += 1
+        write_watermark(path, *last)
+        batch_key = f"{last[0].isoformat()}/{last[1]}"
+        partitions = defaultdict(list)
+        buffered = 0
+
+    for row in db.execute(query):
+        month = _as_utc(row.created_at).strftime("%Y-%m")
+        partitions[(row.model_id, month)].append(to_record(row))
+        last = (row.created_at, row.id)
+        buffered += 1
+        rows += 1
+        if buffered >= batch_size:
+            flush()
+
+    if buffered:
+        flush()
+
+    logger.info(f"Exported {rows} evaluations to {files} Parquet files under {path}")
+    return {"rows": rows, "files": files}
@@ -0,0 +1,92 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from app.analytics.export import SCORE_PREFIX, dataset_path
+
+def open_dataset(root: Optional[str] = None, archive: bool = False) -> ds.Dataset:
+    """
+    Open the exported evaluations, or with archive=True the archived
+    partitions, as one dataset. Files written at different times can have
+    different score columns, so their schemas are unified and missing scores
+    read as null.
+    """
+    path = dataset_path(root, archive)
+    partitioning = ds.partitioning(
+        pa.schema([("model_id", pa.string()), ("month", pa.string())]),
+        flavor="hive"
+    )
+    dataset = ds.dataset(path, format="parquet", partitioning=partitioning, exclude_invalid_files=True)
+    schemas = [fragment.physical_schema for fragment in dataset.get_fragments()]
+    if not schemas:
+        return dataset
+    schema = pa.unify_schemas(schemas + [partitioning.schema])
+    return ds.dataset(path, schema=schema, format="parquet", partitioning=partitioning)
+
+def _utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+def build_filter(
+    model_ids: Optional[Sequence[str]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    min_scores: Optional[Dict[str, float]] = None,
+    max_scores: Optional[Dict[str, float]] = None
+) -> Optional[ds.Expression]:
+    """
+    Build a dataset filter. model_id and month prune whole partitions, and
+    created_at and score bounds skip row groups using Parquet statistics.
+    """
+    conditions: List[ds.Expression] = []
+    if model_ids:
+        conditions.append(ds.field("model_id").isin(list(model_ids)))
+    if start_date:
+        conditions.append(ds.field("month") >= start_date.strftime("%Y-%m"))
+        conditions.append(ds.field("created_at") >= pa.scalar(_utc(start_date), pa.timestamp("us", tz="UTC")))
+    if end_date:
+        conditions.append(ds.field("month") <= end_date.strftime("%Y-%m"))
+        conditions.append(ds.field("created_at") <= pa.scalar(_utc(end_date), pa.timestamp("us", tz="UTC")))
+    for metric, value in (min_scores or {}).items():
+        conditions.append(ds.field(SCORE_PREFIX + metric) >= value)
+    for metric, value in (max_scores or {}).items():
+        conditions.append(ds.field(SCORE_PREFIX + metric) <= value)
+
+    if not conditions:
+        return None
+    expression = conditions[0]
+    for condition in conditions[1:]:
+        expression = expression & condition
+    return expression
+
+def query_evaluations(
+    columns: Optional[List[str]] = None,
+    root: Optional[str] = None,
+    archive: bool = False,
+    **filters
+) -> pd.DataFrame:
+    """
+    Read exported evaluations into a DataFrame, reading only the requested
+    columns and the files and row groups that can match the filters
+    (see build_filter). archive=True reads archived partitions instead,
+    which also have completion, scores and metadata columns.
+    """
+    dataset = open_dataset(root, archive)
+    table = dataset.to_table(columns=columns, filter=build_filter(**filters))
+    return table.to_pandas()
+
+def score_summary(
+    metric: str,
+    root: Optional[str] = None,
+    archive: bool = False,
+    **filters
+) -> pd.DataFrame:
+    """Mean, count and quantiles of a score per model and month."""
+    column = SCORE_PREFIX + metric
+    frame = query_evaluations(["model_id", "month", column], root=root, archive=archive, **filters)
+    return (
+        frame.dropna(subset=[column])
+        .groupby(["model_id", "month"])[column]
+        .describe(percentiles=[0.1, 0.5, 0.9])
+        .reset_index()
+    )
@@ -1,73 +1,84 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.models.models import Evaluation, Model, Prompt, EvaluationType
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Sequence
+from uuid import uuid4
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
+from sqlalchemy import Row, Select, delete, insert, literal, null, select, tuple_, update
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, get_async_db
+from app.core.pagination import decode_cursor, encode_cursor
+from app.core.storage import load_completions
+from app.models.models import Evaluation, EvaluationScore, Model, Prompt, EvaluationType
 from app.schemas.evaluation import (
     EvaluationCreate,
     EvaluationResponse,
     EvaluationFilter,
-    EvaluationBatchCreate
+    EvaluationBatchCreate,
+    EvaluationSubmission,
+    EvaluationSummary
 )
-from app.evaluators.base import BaseEvaluator
-from app.evaluators.factual_qa import FactualQAEvaluator
+from app.schemas.pagination import PaginatedResponse
+from app.evaluators.registry import is_supported
 from app.core.celery_app import celery_app
 from app.core.exceptions import EvaluationError, ModelNotFoundError
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
 
-# Evaluator factory
-def get_evaluator(evaluation_type: EvaluationType, model: Model) -> BaseEvaluator:
-    evaluators = {
-        EvaluationType.FACTUAL_QA: FactualQAEvaluator,
-        # Add other evaluator types here
-    }
-    
-    evaluator_class = evaluators.get(evaluation_type)
-    if not evaluator_class:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported evaluation type: {evaluation_type}"
-        )
-    
-    return evaluator_class(model)
+router = APIRouter()
 
-@router.post("/", response_model=EvaluationResponse)
+@router.post("/", response_model=EvaluationSubmission)
 async def create_evaluation(
     evaluation: EvaluationCreate,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new evaluation."""
     try:
         # Get model and prompt
-        model = db.query(Model).filter(Model.id == evaluation.model_id).first()
-        prompt = db.query(Prompt).filter(Prompt.id == evaluation.prompt_id).first()
+        model = await db.get(Model, evaluation.model_id)
+        prompt = await db.get(Prompt, evaluation.prompt_id)
         
         if not model or not prompt:
             raise ModelNotFoundError(evaluation.model_id)
             
-        # Create evaluator
-        evaluator = get_evaluator(prompt.type, model)
+        # Check an evaluator exists; it is only instantiated by the worker
+        if not is_supported(prompt.type):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported evaluation type: {prompt.type}"
+            )
         
         # Create evaluation record
         db_evaluation = Evaluation(
             model_id=model.id,
             prompt_id=prompt.id,
-            metadata=evaluation.metadata
+            metadata_=evaluation.metadata
         )
         db.add(db_evaluation)
-        db.commit()
-        db.refresh(db_evaluation)
+        await db.commit()
+        await db.refresh(db_evaluation)
         
-        # Queue evaluation task
-        task = celery_app.send_task(
-            "app.evaluators.tasks.run_evaluation",
-            args=[db_evaluation.id]
-        )
+        # Queue evaluation task; publishing blocks on the broker, so keep it off the event loop
+        try:
+            task = await run_in_threadpool(
+                celery_app.send_task,
+                "app.evaluators.tasks.run_evaluation",
+                args=[db_evaluation.id]
+            )
+        except Exception as e:
+            await _mark_unqueued(db, {db_evaluation.id: f"Failed to queue evaluation: {str(e)}"})
+            raise
         
         return {
             "id": db_evaluation.id,
+            "model_id": model.id,
+            "prompt_id": prompt.id,
             "status": "pending",
             "task_id": task.id
         }
@@ -75,61 +86,314 @@ async def create_evaluation(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.post("/batch", response_model=List[EvaluationResponse])
+@router.post("/batch", response_model=List[EvaluationSubmission])
 async def create_batch_evaluation(
     batch: EvaluationBatchCreate,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Create multiple evaluations in batch."""
-    responses = []
+    """
+    Create multiple evaluations in one transaction and queue them in chunks
+    of BATCH_SUBMIT_CHUNK_SIZE. Items with an unknown model or prompt, or an
+    unsupported evaluation type, are returned with an error and not created.
+    Items whose chunk could not be queued are created with that error.
+    """
+    model_ids = {item.model_id for item in batch.evaluations}
+    prompt_ids = {item.prompt_id for item in batch.evaluations}
     
-    for eval_create in batch.evaluations:
-        try:
-            response = await create_evaluation(eval_create, background_tasks, db)
-            responses.append(response)
-        except Exception as e:
-            responses.append({
-                "error": str(e),
-                "model_id": eval_create.model_id,
-                "prompt_id": eval_create.prompt_id
+    # Validate all model and prompt IDs in one round trip
+    found = (await db.execute(
+        select(literal("prompt"), Prompt.id, Prompt.type)
+        .where(Prompt.id.in_(prompt_ids))
+        .union_all(
+            select(literal("model"), Model.id, null())
+            .where(Model.id.in_(model_ids))
+        )
+    )).all()
+    models = {row_id for kind, row_id, _ in found if kind == "model"}
+    prompt_types = {row_id: prompt_type for kind, row_id, prompt_type in found if kind == "prompt"}
+    
+    responses: List[Dict[str, Any]] = []
+    rows: List[Dict[str, Any]] = []
+    for item in batch.evaluations:
+        response = {"model_id": item.model_id, "prompt_id": item.prompt_id}
+        if item.model_id not in models:
+            response.update(status="error", error=str(ModelNotFoundError(item.model_id)))
+        elif item.prompt_id not in prompt_types:
+            response.update(status="error", error=f"Prompt with ID {item.prompt_id} not found")
+        elif not is_supported(prompt_types[item.prompt_id]):
+            response.update(status="error", error=f"Unsupported evaluation type: {prompt_types[item.prompt_id]}")
+        else:
+            evaluation_id = str(uuid4())
+            rows.append({
+                "id": evaluation_id,
+                "model_id": item.model_id,
+                "prompt_id": item.prompt_id,
+                "metadata_": item.metadata
             })
+            response.update(id=evaluation_id, status="pending")
+        responses.append(response)
     
+    if not rows:
+        return responses
+    
+    try:
+        await db.execute(insert(Evaluation), rows)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    pending = [response for response in responses if response["status"] == "pending"]
+    await run_in_threadpool(_queue_batch_chunks, pending)
+    unqueued = {response["id"]: response["error"] for response in pending if response["status"] == "error"}
+    if unqueued:
+        await _mark_unqueued(db, unqueued)
     return responses
 
+async def _mark_unqueued(db: AsyncSession, errors: Dict[str, str]) -> None:
+    """Record why evaluations were not queued, so their rows don't look pending forever."""
+    try:
+        await db.execute(
+            update(Evaluation),
+            [{"id": evaluation_id, "error": error} for evaluation_id, error in errors.items()]
+        )
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Failed to mark {len(errors)} unqueued evaluations: {str(e)}")
+
+def _queue_batch_chunks(pending: List[Dict[str, Any]]) -> None:
+    """Queue one run_batch_evaluation message per chunk over a single broker connection."""
+    chunk_size = settings.BATCH_SUBMIT_CHUNK_SIZE
+    with celery_app.producer_or_acquire() as producer:
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            try:
+                task = celery_app.send_task(
+                    "app.evaluators.tasks.run_batch_evaluation",
+                    args=[[response["id"] for response in chunk]],
+                    producer=producer
+                )
+            except Exception as e:
+                logger.error(f"Failed to queue evaluations: {str(e)}")
+                for response in chunk:
+                    response.update(status="error", error=f"Failed to queue evaluation: {str(e)}")
+                continue
+            for response in chunk:
+                response["task_id"] = task.id
+
+# Columns returned by list views unless include= asks for more
+LIST_COLUMNS = (
+    Evaluation.id,
+    Evaluation.model_id,
+    Evaluation.prompt_id,
+    Evaluation.scores,
+    Evaluation.error,
+    Evaluation.duration_ms,
+    Evaluation.token_count,
+    Evaluation.created_at,
+)
+OPTIONAL_LIST_COLUMNS = {
+    # Blob-stored completions are NULL in the row and read by completion_hash
+    "completion": (Evaluation.completion, Evaluation.completion_hash),
+    "metadata": (Evaluation.metadata_.label("metadata"),),
+}
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def score_filter(filters: EvaluationFilter) -> Select:
+    """
+    IDs of evaluations whose score for metric is in [min_score, max_score],
+    read from the evaluation_scores indexes rather than the scores JSON.
+    """
+    query = select(EvaluationScore.evaluation_id).where(EvaluationScore.metric == filters.metric)
+    if filters.model_id:
+        query = query.where(EvaluationScore.model_id == filters.model_id)
+    if filters.min_score is not None:
+        query = query.where(EvaluationScore.value >= filters.min_score)
+    if filters.max_score is not None:
+        query = query.where(EvaluationScore.value <= filters.max_score)
+    if filters.start_date:
+        query = query.where(EvaluationScore.created_at >= filters.start_date)
+    if filters.end_date:
+        query = query.where(EvaluationScore.created_at <= filters.end_date)
+    return query
+
+def filtered_query(filters: EvaluationFilter, include: List[str]) -> Select:
+    """Select the list columns, plus those in include, of evaluations matching filters."""
+    columns = LIST_COLUMNS + tuple(
+        column for name in dict.fromkeys(include) for column in OPTIONAL_LIST_COLUMNS[name]
+    )
+    query = select(*columns)
+    
+    if filters.model_id:
+        query = query.where(Evaluation.model_id == filters.model_id)
+    if filters.prompt_id:
+        query = query.where(Evaluation.prompt_id == filters.prompt_id)
+    if filters.evaluation_type:
+        query = query.join(Prompt).where(Prompt.type == filters.evaluation_type)
+    if filters.start_date:
+        query = query.where(Evaluation.created_at >= filters.start_date)
+    if filters.end_date:
+        query = query.where(Evaluation.created_at <= filters.end_date)
+    if filters.min_score is not None or filters.max_score is not None:
+        # Without a metric the range would match a score of any metric
+        if not filters.metric:
+            raise HTTPException(status_code=422, detail="metric is required with min_score or max_score")
+        query = query.where(Evaluation.id.in_(score_filter(filters)))
+    return query
+
+async def with_completions(rows: Sequence[Row]) -> List[Dict[str, Any]]:
+    """
+    Rows as dicts, with blob-stored completions read from the blob store.
+    The completion_hash column is dropped.
+    """
+    items = [row._asdict() for row in rows]
+    hashes = {item["completion_hash"] for item in items if item.get("completion_hash")}
+    completions = await run_in_threadpool(load_completions, hashes) if hashes else {}
+    for item in items:
+        completion_hash = item.pop("completion_hash", None)
+        if completion_hash:
+            item["completion"] = completions[completion_hash]
+    return items
+
+async def _export_rows(
+    query: Select,
+    columns: List[str],
+    export_format: str
+) -> AsyncIterator[str]:
+    """
+    Stream query results through a server-side cursor, one encoded chunk per
+    EXPORT_BATCH_SIZE rows. Uses its own session because the request's
+    session is closed before the response body is sent.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            async for rows in result.partitions():
+                for item in await with_completions(rows):
+                    writer.writerow([_csv_value(item[column]) for column in columns])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        else:
+            async for rows in result.partitions():
+                yield "".join(
+                    json.dumps(item, default=_json_default) + "\n"
+                    for item in await with_completions(rows)
+                )
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+@router.get("/export")
+async def export_evaluations(
+    filters: EvaluationFilter = Depends(),
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    include: List[Literal["completion", "metadata"]] = Query([])
+):
+    """
+    Export matching evaluations as NDJSON or CSV, oldest first. Rows are
+    streamed as they are read, so memory use does not grow with the export.
+    """
+    query = filtered_query(filters, include).order_by(Evaluation.created_at, Evaluation.id)
+    columns = [column.name for column in query.selected_columns if column.name != "completion_hash"]
+    return StreamingResponse(
+        _export_rows(query, columns, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="evaluations.{export_format}"'}
+    )
+
+def evaluation_key(evaluation_id: str, created_at: Optional[datetime]) -> List[Any]:
+    """
+    Conditions matching one evaluation. Passing its created_at lets the
+    database read only the partition holding it, rather than all of them.
+    """
+    conditions = [Evaluation.id == evaluation_id]
+    if created_at is not None:
+        conditions.append(Evaluation.created_at == created_at)
+    return conditions
+
 @router.get("/{evaluation_id}", response_model=EvaluationResponse)
-async def get_evaluation(evaluation_id: str, db: Session = Depends(get_db)):
-    """Get evaluation by ID."""
-    evaluation = db.query(Evaluation).filter(Evaluation.id == evaluation_id).first()
+async def get_evaluation(
+    evaluation_id: str,
+    created_at: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get evaluation by ID, and created_at if known."""
+    evaluation = await db.scalar(select(Evaluation).where(*evaluation_key(evaluation_id, created_at)))
     if not evaluation:
         raise HTTPException(status_code=404, detail="Evaluation not found")
-    return evaluation
+    response = EvaluationResponse.model_validate(evaluation)
+    if evaluation.completion_hash:
+        completions = await run_in_threadpool(load_completions, [evaluation.completion_hash])
+        response.completion = completions[evaluation.completion_hash]
+    return response
 
-@router.get("/", response_model=List[EvaluationResponse])
+@router.get("/", response_model=PaginatedResponse[EvaluationSummary])
 async def list_evaluations(
     filters: EvaluationFilter = Depends(),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    include: List[Literal["completion", "metadata"]] = Query([]),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """List evaluations with optional filtering."""
-    query = db.query(Evaluation)
+    """
+    List evaluations with optional filtering, newest first. Pages are keyset
+    paginated on (created_at, id): pass next_cursor from one page as cursor to
+    get the next.
+    """
+    query = filtered_query(filters, include)
+    if cursor:
+        try:
+            created_at, evaluation_id = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(tuple_(Evaluation.created_at, Evaluation.id) < tuple_(created_at, evaluation_id))
     
-    if filters.model_id:
-        query = query.filter(Evaluation.model_id == filters.model_id)
-    if filters.prompt_id:
-        query = query.filter(Evaluation.prompt_id == filters.prompt_id)
-    if filters.evaluation_type:
-        query = query.join(Prompt).filter(Prompt.type == filters.evaluation_type)
+    # Fetch one extra row to know whether there is a next page
+    query = query.order_by(Evaluation.created_at.desc(), Evaluation.id.desc()).limit(limit + 1)
+    rows = (await db.execute(query)).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
     
-    evaluations = query.all()
-    return evaluations
+    return {
+        "items": await with_completions(rows) if "completion" in include else rows,
+        "limit": limit,
+        "next_cursor": next_cursor
+    }
 
 @router.delete("/{evaluation_id}")
-async def delete_evaluation(evaluation_id: str, db: Session = Depends(get_db)):
-    """Delete an evaluation."""
-    evaluation = db.query(Evaluation).filter(Evaluation.id == evaluation_id).first()
-    if not evaluation:
+async def delete_evaluation(
+    evaluation_id: str,
+    created_at: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Delete an evaluation by ID, and created_at if known."""
+    result = await db.execute(delete(Evaluation).where(*evaluation_key(evaluation_id, created_at)))
+    if not result.rowcount:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Evaluation not found")
         
-    db.delete(evaluation)
-    db.commit()
+    # Not cascaded by the database, since evaluations is partitioned
+    await db.execute(delete(EvaluationScore).where(EvaluationScore.evaluation_id == evaluation_id))
+    await db.commit()
     return {"status": "success", "message": "Evaluation deleted"} 
\ No newline at end of file
@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.schedules import crontab
 from app.core.config import settings
 
 celery_app = Celery(
@@ -19,8 +20,30 @@ celery_app.conf.update(
     worker_max_tasks_per_child=100,
 )
 
+if settings.CELERY_WORKER_MODE == "async":
+    # Each pool thread blocks on its coroutine while the process's event loop
+    # interleaves them. Prefetch stays at one message per thread, so a process
+    # never reserves more work than it has slots for.
+    celery_app.conf.update(
+        worker_pool="threads",
+        worker_concurrency=settings.CELERY_ASYNC_CONCURRENCY,
+        worker_prefetch_multiplier=1,
+        task_acks_late=True,
+    )
+
 # Optional: Configure task routing
 celery_app.conf.task_routes = {
     "app.evaluators.tasks.*": {"queue": "evaluations"},
     "app.core.tasks.*": {"queue": "default"},
+}
+
+celery_app.conf.beat_schedule = {
+    "export-evaluations-to-parquet": {
+        "task": "app.core.tasks.export_evaluations_to_parquet",
+        "schedule": crontab(minute=15),
+    },
+    "maintain-evaluation-partitions": {
+        "task": "app.core.tasks.maintain_evaluation_partitions",
+        "schedule": crontab(hour=3, minute=30),
+    },
 } 
\ No newline at end of file
@@ -1,6 +1,7 @@
-from typing import List
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import AnyHttpUrl, validator
+import json
 import os
 from dotenv import load_dotenv
 
@@ -26,6 +27,25 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str = os.getenv("POSTGRES_PASSWORD", "postgres")
     POSTGRES_DB: str = os.getenv("POSTGRES_DB", "llm_eval")
     SQLALCHEMY_DATABASE_URI: str = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}/{POSTGRES_DB}"
+    # Used by async API endpoints; set to sqlite+aiosqlite:///... for tests
+    ASYNC_SQLALCHEMY_DATABASE_URI: str = os.getenv(
+        "ASYNC_DATABASE_URL",
+        f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}/{POSTGRES_DB}"
+    )
+    # The async pool is per process, so split the connection budget across gunicorn workers
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", 4))
+    DB_MAX_CONNECTIONS: int = int(os.getenv("DB_MAX_CONNECTIONS", 80))  # for all API workers together
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", max(1, DB_MAX_CONNECTIONS // WEB_CONCURRENCY * 3 // 4)))
+    DB_POOL_MAX_OVERFLOW: int = int(os.getenv(
+        "DB_POOL_MAX_OVERFLOW",
+        max(0, DB_MAX_CONNECTIONS // WEB_CONCURRENCY - DB_POOL_SIZE)
+    ))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", 10))  # seconds
+
+    # Pagination
+    DEFAULT_PAGE_SIZE: int = int(os.getenv("DEFAULT_PAGE_SIZE", 50))
+    MAX_PAGE_SIZE: int = int(os.getenv("MAX_PAGE_SIZE", 500))
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", 1000))  # rows fetched per round trip
 
     # Redis
     REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
@@ -44,6 +64,93 @@ class Settings(BaseSettings):
     # Celery
     CELERY_BROKER_URL: str = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
     CELERY_RESULT_BACKEND: str = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
+    # "async" runs tasks on a thread pool that shares one event loop per process,
+    # so a process keeps up to CELERY_ASYNC_CONCURRENCY provider calls in flight
+    CELERY_WORKER_MODE: str = os.getenv("CELERY_WORKER_MODE", "prefork")  # prefork or async
+    CELERY_ASYNC_CONCURRENCY: int = int(os.getenv("CELERY_ASYNC_CONCURRENCY", 200))
+
+    # Evaluators
+    EVALUATOR_POOL_SIZE: int = int(os.getenv("EVALUATOR_POOL_SIZE", 8))
+    # Initial in-flight completion calls per model of a provider, e.g. {"openai": 32}
+    PROVIDER_CONCURRENCY: Dict[str, int] = json.loads(os.getenv("PROVIDER_CONCURRENCY", "{}"))
+    DEFAULT_PROVIDER_CONCURRENCY: int = int(os.getenv("DEFAULT_PROVIDER_CONCURRENCY", 8))
+    # Requests and tokens per minute, by provider or "provider:model", e.g.
+    # {"openai": {"rpm": 500, "tpm": 300000}, "openai:gpt-4": {"rpm": 100, "tpm": 40000}}
+    PROVIDER_RATE_LIMITS: Dict[str, Dict[str, float]] = json.loads(os.getenv("PROVIDER_RATE_LIMITS", "{}"))
+    RATE_LIMIT_HEADROOM: float = float(os.getenv("RATE_LIMIT_HEADROOM", 0.9))  # fraction of the limits to use
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "redis")  # redis, filesystem or memory
+    RATE_LIMIT_REDIS_URL: str = os.getenv("RATE_LIMIT_REDIS_URL", f"redis://{REDIS_HOST}:{REDIS_PORT}/1")
+    RATE_LIMIT_BURST_SECONDS: float = float(os.getenv("RATE_LIMIT_BURST_SECONDS", 10))  # bucket capacity
+    RATE_LIMIT_PENALTY_SECONDS: float = float(os.getenv("RATE_LIMIT_PENALTY_SECONDS", 2.0))  # fleet pause after a 429
+    RATE_LIMIT_DEFAULT_COMPLETION_TOKENS: int = int(os.getenv("RATE_LIMIT_DEFAULT_COMPLETION_TOKENS", 512))
+    # AIMD concurrency per provider and model starts at PROVIDER_CONCURRENCY
+    ADAPTIVE_CONCURRENCY_MAX: int = int(os.getenv("ADAPTIVE_CONCURRENCY_MAX", 64))
+    ADAPTIVE_CONCURRENCY_BACKOFF: float = float(os.getenv("ADAPTIVE_CONCURRENCY_BACKOFF", 0.5))
+    ADAPTIVE_CONCURRENCY_COOLDOWN_SECONDS: float = float(os.getenv("ADAPTIVE_CONCURRENCY_COOLDOWN_SECONDS", 1.0))
+    # Evaluations per run_batch_evaluation message when a batch is submitted
+    BATCH_SUBMIT_CHUNK_SIZE: int = int(os.getenv("BATCH_SUBMIT_CHUNK_SIZE", 100))
+    # Per-process cache of Model and Prompt rows used by worker tasks
+    ROW_CACHE_TTL_SECONDS: int = int(os.getenv("ROW_CACHE_TTL_SECONDS", 300))
+    ROW_CACHE_MAX_SIZE: int = int(os.getenv("ROW_CACHE_MAX_SIZE", 10000))
+    # Finished results are written in bulk once either threshold is reached
+    RESULT_WRITER_BATCH_SIZE: int = int(os.getenv("RESULT_WRITER_BATCH_SIZE", 500))
+    RESULT_WRITER_FLUSH_INTERVAL: float = float(os.getenv("RESULT_WRITER_FLUSH_INTERVAL", 1.0))  # seconds
+    # A result that fails to write this many times, or fails on its own with a
+    # non-transient error, is dropped; past RESULT_WRITER_MAX_BUFFER buffered
+    # results the oldest are dropped
+    RESULT_WRITER_MAX_ATTEMPTS: int = int(os.getenv("RESULT_WRITER_MAX_ATTEMPTS", 5))
+    RESULT_WRITER_MAX_BUFFER: int = int(os.getenv("RESULT_WRITER_MAX_BUFFER", 50000))
+    # Evaluations failing on a rate limit, timeout or provider error are requeued
+    # after an exponential backoff with jitter, up to EVALUATION_MAX_RETRIES times
+    EVALUATION_MAX_RETRIES: int = int(os.getenv("EVALUATION_MAX_RETRIES", 5))
+    EVALUATION_RETRY_BASE_SECONDS: float = float(os.getenv("EVALUATION_RETRY_BASE_SECONDS", 5.0))
+    EVALUATION_RETRY_MAX_SECONDS: float = float(os.getenv("EVALUATION_RETRY_MAX_SECONDS", 300.0))
+
+    # Embeddings
+    EMBEDDING_MODEL_NAME: str = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch")  # torch, torch-int8 or onnx
+    EMBEDDING_PARITY_TOLERANCE: float = float(os.getenv("EMBEDDING_PARITY_TOLERANCE", 0.02))
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+    EMBEDDING_WARMUP_ON_START: bool = os.getenv("EMBEDDING_WARMUP_ON_START", "true").lower() == "true"
+    EMBED_PROMPTS_ON_INGEST: bool = os.getenv("EMBED_PROMPTS_ON_INGEST", "true").lower() == "true"
+    EMBEDDING_CACHE_SIZE_LIMIT: int = int(os.getenv("EMBEDDING_CACHE_SIZE_LIMIT", 1024 ** 3))  # bytes
+
+    # Storage
+    STORAGE_TYPE: str = os.getenv("STORAGE_TYPE", "local")  # local or s3
+    LOCAL_STORAGE_PATH: str = os.getenv("LOCAL_STORAGE_PATH", "./storage")
+    S3_BUCKET: str = os.getenv("S3_BUCKET", "")
+    S3_PREFIX: str = os.getenv("S3_PREFIX", "blobs")
+    # Set to a local S3-compatible server such as MinIO for development and tests
+    S3_ENDPOINT_URL: Optional[str] = os.getenv("S3_ENDPOINT_URL") or None
+    BLOB_COMPRESSION_LEVEL: int = int(os.getenv("BLOB_COMPRESSION_LEVEL", 3))  # zstd level
+    # Completions of at least this many UTF-8 bytes go to the blob store instead of the row
+    COMPLETION_BLOB_MIN_BYTES: int = int(os.getenv("COMPLETION_BLOB_MIN_BYTES", 1024))
+    # Evaluations younger than this are left for the next Parquet export, as they may still be running
+    PARQUET_EXPORT_LAG_MINUTES: int = int(os.getenv("PARQUET_EXPORT_LAG_MINUTES", 60))
+    # Unfinished evaluations hold back the Parquet export for at most this long
+    PARQUET_EXPORT_MAX_PENDING_HOURS: int = int(os.getenv("PARQUET_EXPORT_MAX_PENDING_HOURS", 24))
+    PARQUET_EXPORT_BATCH_SIZE: int = int(os.getenv("PARQUET_EXPORT_BATCH_SIZE", 50000))  # rows per set of files
+    # Monthly evaluations partitions older than this are archived to Parquet and dropped
+    EVALUATION_RETENTION_MONTHS: int = int(os.getenv("EVALUATION_RETENTION_MONTHS", 12))
+    PARTITION_PREMAKE_MONTHS: int = int(os.getenv("PARTITION_PREMAKE_MONTHS", 3))
+
+    # Cache
+    CACHE_TYPE: str = os.getenv("CACHE_TYPE", "memory")  # memory or filesystem
+    CACHE_DIR: str = os.getenv("CACHE_DIR", "./cache")
+    # Provider completions, cached in process and in a tier shared by all workers
+    COMPLETION_CACHE_ENABLED: bool = os.getenv("COMPLETION_CACHE_ENABLED", "true").lower() == "true"
+    COMPLETION_CACHE_BACKEND: str = os.getenv("COMPLETION_CACHE_BACKEND", "redis")  # redis, filesystem or memory
+    COMPLETION_CACHE_REDIS_URL: str = os.getenv("COMPLETION_CACHE_REDIS_URL", f"redis://{REDIS_HOST}:{REDIS_PORT}/1")
+    COMPLETION_CACHE_TTL_SECONDS: int = int(os.getenv("COMPLETION_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+    COMPLETION_CACHE_MEMORY_SIZE: int = int(os.getenv("COMPLETION_CACHE_MEMORY_SIZE", 10000))  # entries
+    # Requests sampled above this temperature are never cached
+    COMPLETION_CACHE_MAX_TEMPERATURE: float = float(os.getenv("COMPLETION_CACHE_MAX_TEMPERATURE", 0.0))
+    # Identical deterministic calls in flight at once share one upstream call, across workers
+    # through a lease in the completion cache's persistent tier
+    SINGLE_FLIGHT_ENABLED: bool = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+    SINGLE_FLIGHT_LEASE_SECONDS: float = float(os.getenv("SINGLE_FLIGHT_LEASE_SECONDS", 30))  # renewed while the call runs
+    SINGLE_FLIGHT_WAIT_SECONDS: float = float(os.getenv("SINGLE_FLIGHT_WAIT_SECONDS", 300))  # then waiters call themselves
+    SINGLE_FLIGHT_RESULT_TTL_SECONDS: float = float(os.getenv("SINGLE_FLIGHT_RESULT_TTL_SECONDS", 60))
 
     class Config:
         case_sensitive = True
@@ -1,11 +1,57 @@
+from typing import AsyncIterator
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from app.core.config import settings
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
+def _async_pool_options(url: str) -> dict:
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_POOL_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+
+def _sync_pool_options(url: str) -> dict:
+    if settings.CELERY_WORKER_MODE != "async" or make_url(url).get_backend_name() == "sqlite":
+        return {}
+    # Every pool thread of an async worker may load rows at once. Connections
+    # past DB_POOL_SIZE are closed when returned, since tasks only hold one
+    # while loading and never across their provider calls.
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": max(settings.DB_POOL_MAX_OVERFLOW, settings.CELERY_ASYNC_CONCURRENCY - settings.DB_POOL_SIZE),
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+
+# values_plus_batch sends executemany UPDATEs in pages instead of one round trip per row
+engine = create_engine(
+    settings.SQLALCHEMY_DATABASE_URI,
+    pool_pre_ping=True,
+    executemany_mode="values_plus_batch",
+    **_sync_pool_options(settings.SQLALCHEMY_DATABASE_URI)
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for API endpoints, so queries don't block the event loop
+async_engine = create_async_engine(
+    settings.ASYNC_SQLALCHEMY_DATABASE_URI,
+    pool_pre_ping=True,
+    **_async_pool_options(settings.ASYNC_SQLALCHEMY_DATABASE_URI)
+)
+class AsyncBackedSession(Session):
+    """Sync session behind AsyncSessionLocal sessions; its own class so session events can target them."""
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    expire_on_commit=False,
+    autoflush=False,
+    sync_session_class=AsyncBackedSession
+)
+
 Base = declarative_base()
 
 # Dependency
@@ -14,4 +60,8 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Coroutine, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class WorkerEventLoop:
+    """
+    A persistent asyncio event loop running in a background thread of the
+    worker process. Tasks submit coroutines from their own threads and block
+    until the result is ready, so with a threaded Celery pool one process keeps
+    many I/O-bound coroutines in flight on a single loop.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The running loop, started on first use and restarted after a fork."""
+        if self._loop is None or self._pid != os.getpid():
+            with self._lock:
+                if self._loop is None or self._pid != os.getpid():
+                    self._start()
+        return self._loop
+
+    def _start(self) -> None:
+        ready = threading.Event()
+        loop = asyncio.new_event_loop()
+
+        def run_loop() -> None:
+            asyncio.set_event_loop(loop)
+            loop.call_soon(ready.set)
+            loop.run_forever()
+
+        self._thread = threading.Thread(target=run_loop, name="worker-event-loop", daemon=True)
+        self._thread.start()
+        ready.wait()
+        self._loop = loop
+        self._pid = os.getpid()
+        logger.info(f"Started worker event loop in process {self._pid}")
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+        """Run a coroutine on the loop and wait for its result."""
+        future = asyncio.run_coroutine_threadsafe(self._track(coro), self.loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    async def _track(self, coro: Coroutine[Any, Any, T]) -> T:
+        self.in_flight += 1
+        try:
+            return await coro
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def stop(self) -> None:
+        """Stop the loop once the coroutines already scheduled have been cancelled."""
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                return
+            loop = self._loop
+            self._loop = None
+
+        async def shutdown() -> None:
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            loop.stop()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), loop)
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._loop is not None and self._pid == os.getpid(),
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+        }
+
+# Global instance
+worker_loop = WorkerEventLoop()
@@ -40,13 +40,30 @@ class APIKeyError(CustomException):
             status_code=401
         )
 
-class RateLimitError(CustomException):
+class TransientProviderError(CustomException):
+    """A provider failure that may succeed if the call is retried later."""
+
+class RateLimitError(TransientProviderError):
     def __init__(self, provider: str):
         super().__init__(
             detail=f"Rate limit exceeded for {provider}",
             status_code=429
         )
 
+class ProviderTimeoutError(TransientProviderError):
+    def __init__(self, provider: str):
+        super().__init__(
+            detail=f"Request to {provider} timed out",
+            status_code=504
+        )
+
+class ProviderUnavailableError(TransientProviderError):
+    def __init__(self, provider: str, message: str):
+        super().__init__(
+            detail=f"{provider} is unavailable: {message}",
+            status_code=503
+        )
+
 class DatabaseError(CustomException):
     def __init__(self, message: str):
         super().__init__(
@@ -66,4 +83,11 @@ class PermissionError(CustomException):
         super().__init__(
             detail=f"Not enough permissions to access {resource}",
             status_code=403
-        ) 
\ No newline at end of file
+        ) 
+
+class StorageError(CustomException):
+    def __init__(self, message: str):
+        super().__init__(
+            detail=f"Storage error: {message}",
+            status_code=500
+        )
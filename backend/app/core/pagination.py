@@ -0,0 +1,17 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    """Encode the (created_at, id) keyset position of the last row on a page."""
+    payload = json.dumps([created_at.isoformat(), row_id])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor from encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), str(row_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
@@ -0,0 +1,149 @@
+import logging
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from app.analytics.archive import archive_table
+from app.analytics.export import dataset_path, read_watermark
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "evaluations"
+DEFAULT_PARTITION = "evaluations_default"
+_BOUND = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+@dataclass
+class Partition:
+    name: str
+    start: Optional[datetime]  # None for MINVALUE
+    end: Optional[datetime]  # None for the default partition
+
+def month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+def add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+def partition_name(start: date) -> str:
+    return f"{PARENT_TABLE}_y{start.year}m{start.month:02d}"
+
+def _parse_bound(value: str) -> Optional[datetime]:
+    value = value.strip()
+    if value.upper() in ("MINVALUE", "MAXVALUE"):
+        return None
+    parsed = datetime.fromisoformat(value.strip("'"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def list_partitions(conn: Connection) -> List[Partition]:
+    """The partitions currently attached to evaluations, ordered by start."""
+    rows = conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:parent AS regclass)
+    """), {"parent": PARENT_TABLE}).all()
+
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND.search(bound)
+        if match:
+            partitions.append(Partition(name, _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+        else:
+            partitions.append(Partition(name, None, None))
+    return sorted(partitions, key=lambda p: (p.start is not None, p.start or datetime.min.replace(tzinfo=timezone.utc)))
+
+def list_detached(conn: Connection) -> List[Tuple[str, str]]:
+    """
+    The (schema, name) of each partition recorded by detach_partition that
+    still exists, as a plain table in the parent's schema, and so has not
+    been archived and dropped yet.
+    """
+    rows = conn.execute(text("""
+        SELECT n.nspname, d.name
+        FROM detached_partitions d
+        JOIN pg_class c ON c.relname = d.name
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relnamespace = (SELECT relnamespace FROM pg_class WHERE oid = CAST(:parent AS regclass))
+          AND c.relkind = 'r' AND NOT c.relispartition
+        ORDER BY d.name
+    """), {"parent": PARENT_TABLE}).all()
+    return [(schema, name) for schema, name in rows]
+
+def ensure_partitions(conn: Connection, months_ahead: Optional[int] = None) -> List[str]:
+    """Create monthly partitions from the end of the last one through months_ahead months from now."""
+    months_ahead = settings.PARTITION_PREMAKE_MONTHS if months_ahead is None else months_ahead
+    ends = [p.end for p in list_partitions(conn) if p.end is not None]
+    current = month_start(datetime.now(timezone.utc))
+    start = max(month_start(max(ends)), current) if ends else current
+    last = add_months(current, months_ahead)
+
+    created = []
+    while start <= last:
+        name = partition_name(start)
+        end = add_months(start, 1)
+        conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF {PARENT_TABLE} '
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        created.append(name)
+        start = end
+    return created
+
+def detach_partition(conn: Connection, name: str) -> None:
+    """Detach a partition, recording it in the same transaction for list_detached."""
+    conn.execute(text("INSERT INTO detached_partitions (name) VALUES (:name)"), {"name": name})
+    # CONCURRENTLY is not allowed while a default partition exists
+    conn.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{name}"'))
+
+def archive_expired_partitions(
+    engine: Engine,
+    retention_months: Optional[int] = None,
+    root: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Detach partitions whose whole range is older than retention_months,
+    write them to the Parquet archive, then drop them and their score rows.
+    Partitions the analytics export has not passed yet are kept, so the
+    analytics dataset never misses archived rows.
+    """
+    retention_months = settings.EVALUATION_RETENTION_MONTHS if retention_months is None else retention_months
+    cutoff = add_months(month_start(datetime.now(timezone.utc)), -retention_months)
+    watermark = read_watermark(dataset_path(root))
+    exported_until = watermark[0] if watermark else None
+    if exported_until is not None and exported_until.tzinfo is None:
+        exported_until = exported_until.replace(tzinfo=timezone.utc)
+
+    with engine.begin() as conn:
+        expired = [
+            p for p in list_partitions(conn)
+            if p.name != DEFAULT_PARTITION and p.end is not None and p.end.date() <= cutoff
+        ]
+        for partition in expired:
+            if exported_until is None or exported_until < partition.end:
+                logger.warning(f"Keeping {partition.name}: not yet in the analytics export")
+                continue
+            detach_partition(conn, partition.name)
+            logger.info(f"Detached {partition.name}")
+
+    # Includes partitions detached by an earlier run that failed midway
+    with engine.connect() as conn:
+        detached = list_detached(conn)
+
+    archived = []
+    for schema, name in detached:
+        table = f'"{schema}"."{name}"'
+        with engine.connect() as conn:
+            rows = archive_table(conn, name, root, schema=schema)
+        with engine.begin() as conn:
+            conn.execute(text(
+                f'DELETE FROM evaluation_scores WHERE evaluation_id IN (SELECT id FROM {table})'
+            ))
+            conn.execute(text(f"DROP TABLE {table}"))
+            conn.execute(text("DELETE FROM detached_partitions WHERE name = :name"), {"name": name})
+        logger.info(f"Archived {rows} evaluations from {name}")
+        archived.append({"partition": name, "rows": rows})
+
+    return {"archived": archived}
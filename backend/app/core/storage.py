@@ -0,0 +1,218 @@
+import hashlib
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional
+import zstandard
+from app.core.config import settings
+from app.core.exceptions import StorageError
+
+# Parallel reads when fetching many blobs from S3
+S3_READ_WORKERS = 16
+
+def blob_key(data: bytes) -> str:
+    """The content address of a blob: the SHA-256 of its uncompressed bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+class BlobStore(ABC):
+    """
+    Content-addressed store of zstd-compressed blobs. Blobs are keyed by
+    the hash of their content, so storing the same content twice writes it
+    once, and a stored blob never changes.
+    """
+    read_workers = 1
+
+    def __init__(self, compression_level: Optional[int] = None):
+        self.compression_level = compression_level or settings.BLOB_COMPRESSION_LEVEL
+        # zstd contexts are not thread-safe
+        self._local = threading.local()
+
+    def _compressor(self) -> zstandard.ZstdCompressor:
+        if not hasattr(self._local, "compressor"):
+            self._local.compressor = zstandard.ZstdCompressor(level=self.compression_level, write_checksum=True)
+        return self._local.compressor
+
+    def _decompressor(self) -> zstandard.ZstdDecompressor:
+        if not hasattr(self._local, "decompressor"):
+            self._local.decompressor = zstandard.ZstdDecompressor()
+        return self._local.decompressor
+
+    def put(self, data: bytes) -> str:
+        """Store data unless it is already stored and return its key."""
+        key = blob_key(data)
+        if not self.exists(key):
+            self._write(key, self._compressor().compress(data))
+        return key
+
+    def get(self, key: str) -> bytes:
+        try:
+            return self._decompressor().decompress(self._read(key))
+        except zstandard.ZstdError as e:
+            raise StorageError(f"Blob {key} is corrupt: {str(e)}")
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(dict.fromkeys(keys))
+        if self.read_workers <= 1 or len(keys) <= 1:
+            return {key: self.get(key) for key in keys}
+        with ThreadPoolExecutor(max_workers=min(self.read_workers, len(keys))) as executor:
+            return dict(zip(keys, executor.map(self.get, keys)))
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        pass
+
+    @abstractmethod
+    def _write(self, key: str, compressed: bytes) -> None:
+        """Store compressed bytes under key."""
+        pass
+
+    @abstractmethod
+    def _read(self, key: str) -> bytes:
+        """The compressed bytes stored under key. Raises StorageError if there are none."""
+        pass
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files under root, fanned out by the first bytes of the key."""
+
+    def __init__(self, root: Optional[str] = None, compression_level: Optional[int] = None):
+        super().__init__(compression_level)
+        self.root = root or os.path.join(settings.LOCAL_STORAGE_PATH, "blobs")
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], f"{key}.zst")
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def _write(self, key: str, compressed: bytes) -> None:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Concurrent writers of the same blob write the same bytes, so the last rename wins harmlessly
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+
+    def _read(self, key: str) -> bytes:
+        try:
+            with open(self.path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise StorageError(f"Blob {key} not found")
+
+class S3BlobStore(BlobStore):
+    """Blobs as objects in an S3 bucket, or any S3-compatible server given by endpoint_url."""
+    read_workers = S3_READ_WORKERS
+
+    def __init__(
+        self,
+        bucket: Optional[str] = None,
+        prefix: Optional[str] = None,
+        endpoint_url: Optional[str] = None,
+        client: Any = None,
+        compression_level: Optional[int] = None
+    ):
+        super().__init__(compression_level)
+        self.bucket = bucket or settings.S3_BUCKET
+        self.prefix = (prefix if prefix is not None else settings.S3_PREFIX).strip("/")
+        if not self.bucket:
+            raise StorageError("S3_BUCKET is not configured")
+        # Imported here so the local store works without boto3 installed
+        from botocore.exceptions import ClientError
+        self._client_error = ClientError
+        if client is None:
+            import boto3
+            # Credentials and region come from the usual AWS environment variables
+            client = boto3.client("s3", endpoint_url=endpoint_url or settings.S3_ENDPOINT_URL)
+        self.client = client
+
+    def object_key(self, key: str) -> str:
+        name = f"{key[:2]}/{key}.zst"
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+            return True
+        except self._client_error as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise StorageError(f"Failed to check blob {key}: {str(e)}")
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+
+    def _write(self, key: str, compressed: bytes) -> None:
+        try:
+            self.client.put_object(
+                Bucket=self.bucket,
+                Key=self.object_key(key),
+                Body=compressed,
+                ContentType="application/zstd"
+            )
+        except self._client_error as e:
+            raise StorageError(f"Failed to write blob {key}: {str(e)}")
+
+    def _read(self, key: str) -> bytes:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.object_key(key))["Body"].read()
+        except self._client_error as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                raise StorageError(f"Blob {key} not found")
+            raise StorageError(f"Failed to read blob {key}: {str(e)}")
+
+def create_blob_store(storage_type: Optional[str] = None) -> BlobStore:
+    storage_type = storage_type or settings.STORAGE_TYPE
+    if storage_type == "local":
+        return LocalBlobStore()
+    if storage_type == "s3":
+        return S3BlobStore()
+    raise ValueError(f"Unsupported storage type: {storage_type}")
+
+_blob_store: Optional[BlobStore] = None
+_blob_store_lock = threading.Lock()
+
+def get_blob_store() -> BlobStore:
+    """
+    The store configured by STORAGE_TYPE, created on first use, so importing
+    this module works without the storage settings a store needs.
+    """
+    global _blob_store
+    if _blob_store is None:
+        with _blob_store_lock:
+            if _blob_store is None:
+                _blob_store = create_blob_store()
+    return _blob_store
+
+def completion_columns(completion: Optional[str], store: Optional[BlobStore] = None) -> Dict[str, Any]:
+    """
+    Evaluation column values for a completion. Completions of at least
+    COMPLETION_BLOB_MIN_BYTES are written to the blob store and the row keeps
+    only their hash; shorter ones stay inline.
+    """
+    if completion is None:
+        return {"completion": None, "completion_hash": None, "completion_size": None}
+    data = completion.encode("utf-8")
+    if len(data) < settings.COMPLETION_BLOB_MIN_BYTES:
+        return {"completion": completion, "completion_hash": None, "completion_size": len(data)}
+    return {
+        "completion": None,
+        "completion_hash": (store or get_blob_store()).put(data),
+        "completion_size": len(data)
+    }
+
+def load_completions(hashes: Iterable[str], store: Optional[BlobStore] = None) -> Dict[str, str]:
+    """Read blob-stored completions by hash."""
+    blobs = (store or get_blob_store()).get_many(hashes)
+    return {key: data.decode("utf-8") for key, data in blobs.items()}
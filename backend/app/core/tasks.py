@@ -0,0 +1,31 @@
+import logging
+from typing import Any, Dict
+from app.analytics.export import export_evaluations
+from app.core.celery_app import celery_app
+from app.core.database import SessionLocal, engine
+from app.core.partitions import archive_expired_partitions, ensure_partitions
+
+logger = logging.getLogger(__name__)
+
+@celery_app.task
+def export_evaluations_to_parquet() -> Dict[str, Any]:
+    """Append newly finished evaluations to the Parquet analytics dataset."""
+    db = SessionLocal()
+    try:
+        return {"status": "success", **export_evaluations(db)}
+    except Exception as e:
+        logger.error(f"Parquet export failed: {str(e)}", exc_info=True)
+        return {"status": "error", "error": str(e)}
+    finally:
+        db.close()
+
+@celery_app.task
+def maintain_evaluation_partitions() -> Dict[str, Any]:
+    """Create upcoming monthly partitions and archive the ones past retention."""
+    try:
+        with engine.begin() as conn:
+            created = ensure_partitions(conn)
+        return {"status": "success", "created": created, **archive_expired_partitions(engine)}
+    except Exception as e:
+        logger.error(f"Partition maintenance failed: {str(e)}", exc_info=True)
+        return {"status": "error", "error": str(e)}
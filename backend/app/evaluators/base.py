@@ -3,6 +3,9 @@ from typing import Dict, Any, Optional, List
 from app.models.models import Model, Prompt, Evaluation
 from app.core.exceptions import EvaluationError
 
+# Keys of Model.parameters sent to the provider with every completion request
+COMPLETION_PARAMETERS = ("temperature", "max_tokens", "top_p", "frequency_penalty", "presence_penalty", "seed", "stop")
+
 class BaseEvaluator(ABC):
     """Base class for all evaluators."""
     
@@ -49,7 +52,7 @@ class BaseEvaluator(ABC):
                 prompt_id=prompt.id,
                 completion=completion,
                 scores=metrics,
-                metadata={
+                metadata_={
                     "evaluator": self.__class__.__name__,
                     "model_parameters": self.model.parameters
                 }
@@ -60,6 +63,31 @@ class BaseEvaluator(ABC):
         except Exception as e:
             raise EvaluationError(str(e))
     
+    async def evaluate_batch(
+        self,
+        prompts: List[Prompt],
+        completions: List[str]
+    ) -> List[Dict[str, float]]:
+        """
+        Calculate metrics for many (prompt, completion) pairs at once.
+        Evaluators with a vectorized implementation override this; the default
+        falls back to calculate_metrics for each item.
+        """
+        if len(prompts) != len(completions):
+            raise EvaluationError("Number of prompts and completions must match")
+            
+        results = []
+        for prompt, completion in zip(prompts, completions):
+            metrics = await self.calculate_metrics(completion, self.get_expected(prompt))
+            results.append(dict(metrics))
+        return results
+    
+    def get_expected(self, prompt: Prompt) -> Optional[str]:
+        """
+        Get the expected answer for a prompt, if it has one.
+        """
+        return (prompt.metadata_ or {}).get("expected_answer")
+    
     @abstractmethod
     async def get_completion(self, prompt: Prompt) -> str:
         """
@@ -67,6 +95,14 @@ class BaseEvaluator(ABC):
         """
         pass
     
+    def completion_parameters(self) -> Dict[str, Any]:
+        """
+        Sampling parameters for the model's completion requests, taken from
+        its parameters. Unset ones are left to the provider call's defaults.
+        """
+        parameters = self.model.parameters or {}
+        return {name: parameters[name] for name in COMPLETION_PARAMETERS if parameters.get(name) is not None}
+    
     def add_metric(self, name: str, value: float) -> None:
         """
         Add a metric to the evaluator's metrics dictionary.
@@ -75,9 +111,9 @@ class BaseEvaluator(ABC):
     
     def get_metrics(self) -> Dict[str, float]:
         """
-        Get all calculated metrics.
+        Get a copy of all calculated metrics.
         """
-        return self.metrics
+        return dict(self.metrics)
     
     @abstractmethod
     def get_supported_metrics(self) -> List[str]:
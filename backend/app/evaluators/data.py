@@ -0,0 +1,114 @@
+import threading
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+from cachetools import TTLCache
+from sqlalchemy.orm import Session, selectinload
+from app.core.config import settings
+from app.models.models import Evaluation, Model, Prompt
+
+# Max number of IDs per IN (...) clause
+IN_CHUNK_SIZE = 1000
+
+class EvaluationRows(NamedTuple):
+    evaluation: Evaluation
+    model: Optional[Model]
+    prompt: Optional[Prompt]
+
+def _chunks(ids: Sequence[str], size: int = IN_CHUNK_SIZE) -> Iterable[Sequence[str]]:
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+class EvaluationDataLoader:
+    """
+    Loads the rows needed to run a batch of evaluations with a few IN (...)
+    queries. Model and Prompt rows are detached from the session and kept in
+    a per-process TTL cache, since a suite reuses the same ones constantly;
+    treat them as read-only.
+    """
+
+    def __init__(self, ttl: Optional[int] = None, max_size: Optional[int] = None):
+        ttl = ttl or settings.ROW_CACHE_TTL_SECONDS
+        max_size = max_size or settings.ROW_CACHE_MAX_SIZE
+        self._models: TTLCache = TTLCache(maxsize=max_size, ttl=ttl)
+        self._prompts: TTLCache = TTLCache(maxsize=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, db: Session, evaluation_ids: Sequence[str]) -> Dict[str, EvaluationRows]:
+        """Load evaluations with their model and prompt, keyed by evaluation ID."""
+        evaluations: List[Evaluation] = []
+        for chunk in _chunks(list(dict.fromkeys(evaluation_ids))):
+            evaluations.extend(db.query(Evaluation).filter(Evaluation.id.in_(chunk)).all())
+
+        models = self._get_rows(db, Model, self._models, {e.model_id for e in evaluations})
+        prompts = self._get_rows(
+            db, Prompt, self._prompts, {e.prompt_id for e in evaluations},
+            options=[selectinload(Prompt.embeddings)]
+        )
+
+        return {
+            e.id: EvaluationRows(e, models.get(e.model_id), prompts.get(e.prompt_id))
+            for e in evaluations
+        }
+
+    def _get_rows(
+        self,
+        db: Session,
+        entity: Any,
+        cache: TTLCache,
+        ids: Iterable[str],
+        options: Sequence[Any] = ()
+    ) -> Dict[str, Any]:
+        rows: Dict[str, Any] = {}
+        missing: List[str] = []
+        with self._lock:
+            for row_id in ids:
+                row = cache.get(row_id)
+                if row is None:
+                    missing.append(row_id)
+                else:
+                    rows[row_id] = row
+            self.hits += len(rows)
+            self.misses += len(missing)
+
+        for chunk in _chunks(missing):
+            loaded = db.query(entity).options(*options).filter(entity.id.in_(chunk)).all()
+            for row in loaded:
+                # Detach so later commits on this session don't expire the cached copy
+                db.expunge(row)
+                rows[row.id] = row
+            with self._lock:
+                for row in loaded:
+                    cache[row.id] = row
+
+        return rows
+
+    def invalidate(
+        self,
+        model_ids: Iterable[str] = (),
+        prompt_ids: Iterable[str] = ()
+    ) -> None:
+        """Drop cached rows so the next load reads them again."""
+        with self._lock:
+            for model_id in model_ids:
+                self._models.pop(model_id, None)
+            for prompt_id in prompt_ids:
+                self._prompts.pop(prompt_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+            self._prompts.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "models": len(self._models),
+            "prompts": len(self._prompts),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+# Global instance
+data_loader = EvaluationDataLoader()
@@ -0,0 +1,139 @@
+import io
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Type, Union
+import numpy as np
+
+class EmbeddingBackend(ABC):
+    """
+    Base class for embedding model runtimes.
+    encode() follows SentenceTransformer.encode, so backends can be swapped
+    wherever a sentence embedding model is expected.
+    """
+
+    backend: str = ""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    @abstractmethod
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Encode one batch of texts into unnormalized float32 embeddings."""
+        pass
+
+    def encode(
+        self,
+        sentences: Union[str, Sequence[str]],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        **kwargs
+    ) -> np.ndarray:
+        """Encode one text or a list of texts."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        chunks = [
+            self._encode_batch(texts[start:start + batch_size])
+            for start in range(0, len(texts), batch_size)
+        ]
+        vectors = np.concatenate(chunks).astype(np.float32) if chunks else np.empty((0, 0), dtype=np.float32)
+        if normalize_embeddings and len(vectors):
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, 1e-12)
+        return vectors[0] if single else vectors
+
+    def memory_bytes(self) -> Optional[int]:
+        """Approximate memory held by the model weights."""
+        return None
+
+def _torch_state_bytes(module) -> int:
+    """Serialized size of a torch module's state, which also counts packed int8 weights."""
+    import torch
+    buffer = io.BytesIO()
+    torch.save(module.state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Reference backend: fp32 PyTorch through sentence-transformers."""
+
+    backend = "torch"
+
+    def __init__(self, model_name: str, device: Optional[str] = None):
+        super().__init__(model_name)
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device=device)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+
+    def memory_bytes(self) -> Optional[int]:
+        return _torch_state_bytes(self.model)
+
+class QuantizedTorchBackend(SentenceTransformerBackend):
+    """CPU backend with int8 dynamic quantization of every Linear layer."""
+
+    backend = "torch-int8"
+
+    def __init__(self, model_name: str):
+        super().__init__(model_name, device="cpu")
+        import torch
+        self.model = torch.quantization.quantize_dynamic(
+            self.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+class OnnxBackend(EmbeddingBackend):
+    """CPU backend running an ONNX export of the model with ONNX Runtime and mean pooling."""
+
+    backend = "onnx"
+    max_seq_length = 256
+
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError("The onnx embedding backend requires optimum[onnxruntime]") from e
+
+        model_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(model_id, export=True)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np"
+        )
+        token_embeddings = np.asarray(self.model(**inputs).last_hidden_state, dtype=np.float32)
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def memory_bytes(self) -> Optional[int]:
+        model_path = getattr(self.model, "model_path", None)
+        if model_path and os.path.exists(model_path):
+            return os.path.getsize(model_path)
+        return None
+
+EMBEDDING_BACKENDS: Dict[str, Type[EmbeddingBackend]] = {
+    SentenceTransformerBackend.backend: SentenceTransformerBackend,
+    QuantizedTorchBackend.backend: QuantizedTorchBackend,
+    OnnxBackend.backend: OnnxBackend,
+}
+
+REFERENCE_BACKEND = SentenceTransformerBackend.backend
+
+def load_backend(model_name: str, backend: str) -> EmbeddingBackend:
+    """Instantiate an embedding backend by its settings name."""
+    backend_class = EMBEDDING_BACKENDS.get(backend)
+    if backend_class is None:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    return backend_class(model_name)
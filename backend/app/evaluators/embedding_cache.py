@@ -0,0 +1,107 @@
+import hashlib
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+import diskcache
+import numpy as np
+from cachetools import LRUCache
+from app.core.config import settings
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by (embedding model, text hash).
+    Vectors are stored as float16 bytes. With CACHE_TYPE=filesystem the cache
+    lives in a diskcache under CACHE_DIR and survives restarts; otherwise an
+    in-process LRU is used. Both are bounded by EMBEDDING_CACHE_SIZE_LIMIT bytes.
+    """
+
+    def __init__(
+        self,
+        cache_type: Optional[str] = None,
+        directory: Optional[str] = None,
+        size_limit: Optional[int] = None
+    ):
+        self.cache_type = cache_type or settings.CACHE_TYPE
+        self.directory = directory or os.path.join(settings.CACHE_DIR, "embeddings")
+        self.size_limit = size_limit or settings.EMBEDDING_CACHE_SIZE_LIMIT
+        self.hits = 0
+        self.misses = 0
+        self._store: Any = None
+        self._lock = threading.Lock()
+
+    @property
+    def store(self) -> Any:
+        """Open the backing store on first use."""
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = self._open_store()
+        return self._store
+
+    def _open_store(self) -> Any:
+        if self.cache_type == "filesystem":
+            return diskcache.Cache(
+                self.directory,
+                size_limit=self.size_limit,
+                eviction_policy="least-recently-used",
+            )
+        return LRUCache(maxsize=self.size_limit, getsizeof=len)
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model_name}:{digest}"
+
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        """Get a cached embedding, or None on a miss."""
+        return self.get_many(model_name, [text])[0]
+
+    def get_many(self, model_name: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Get cached embeddings for texts, with None for every miss."""
+        store = self.store
+        results: List[Optional[np.ndarray]] = []
+        with self._lock:
+            for text in texts:
+                value = store.get(self.make_key(model_name, text))
+                if value is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(np.frombuffer(value, dtype=np.float16).astype(np.float32))
+        return results
+
+    def set(self, model_name: str, text: str, embedding: np.ndarray) -> None:
+        self.set_many(model_name, [text], [embedding])
+
+    def set_many(self, model_name: str, texts: Sequence[str], embeddings: Sequence[np.ndarray]) -> None:
+        """Store embeddings for texts."""
+        store = self.store
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                value = np.asarray(embedding, dtype=np.float16).tobytes()
+                store[self.make_key(model_name, text)] = value
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and the current cache size."""
+        total = self.hits + self.misses
+        store = self.store
+        return {
+            "cache_type": self.cache_type,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "items": len(store),
+            "size_bytes": store.volume() if self.cache_type == "filesystem" else store.currsize,
+        }
+
+    def clear(self) -> None:
+        """Remove all cached embeddings and reset the counters."""
+        with self._lock:
+            if self._store is not None:
+                self._store.clear()
+            self.hits = 0
+            self.misses = 0
+
+# Global instance
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core.config import settings
+from app.evaluators.embedding_backends import REFERENCE_BACKEND, load_backend
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class EmbeddingModelInfo:
+    """Load statistics for a registered embedding model."""
+    name: str
+    backend: str
+    load_time_s: float
+    memory_bytes: Optional[int]
+    loaded_at: float
+
+def embedding_key(name: Optional[str] = None, backend: Optional[str] = None) -> str:
+    """
+    Identify an embedding model and the backend running it.
+    The reference backend uses the bare model name, so vectors cached or stored
+    before backends were selectable stay valid; others are "<model>@<backend>".
+    """
+    name = name or settings.EMBEDDING_MODEL_NAME
+    backend = backend or settings.EMBEDDING_BACKEND
+    return name if backend == REFERENCE_BACKEND else f"{name}@{backend}"
+
+def parse_embedding_key(key: str) -> Tuple[str, str]:
+    """Split an embedding key into (model name, backend)."""
+    name, _, backend = key.partition("@")
+    return name, backend or REFERENCE_BACKEND
+
+def _model_memory_bytes(model: Any) -> Optional[int]:
+    try:
+        return model.memory_bytes() if hasattr(model, "memory_bytes") else None
+    except Exception:
+        return None
+
+def encode_bucketed(
+    model: Any,
+    texts: Sequence[str],
+    batch_size: Optional[int] = None
+) -> np.ndarray:
+    """
+    Encode texts into normalized embeddings using length-bucketed mini-batches.
+    Duplicate texts are encoded once, and texts of similar length share a batch
+    to keep padding low. Rows are returned in the order of the input.
+    """
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    unique_texts = list(dict.fromkeys(texts))
+    if not unique_texts:
+        return np.empty((0, 0), dtype=np.float32)
+
+    order = sorted(range(len(unique_texts)), key=lambda i: len(unique_texts[i]))
+    chunks = []
+    for start in range(0, len(order), batch_size):
+        bucket = [unique_texts[i] for i in order[start:start + batch_size]]
+        chunks.append(np.asarray(model.encode(
+            bucket,
+            batch_size=len(bucket),
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        ), dtype=np.float32))
+
+    unique_embeddings = np.empty((len(unique_texts), chunks[0].shape[1]), dtype=np.float32)
+    unique_embeddings[order] = np.concatenate(chunks)
+
+    positions = {text: i for i, text in enumerate(unique_texts)}
+    return unique_embeddings[[positions[text] for text in texts]]
+
+class EmbeddingModelRegistry:
+    """
+    Process-wide registry that loads each embedding model once and hands the
+    same instance to every evaluator. Models are keyed by embedding_key(), so
+    the same model can be loaded on more than one backend.
+    """
+
+    def __init__(self, loader: Optional[Callable[[str, str], Any]] = None):
+        self._loader = loader or load_backend
+        self._models: Dict[str, Any] = {}
+        self._info: Dict[str, EmbeddingModelInfo] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: Optional[str] = None) -> Any:
+        """Return the shared instance of an embedding model, loading it on first use."""
+        name = name or embedding_key()
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                model = self._load(name)
+        return model
+
+    def _load(self, name: str) -> Any:
+        model_name, backend = parse_embedding_key(name)
+        logger.info(f"Loading embedding model: {model_name} ({backend})")
+        start = time.perf_counter()
+        model = self._loader(model_name, backend)
+        load_time = time.perf_counter() - start
+
+        info = EmbeddingModelInfo(
+            name=name,
+            backend=backend,
+            load_time_s=load_time,
+            memory_bytes=_model_memory_bytes(model),
+            loaded_at=time.time(),
+        )
+        self._models[name] = model
+        self._info[name] = info
+        logger.info(
+            f"Loaded embedding model {name} in {load_time:.2f}s "
+            f"({info.memory_bytes or 'unknown'} bytes)"
+        )
+        return model
+
+    def register(self, name: str, model: Any) -> None:
+        """Install an already loaded model under the given name."""
+        with self._lock:
+            self._models[name] = model
+            self._info[name] = EmbeddingModelInfo(
+                name=name,
+                backend=parse_embedding_key(name)[1],
+                load_time_s=0.0,
+                memory_bytes=_model_memory_bytes(model),
+                loaded_at=time.time(),
+            )
+
+    def warm_up(self, names: Optional[List[str]] = None) -> List[EmbeddingModelInfo]:
+        """Eagerly load models, e.g. when a worker process starts."""
+        names = names or [embedding_key()]
+        for name in names:
+            self.get(name)
+        return [self._info[name] for name in names]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get load time and memory statistics for every loaded model."""
+        return {name: asdict(info) for name, info in self._info.items()}
+
+    def clear(self) -> None:
+        """Drop all loaded models."""
+        with self._lock:
+            self._models.clear()
+            self._info.clear()
+
+@dataclass
+class ParityReport:
+    """Similarity-score agreement between a candidate backend and the reference."""
+    reference: str
+    candidate: str
+    pairs: int
+    max_abs_diff: float
+    mean_abs_diff: float
+    tolerance: float
+
+    @property
+    def passed(self) -> bool:
+        return self.max_abs_diff <= self.tolerance
+
+def pair_similarities(model: Any, pairs: Sequence[Tuple[str, str]]) -> np.ndarray:
+    """Cosine similarity of each (text, text) pair."""
+    embeddings = encode_bucketed(model, [text for pair in pairs for text in pair])
+    return np.einsum("ij,ij->i", embeddings[0::2], embeddings[1::2])
+
+def check_parity(
+    reference: Any,
+    candidate: Any,
+    pairs: Sequence[Tuple[str, str]],
+    tolerance: Optional[float] = None
+) -> ParityReport:
+    """
+    Compare similarity scores from a candidate backend against the reference
+    backend over the same text pairs.
+    """
+    tolerance = settings.EMBEDDING_PARITY_TOLERANCE if tolerance is None else tolerance
+    diffs = np.abs(pair_similarities(reference, pairs) - pair_similarities(candidate, pairs))
+    return ParityReport(
+        reference=getattr(reference, "backend", type(reference).__name__),
+        candidate=getattr(candidate, "backend", type(candidate).__name__),
+        pairs=len(pairs),
+        max_abs_diff=float(diffs.max()) if len(diffs) else 0.0,
+        mean_abs_diff=float(diffs.mean()) if len(diffs) else 0.0,
+        tolerance=tolerance,
+    )
+
+# Global instance
+embedding_registry = EmbeddingModelRegistry()
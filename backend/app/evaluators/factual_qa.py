@@ -1,16 +1,82 @@
-from typing import Dict, Optional, List
+import asyncio
+from typing import Any, Dict, Optional, List
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from app.evaluators.base import BaseEvaluator
+from app.evaluators.embeddings import embedding_key, embedding_registry, encode_bucketed
+from app.evaluators.embedding_cache import embedding_cache
+from app.evaluators.reference_embeddings import get_stored_embedding
 from app.models.models import Model, Prompt
+from app.core.config import settings
 from app.core.exceptions import EvaluationError
 
+def presence_ratio(overlap: Any, totals: Any) -> np.ndarray:
+    """
+    Share of each expected answer's tokens found in its completion. An
+    expected answer without tokens scores 0. Used by the per-item and the
+    batch scoring paths, so both agree on every input.
+    """
+    totals = np.asarray(totals, dtype=np.float64)
+    return np.divide(overlap, totals, out=np.zeros(totals.shape), where=totals > 0)
+
+class ScoringContext:
+    """
+    Per-call scoring state for a (completion, expected) pair.
+    Both texts are encoded together in a single batch the first time a metric
+    needs them, and the vectors are reused for every metric after that. When
+    the expected answer's embedding is already known only the completion is
+    encoded. Encoding blocks, so use it off the event loop.
+    """
+
+    def __init__(
+        self,
+        embedding_model: Any,
+        completion: str,
+        expected: str,
+        expected_embedding: Optional[np.ndarray] = None
+    ):
+        self.embedding_model = embedding_model
+        self.completion = completion
+        self.expected = expected
+        self.expected_embedding = expected_embedding
+        self._embeddings: Optional[np.ndarray] = None
+        self._similarity: Optional[float] = None
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Normalized embeddings of the completion and expected answer."""
+        if self._embeddings is None:
+            if self.expected_embedding is not None:
+                completion_emb = self._encode([self.completion])[0]
+                self._embeddings = np.stack([completion_emb, self.expected_embedding])
+            else:
+                self._embeddings = self._encode([self.completion, self.expected])
+        return self._embeddings
+
+    @property
+    def similarity(self) -> float:
+        """Cosine similarity between the completion and expected answer."""
+        if self._similarity is None:
+            completion_emb, expected_emb = self.embeddings
+            self._similarity = float(np.dot(completion_emb, expected_emb))
+        return self._similarity
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        try:
+            return np.asarray(self.embedding_model.encode(
+                texts,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            ), dtype=np.float32)
+        except Exception as e:
+            raise EvaluationError(f"Error calculating similarity: {str(e)}")
+
 class FactualQAEvaluator(BaseEvaluator):
     """Evaluator for factual question-answering tasks."""
     
     def __init__(self, model: Model):
         super().__init__(model)
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.embedding_model_name = embedding_key()
+        self.embedding_model = embedding_registry.get(self.embedding_model_name)
         self.metrics_list = [
             "semantic_similarity",
             "answer_presence",
@@ -19,51 +85,113 @@ class FactualQAEvaluator(BaseEvaluator):
     
     async def evaluate(self, prompt: Prompt) -> Dict[str, float]:
         """Run evaluation for factual QA."""
-        if "expected_answer" not in prompt.metadata:
+        if "expected_answer" not in (prompt.metadata_ or {}):
             raise EvaluationError("Prompt metadata must contain 'expected_answer'")
             
         completion = await self.get_completion(prompt)
-        metrics = await self.calculate_metrics(completion, prompt.metadata["expected_answer"])
-        return metrics
+        return await self._score_off_loop(completion, prompt.metadata_["expected_answer"], prompt)
     
     async def validate_response(self, completion: str, expected: Optional[str] = None) -> bool:
         """Validate if the response contains a valid answer."""
         if not completion or not expected:
             return False
             
-        similarity = self._calculate_similarity(completion, expected)
-        return similarity > 0.7  # Threshold for valid response
+        def similarity() -> float:
+            context = self._scoring_context(completion, expected)
+            self._cache_expected_embedding(context)
+            return context.similarity
+        
+        # Embedding lookups and encoding block, so they run on a worker thread
+        return await asyncio.to_thread(similarity) > 0.7  # Threshold for valid response
     
     async def calculate_metrics(self, completion: str, expected: Optional[str] = None) -> Dict[str, float]:
         """Calculate evaluation metrics for factual QA."""
         if not expected:
             raise EvaluationError("Expected answer is required for factual QA evaluation")
             
+        return await self._score_off_loop(completion, expected)
+    
+    async def _score_off_loop(
+        self,
+        completion: str,
+        expected: str,
+        prompt: Optional[Prompt] = None
+    ) -> Dict[str, float]:
+        """Score on a worker thread, since embedding lookups and encoding block the event loop."""
+        return await asyncio.to_thread(
+            lambda: self._score(self._scoring_context(completion, expected, prompt))
+        )
+    
+    def _score(self, context: ScoringContext) -> Dict[str, float]:
+        """Calculate all metrics from a scoring context."""
         # Calculate semantic similarity
-        similarity = self._calculate_similarity(completion, expected)
-        self.add_metric("semantic_similarity", float(similarity))
+        self.add_metric("semantic_similarity", context.similarity)
         
         # Check for answer presence
-        answer_presence = self._check_answer_presence(completion, expected)
+        answer_presence = self._check_answer_presence(context.completion, context.expected)
         self.add_metric("answer_presence", float(answer_presence))
         
         # Calculate contradiction score (lower is better)
-        contradiction = self._calculate_contradiction(completion, expected)
+        contradiction = self._calculate_contradiction(context)
         self.add_metric("contradiction_score", float(contradiction))
         
+        self._cache_expected_embedding(context)
         return self.get_metrics()
     
+    async def evaluate_batch(
+        self,
+        prompts: List[Prompt],
+        completions: List[str]
+    ) -> List[Dict[str, float]]:
+        """Calculate factual QA metrics for a batch using vectorized operations."""
+        if len(prompts) != len(completions):
+            raise EvaluationError("Number of prompts and completions must match")
+        if not prompts:
+            return []
+            
+        expected = [self.get_expected(prompt) for prompt in prompts]
+        if not all(expected):
+            raise EvaluationError("Expected answer is required for factual QA evaluation")
+            
+        # Encoding is CPU-bound, so it runs on a worker thread instead of the event loop
+        return await asyncio.to_thread(self._batch_scores, prompts, completions, expected)
+    
+    def _batch_scores(
+        self,
+        prompts: List[Prompt],
+        completions: List[str],
+        expected: List[str]
+    ) -> List[Dict[str, float]]:
+        try:
+            expected_embs = self._encode_expected(prompts, expected)
+            completion_embs = encode_bucketed(self.embedding_model, completions)
+        except Exception as e:
+            raise EvaluationError(f"Error calculating similarity: {str(e)}")
+            
+        similarity = np.einsum("ij,ij->i", completion_embs, expected_embs)
+        answer_presence = self._batch_answer_presence(completions, expected)
+        contradiction = 1.0 - similarity
+        
+        return [
+            {
+                "semantic_similarity": float(similarity[i]),
+                "answer_presence": float(answer_presence[i]),
+                "contradiction_score": float(contradiction[i])
+            }
+            for i in range(len(prompts))
+        ]
+    
     async def get_completion(self, prompt: Prompt) -> str:
         """Get completion from the model."""
         # Implementation depends on model provider
         if self.model.provider == "openai":
             # Use OpenAI API
             from app.services.openai import get_completion
-            return await get_completion(self.model, prompt.content)
+            return await get_completion(self.model, prompt.content, **self.completion_parameters())
         elif self.model.provider == "anthropic":
             # Use Anthropic API
             from app.services.anthropic import get_completion
-            return await get_completion(self.model, prompt.content)
+            return await get_completion(self.model, prompt.content, **self.completion_parameters())
         else:
             raise EvaluationError(f"Unsupported model provider: {self.model.provider}")
     
@@ -71,18 +199,44 @@ class FactualQAEvaluator(BaseEvaluator):
         """Get list of supported metrics."""
         return self.metrics_list
     
-    def _calculate_similarity(self, text1: str, text2: str) -> float:
-        """Calculate semantic similarity between two texts."""
-        try:
-            # Get embeddings
-            emb1 = self.embedding_model.encode(text1, convert_to_tensor=True)
-            emb2 = self.embedding_model.encode(text2, convert_to_tensor=True)
+    def _scoring_context(
+        self,
+        completion: str,
+        expected: str,
+        prompt: Optional[Prompt] = None
+    ) -> ScoringContext:
+        """
+        Create a scoring context, reusing the expected-answer embedding stored
+        at ingest time or held in the embedding cache if there is one.
+        """
+        stored = get_stored_embedding(prompt, self.embedding_model_name) if prompt is not None else None
+        if stored is None:
+            stored = embedding_cache.get(self.embedding_model_name, expected)
+        return ScoringContext(self.embedding_model, completion, expected, expected_embedding=stored)
+    
+    def _cache_expected_embedding(self, context: ScoringContext) -> None:
+        """Store the expected-answer embedding computed by a scoring context."""
+        if context.expected_embedding is None:
+            embedding_cache.set(self.embedding_model_name, context.expected, context.embeddings[1])
+    
+    def _encode_expected(self, prompts: List[Prompt], expected: List[str]) -> np.ndarray:
+        """
+        Embed expected answers, preferring vectors stored at ingest time, then
+        the embedding cache, and encoding only what neither has.
+        """
+        stored = [get_stored_embedding(prompt, self.embedding_model_name) for prompt in prompts]
+        lookups = [text for text, emb in zip(expected, stored) if emb is None]
+        from_cache = iter(embedding_cache.get_many(self.embedding_model_name, lookups))
+        cached = [emb if emb is not None else next(from_cache) for emb in stored]
+        missing = list(dict.fromkeys(text for text, emb in zip(expected, cached) if emb is None))
+        
+        encoded: Dict[str, np.ndarray] = {}
+        if missing:
+            embeddings = encode_bucketed(self.embedding_model, missing)
+            embedding_cache.set_many(self.embedding_model_name, missing, embeddings)
+            encoded = dict(zip(missing, embeddings))
             
-            # Calculate cosine similarity
-            similarity = np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
-            return float(similarity)
-        except Exception as e:
-            raise EvaluationError(f"Error calculating similarity: {str(e)}")
+        return np.stack([emb if emb is not None else encoded[text] for text, emb in zip(expected, cached)])
     
     def _check_answer_presence(self, completion: str, expected: str) -> float:
         """Check if key elements of the expected answer are present."""
@@ -90,10 +244,37 @@ class FactualQAEvaluator(BaseEvaluator):
         completion_tokens = set(completion.lower().split())
         expected_tokens = set(expected.lower().split())
         overlap = len(completion_tokens.intersection(expected_tokens))
-        return overlap / len(expected_tokens)
+        return float(presence_ratio(overlap, len(expected_tokens)))
+    
+    def _batch_answer_presence(self, completions: List[str], expected: List[str]) -> np.ndarray:
+        """Token overlap for many pairs as indicator-matrix operations, one mini-batch at a time."""
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+        scores = np.zeros(len(completions), dtype=np.float64)
+        
+        for start in range(0, len(completions), batch_size):
+            expected_tokens = [set(e.lower().split()) for e in expected[start:start + batch_size]]
+            completion_tokens = [set(c.lower().split()) for c in completions[start:start + batch_size]]
+            
+            # Only tokens from expected answers can contribute to the overlap
+            vocab: Dict[str, int] = {}
+            for tokens in expected_tokens:
+                for token in tokens:
+                    vocab.setdefault(token, len(vocab))
+                    
+            expected_matrix = np.zeros((len(expected_tokens), len(vocab)), dtype=bool)
+            completion_matrix = np.zeros_like(expected_matrix)
+            for row, tokens in enumerate(expected_tokens):
+                expected_matrix[row, [vocab[t] for t in tokens]] = True
+            for row, tokens in enumerate(completion_tokens):
+                completion_matrix[row, [vocab[t] for t in tokens if t in vocab]] = True
+                
+            overlap = (expected_matrix & completion_matrix).sum(axis=1)
+            totals = expected_matrix.sum(axis=1)
+            scores[start:start + batch_size] = presence_ratio(overlap, totals)
+            
+        return scores
     
-    def _calculate_contradiction(self, completion: str, expected: str) -> float:
+    def _calculate_contradiction(self, context: ScoringContext) -> float:
         """Calculate a contradiction score between completion and expected answer."""
         # This is a simplified version - could be enhanced with NLI models
-        similarity = self._calculate_similarity(completion, expected)
-        return 1.0 - similarity  # Higher similarity = lower contradiction 
\ No newline at end of file
+        return 1.0 - context.similarity  # Higher similarity = lower contradiction 
\ No newline at end of file
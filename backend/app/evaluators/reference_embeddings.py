@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import logging
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import Session, selectinload, sessionmaker
+from app.core.celery_app import celery_app
+from app.evaluators.embeddings import embedding_key, embedding_registry, encode_bucketed
+from app.models.models import Prompt, PromptEmbedding
+
+logger = logging.getLogger(__name__)
+
+EMBED_PROMPTS_TASK = "app.evaluators.tasks.embed_prompts"
+_PENDING_PROMPTS_KEY = "prompts_to_embed"
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def get_expected_answer(prompt: Prompt) -> Optional[str]:
+    return (prompt.metadata_ or {}).get("expected_answer")
+
+def get_stored_embedding(prompt: Prompt, embedding_model: Optional[str] = None) -> Optional[np.ndarray]:
+    """
+    Get the stored expected-answer embedding for a prompt, or None if there is
+    no row for the embedding model or it was computed from an older answer.
+    """
+    embedding_model = embedding_model or embedding_key()
+    expected = get_expected_answer(prompt)
+    if not expected:
+        return None
+
+    digest = text_hash(expected)
+    for row in prompt.embeddings:
+        if row.embedding_model == embedding_model and row.text_hash == digest:
+            return np.frombuffer(row.vector, dtype=np.float16).astype(np.float32)
+    return None
+
+def store_prompt_embeddings(
+    db: Session,
+    prompts: Sequence[Prompt],
+    embedding_model: Optional[str] = None
+) -> int:
+    """
+    Compute and store expected-answer embeddings for prompts that lack an
+    up-to-date one. Returns the number of embeddings written; the caller commits.
+    """
+    embedding_model = embedding_model or embedding_key()
+    stale = [
+        (prompt, get_expected_answer(prompt))
+        for prompt in prompts
+        if get_expected_answer(prompt) and get_stored_embedding(prompt, embedding_model) is None
+    ]
+    if not stale:
+        return 0
+
+    vectors = encode_bucketed(embedding_registry.get(embedding_model), [expected for _, expected in stale])
+    for (prompt, expected), vector in zip(stale, vectors):
+        row = next((r for r in prompt.embeddings if r.embedding_model == embedding_model), None)
+        if row is None:
+            row = PromptEmbedding(embedding_model=embedding_model)
+            prompt.embeddings.append(row)
+        row.text_hash = text_hash(expected)
+        row.dimensions = int(vector.shape[0])
+        row.vector = vector.astype(np.float16).tobytes()
+
+    db.flush()
+    return len(stale)
+
+def backfill_prompt_embeddings(
+    db: Session,
+    embedding_model: Optional[str] = None,
+    batch_size: int = 500,
+    after_id: Optional[str] = None
+) -> Iterator[Tuple[str, int]]:
+    """
+    Embed all prompts in primary-key order, committing once per batch.
+    Yields (last prompt id, embeddings written) after each batch so callers can
+    checkpoint and resume with after_id. Prompts that are already up to date
+    are skipped without encoding.
+    """
+    while True:
+        query = db.query(Prompt).options(selectinload(Prompt.embeddings)).order_by(Prompt.id)
+        if after_id:
+            query = query.filter(Prompt.id > after_id)
+        prompts = query.limit(batch_size).all()
+        if not prompts:
+            return
+
+        written = store_prompt_embeddings(db, prompts, embedding_model)
+        db.commit()
+        after_id = prompts[-1].id
+        db.expunge_all()
+        yield after_id, written
+
+def register_ingest_hooks(session_factory: Union[sessionmaker, async_sessionmaker]) -> None:
+    """
+    Queue expected-answer embedding for prompts created or updated through
+    sessions from session_factory, once their transaction commits. For an
+    async_sessionmaker the hooks go on its sync_session_class, which must be
+    a Session subclass of its own so other sessions are not affected; its
+    commits run on the event loop, so the task is published from the loop's
+    default executor instead.
+    """
+    target = session_factory
+    if isinstance(session_factory, async_sessionmaker):
+        target = session_factory.kw.get("sync_session_class", Session)
+        if target is Session:
+            raise ValueError("async_sessionmaker needs its own sync_session_class for ingest hooks")
+    event.listen(target, "after_flush", _collect_changed_prompts)
+    event.listen(target, "after_commit", _queue_prompt_embeddings)
+    event.listen(target, "after_rollback", _discard_changed_prompts)
+
+def _collect_changed_prompts(session: Session, flush_context) -> None:
+    pending = session.info.setdefault(_PENDING_PROMPTS_KEY, set())
+    for obj in session.new:
+        if isinstance(obj, Prompt) and get_expected_answer(obj):
+            pending.add(obj.id)
+    for obj in session.dirty:
+        if (
+            isinstance(obj, Prompt)
+            and get_expected_answer(obj)
+            and inspect(obj).attrs["metadata_"].history.has_changes()
+        ):
+            pending.add(obj.id)
+
+def _queue_prompt_embeddings(session: Session) -> None:
+    prompt_ids = session.info.pop(_PENDING_PROMPTS_KEY, None)
+    if not prompt_ids:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _publish_prompt_embeddings(sorted(prompt_ids))
+        return
+    # Publishing blocks on the broker, so keep it off the event loop
+    loop.run_in_executor(None, _publish_prompt_embeddings, sorted(prompt_ids))
+
+def _publish_prompt_embeddings(prompt_ids: List[str]) -> None:
+    try:
+        celery_app.send_task(EMBED_PROMPTS_TASK, args=[prompt_ids])
+    except Exception as e:
+        # The backfill job picks up anything missed here
+        logger.error(f"Failed to queue prompt embeddings: {str(e)}")
+
+def _discard_changed_prompts(session: Session) -> None:
+    session.info.pop(_PENDING_PROMPTS_KEY, None)
@@ -0,0 +1,102 @@
+import importlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Type
+from app.core.config import settings
+from app.core.exceptions import EvaluationError
+from app.evaluators.base import BaseEvaluator
+from app.models.models import EvaluationType, Model
+
+logger = logging.getLogger(__name__)
+
+# Evaluator classes by evaluation type, as "module:ClassName" so that resolving
+# the registry does not import ML dependencies until an evaluator is needed.
+EVALUATORS: Dict[EvaluationType, str] = {
+    EvaluationType.FACTUAL_QA: "app.evaluators.factual_qa:FactualQAEvaluator",
+    # Add other evaluator types here
+}
+
+_evaluator_classes: Dict[EvaluationType, Type[BaseEvaluator]] = {}
+
+def is_supported(evaluation_type: EvaluationType) -> bool:
+    """Check whether an evaluator exists for the type without importing it."""
+    return evaluation_type in EVALUATORS
+
+def get_evaluator_class(evaluation_type: EvaluationType) -> Type[BaseEvaluator]:
+    """Resolve and import the evaluator class for an evaluation type."""
+    evaluator_class = _evaluator_classes.get(evaluation_type)
+    if evaluator_class is not None:
+        return evaluator_class
+
+    path = EVALUATORS.get(evaluation_type)
+    if not path:
+        raise EvaluationError(f"Unsupported evaluation type: {evaluation_type}")
+
+    module_name, class_name = path.split(":")
+    evaluator_class = getattr(importlib.import_module(module_name), class_name)
+    _evaluator_classes[evaluation_type] = evaluator_class
+    return evaluator_class
+
+def create_evaluator(evaluation_type: EvaluationType, model: Model) -> BaseEvaluator:
+    """Create a new evaluator instance."""
+    return get_evaluator_class(evaluation_type)(model)
+
+class EvaluatorPool:
+    """
+    Bounded pool of warm evaluator instances keyed by (evaluation type, model ID).
+    Evaluators are reused across tasks and the least recently used one is
+    evicted once the pool is full.
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        self.max_size = max_size or settings.EVALUATOR_POOL_SIZE
+        self._evaluators: "OrderedDict[Tuple[EvaluationType, str], BaseEvaluator]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, evaluation_type: EvaluationType, model: Model) -> BaseEvaluator:
+        """Get a warm evaluator for the type and model, creating one if needed."""
+        key = (evaluation_type, model.id)
+        with self._lock:
+            evaluator = self._evaluators.get(key)
+            if evaluator is not None:
+                self._evaluators.move_to_end(key)
+                self.hits += 1
+                # Use the caller's row so evaluators never hold stale model settings
+                evaluator.model = model
+                return evaluator
+            self.misses += 1
+
+        evaluator = create_evaluator(evaluation_type, model)
+
+        with self._lock:
+            self._evaluators[key] = evaluator
+            self._evaluators.move_to_end(key)
+            while len(self._evaluators) > self.max_size:
+                evicted_key, _ = self._evaluators.popitem(last=False)
+                self.evictions += 1
+                logger.info(f"Evicted evaluator for {evicted_key[0]} / model {evicted_key[1]}")
+        return evaluator
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._evaluators),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._evaluators.clear()
+
+# Global instance
+evaluator_pool = EvaluatorPool()
+
+def get_evaluator(evaluation_type: EvaluationType, model: Model) -> BaseEvaluator:
+    """Get a warm evaluator from this process's pool."""
+    return evaluator_pool.get(evaluation_type, model)
@@ -1,117 +1,434 @@
+import asyncio
+import random
+import threading
 import time
-from typing import Dict, Any
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Any, List, NamedTuple, Optional, Tuple
 from celery import Task
-from sqlalchemy.orm import Session
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, worker_shutdown
+from sqlalchemy.orm import Session, selectinload
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.core.database import SessionLocal
-from app.models.models import Evaluation, Model, Prompt, EvaluationType
+from app.core.event_loop import worker_loop
+from app.models.models import Evaluation, Prompt, EvaluationType
 from app.evaluators.base import BaseEvaluator
-from app.evaluators.factual_qa import FactualQAEvaluator
-from app.core.exceptions import EvaluationError
+from app.evaluators.data import EvaluationRows, data_loader
+from app.evaluators.embeddings import embedding_registry
+from app.evaluators.reference_embeddings import store_prompt_embeddings
+from app.evaluators.registry import get_evaluator
+from app.evaluators.writer import EvaluationResultWriter, result_writer
+from app.core.exceptions import EvaluationError, TransientProviderError
 import logging
 
 logger = logging.getLogger(__name__)
 
 class SQLAlchemyTask(Task):
-    """Base task that handles database sessions."""
-    _db = None
+    """Base task that handles database sessions, one per worker thread."""
+    _local = threading.local()
 
     @property
     def db(self) -> Session:
-        if self._db is None:
-            self._db = SessionLocal()
-        return self._db
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = SessionLocal()
+        return db
 
     def after_return(self, *args, **kwargs):
         """Close database session after task completion."""
-        if self._db is not None:
-            self._db.close()
-            self._db = None
-
-def get_evaluator(evaluation_type: EvaluationType, model: Model) -> BaseEvaluator:
-    """Factory function to get the appropriate evaluator."""
-    evaluators = {
-        EvaluationType.FACTUAL_QA: FactualQAEvaluator,
-        # Add other evaluator types here
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+def warm_up_embedding_models(**kwargs) -> None:
+    """Load embedding models once per worker process, before the first task arrives."""
+    if settings.EMBEDDING_WARMUP_ON_START:
+        embedding_registry.warm_up()
+
+def stop_worker_loop(**kwargs) -> None:
+    """Stop the event loop and write buffered results when the worker process exits."""
+    worker_loop.stop()
+    result_writer.close()
+
+# Only the prefork pool sends the process signals, from each child. The
+# threads pool used in async mode runs tasks in the worker's own process.
+if settings.CELERY_WORKER_MODE == "async":
+    worker_init.connect(warm_up_embedding_models)
+    worker_shutdown.connect(stop_worker_loop)
+else:
+    worker_process_init.connect(warm_up_embedding_models)
+    worker_process_shutdown.connect(stop_worker_loop)
+
+class Completion(NamedTuple):
+    """A batch evaluation's completion, waiting to be scored with the rest of its group."""
+    evaluation_id: str
+    start_time: float
+    evaluator: BaseEvaluator
+    prompt: Prompt
+    text: str
+
+def retry_delay(retry_count: int) -> float:
+    """Seconds to wait before requeueing an evaluation that has been retried retry_count times."""
+    backoff = min(
+        settings.EVALUATION_RETRY_MAX_SECONDS,
+        settings.EVALUATION_RETRY_BASE_SECONDS * 2 ** retry_count
+    )
+    # At least half the backoff, so retries after a shared rate limit still spread out
+    return random.uniform(backoff / 2, backoff)
+
+async def _get_completion(
+    evaluation_id: str,
+    rows: Optional[EvaluationRows]
+) -> Tuple[BaseEvaluator, Prompt, str]:
+    """Get the evaluator for an evaluation and the model's completion of its prompt."""
+    if rows is None:
+        raise EvaluationError(f"Evaluation {evaluation_id} not found")
+    _, model, prompt = rows
+    
+    if not model or not prompt:
+        raise EvaluationError("Model or prompt not found")
+        
+    # Creating an evaluator may load its models, so not on the event loop
+    evaluator = await asyncio.to_thread(get_evaluator, prompt.type, model)
+    
+    # Provider calls are capped by the rate limiter's adaptive concurrency
+    # limit for the model
+    return evaluator, prompt, await evaluator.get_completion(prompt)
+
+def _succeeded(
+    evaluation_id: str,
+    rows: EvaluationRows,
+    writer: EvaluationResultWriter,
+    completion: str,
+    metrics: Dict[str, Any],
+    start_time: float
+) -> Dict[str, Any]:
+    """Buffer a scored evaluation for writing."""
+    writer.add(
+        evaluation_id,
+        created_at=rows.evaluation.created_at,
+        completion=completion,
+        scores=metrics,
+        duration_ms=int((time.time() - start_time) * 1000),
+        error=None,
+        next_retry_at=None
+    )
+    
+    return {
+        "status": "success",
+        "evaluation_id": evaluation_id,
+        "metrics": metrics
     }
+
+def _failed(
+    evaluation_id: str,
+    rows: Optional[EvaluationRows],
+    writer: EvaluationResultWriter,
+    error: Exception,
+    retry_count: int = 0
+) -> Dict[str, Any]:
+    """
+    Buffer a failed evaluation for writing. A transient provider failure
+    returns status "retry" with the countdown to requeue it after, until
+    EVALUATION_MAX_RETRIES is reached.
+    """
+    if isinstance(error, TransientProviderError) and rows is not None:
+        # The row may not have the last retry written yet, so trust the message too
+        retry_count = max(retry_count, rows.evaluation.retry_count or 0)
+        if retry_count < settings.EVALUATION_MAX_RETRIES:
+            countdown = retry_delay(retry_count)
+            logger.warning(f"Evaluation {evaluation_id} will be retried in {countdown:.1f}s: {str(error)}")
+            writer.add(
+                evaluation_id,
+                created_at=rows.evaluation.created_at,
+                error=str(error),
+                retry_count=retry_count + 1,
+                next_retry_at=datetime.now(timezone.utc) + timedelta(seconds=countdown)
+            )
+            return {
+                "status": "retry",
+                "evaluation_id": evaluation_id,
+                "error": str(error),
+                "retry_count": retry_count + 1,
+                "countdown": countdown
+            }
     
-    evaluator_class = evaluators.get(evaluation_type)
-    if not evaluator_class:
-        raise EvaluationError(f"Unsupported evaluation type: {evaluation_type}")
+    logger.error(f"Evaluation failed: {str(error)}", exc_info=error)
     
-    return evaluator_class(model)
+    if rows is not None:
+        writer.add(evaluation_id, created_at=rows.evaluation.created_at, error=str(error), next_retry_at=None)
+        
+    return {
+        "status": "error",
+        "evaluation_id": evaluation_id,
+        "error": str(error)
+    }
 
-@celery_app.task(base=SQLAlchemyTask, bind=True)
-def run_evaluation(self, evaluation_id: str) -> Dict[str, Any]:
-    """Run an evaluation asynchronously."""
+async def _execute_evaluation(
+    evaluation_id: str,
+    rows: Optional[EvaluationRows],
+    writer: EvaluationResultWriter,
+    retry_count: int = 0
+) -> Dict[str, Any]:
+    """Get a completion for one evaluation, score it and buffer the result for writing."""
     start_time = time.time()
-    
     try:
-        # Get evaluation record
-        evaluation = self.db.query(Evaluation).filter(Evaluation.id == evaluation_id).first()
-        if not evaluation:
-            raise EvaluationError(f"Evaluation {evaluation_id} not found")
-            
-        # Get associated model and prompt
-        model = self.db.query(Model).filter(Model.id == evaluation.model_id).first()
-        prompt = self.db.query(Prompt).filter(Prompt.id == evaluation.prompt_id).first()
-        
-        if not model or not prompt:
-            raise EvaluationError("Model or prompt not found")
-            
-        # Create evaluator
-        evaluator = get_evaluator(prompt.type, model)
-        
-        # Run evaluation
-        metrics = evaluator.evaluate(prompt)
-        
-        # Update evaluation record
-        evaluation.scores = metrics
-        evaluation.duration_ms = int((time.time() - start_time) * 1000)
-        
-        self.db.commit()
-        
-        return {
-            "status": "success",
-            "evaluation_id": evaluation_id,
-            "metrics": metrics
-        }
-        
+        evaluator, prompt, completion = await _get_completion(evaluation_id, rows)
+        metrics = (await evaluator.evaluate_batch([prompt], [completion]))[0]
     except Exception as e:
-        logger.error(f"Evaluation failed: {str(e)}", exc_info=True)
-        
-        if evaluation:
-            evaluation.error = str(e)
-            self.db.commit()
-            
-        return {
+        return _failed(evaluation_id, rows, writer, e, retry_count)
+    return _succeeded(evaluation_id, rows, writer, completion, metrics, start_time)
+
+def _load_rows(db: Session, evaluation_ids: List[str]) -> Dict[str, EvaluationRows]:
+    """
+    Load the rows for evaluations, then close the session so its connection
+    is not held while they wait on providers. The rows stay readable.
+    """
+    try:
+        return data_loader.load(db, evaluation_ids)
+    finally:
+        db.close()
+
+def _load_failed(evaluation_ids: List[str], error: Exception) -> List[Dict[str, Any]]:
+    """Record evaluations whose rows could not be loaded as failed."""
+    logger.error(f"Failed to load {len(evaluation_ids)} evaluations: {str(error)}", exc_info=True)
+    results = []
+    for evaluation_id in evaluation_ids:
+        result_writer.add(evaluation_id, error=f"Failed to load evaluation: {str(error)}", next_retry_at=None)
+        results.append({
             "status": "error",
             "evaluation_id": evaluation_id,
-            "error": str(e)
-        }
+            "error": f"Failed to load evaluation: {str(error)}"
+        })
+    return results
 
 @celery_app.task(base=SQLAlchemyTask, bind=True)
-def run_batch_evaluation(self, evaluation_ids: list[str]) -> Dict[str, Any]:
-    """Run multiple evaluations in batch."""
+def run_evaluation(self, evaluation_id: str, retry_count: int = 0) -> Dict[str, Any]:
+    """Run an evaluation asynchronously."""
+    try:
+        rows = _load_rows(self.db, [evaluation_id]).get(evaluation_id)
+    except Exception as e:
+        result = _load_failed([evaluation_id], e)[0]
+    else:
+        result = worker_loop.run(
+            _execute_evaluation(evaluation_id, rows, result_writer, retry_count)
+        )
+    _requeue([result])
+    if _unwritten([result]):
+        # Run it again rather than acknowledge a result held only in memory
+        raise self.retry(countdown=retry_delay(self.request.retries))
+    return result
+
+def _unwritten(results: List[Dict[str, Any]]) -> List[str]:
+    """
+    With late acknowledgement (async mode) a task is acknowledged once it
+    returns, so write its results first and return the IDs of those still
+    only in memory, e.g. while the database is unavailable. Results of tasks
+    finishing during a flush are written together by the next one. Prefork
+    workers acknowledge tasks as they start, so there results are left to
+    the writer's size and time thresholds and its flush on exit, instead of
+    one commit per evaluation.
+    """
+    if not celery_app.conf.task_acks_late:
+        return []
+    # Retries are requeued with their retry count, so their rows can wait
+    return result_writer.ensure_written(
+        [result["evaluation_id"] for result in results if result["status"] != "retry"]
+    )
+
+def _requeue(results: List[Dict[str, Any]]) -> None:
+    """
+    Queue a delayed run_evaluation for each result with status "retry", over
+    one broker connection. The worker holds the message until its countdown
+    is up without using a slot, so other evaluations keep running meanwhile.
+    """
+    retries = [result for result in results if result["status"] == "retry"]
+    if not retries:
+        return
+    with celery_app.producer_or_acquire() as producer:
+        for result in retries:
+            try:
+                run_evaluation.apply_async(
+                    args=[result["evaluation_id"]],
+                    kwargs={"retry_count": result["retry_count"]},
+                    countdown=result["countdown"],
+                    producer=producer
+                )
+            except Exception as e:
+                logger.error(f"Failed to requeue evaluation {result['evaluation_id']}: {str(e)}")
+                result_writer.add(
+                    result["evaluation_id"],
+                    error=f"Failed to requeue evaluation: {str(e)}",
+                    next_retry_at=None
+                )
+                result.update(status="error", error=f"Failed to requeue evaluation: {str(e)}")
+
+class ProgressReporter:
+    """
+    Passes batch progress to a blocking callback, such as update_state, on a
+    worker thread so the event loop never waits on the result backend. One
+    call runs at a time, so updates arrive in order; updates made while one
+    is running are coalesced into the next.
+    """
+
+    def __init__(self, callback: Callable[[Dict[str, int]], None]):
+        self.callback = callback
+        self._latest: Optional[Dict[str, int]] = None
+        self._sent: Optional[Dict[str, int]] = None
+        self._sending: Optional[asyncio.Task] = None
+
+    def update(self, progress: Dict[str, int]) -> None:
+        self._latest = progress
+        if self._sending is None or self._sending.done():
+            self._sending = asyncio.ensure_future(self._send())
+
+    async def _send(self) -> None:
+        while self._latest is not self._sent:
+            progress = self._sent = self._latest
+            try:
+                await asyncio.to_thread(self.callback, progress)
+            except Exception as e:
+                logger.warning(f"Failed to report batch progress: {str(e)}")
+
+    async def close(self) -> None:
+        """Wait until the latest update has been passed on."""
+        if self._sending is not None:
+            await self._sending
+
+async def _execute_batch(
+    evaluation_ids: list[str],
+    rows: Dict[str, EvaluationRows],
+    on_progress: Optional[Callable[[Dict[str, int]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Get completions for evaluations concurrently, then score them with one
+    evaluate_batch call per evaluation type and model, so evaluators score
+    the whole batch at once. Results are buffered for bulk writing as they
+    finish and progress is passed to on_progress, off the event loop.
+    """
     results = []
+    failed = 0
+    retried = 0
+    progress = ProgressReporter(on_progress) if on_progress else None
     
-    for eval_id in evaluation_ids:
+    def finish(result: Dict[str, Any]) -> None:
+        nonlocal failed, retried
+        results.append(result)
+        if result["status"] == "retry":
+            retried += 1
+        elif result["status"] != "success":
+            failed += 1
+            
+        if progress:
+            progress.update({
+                "total": len(evaluation_ids),
+                "completed": len(results),
+                "failed": failed,
+                "retried": retried
+            })
+    
+    async def complete(evaluation_id: str) -> Optional[Completion]:
+        start_time = time.time()
         try:
-            result = run_evaluation(eval_id)
-            results.append(result)
+            return Completion(evaluation_id, start_time, *await _get_completion(evaluation_id, rows.get(evaluation_id)))
         except Exception as e:
-            results.append({
-                "status": "error",
-                "evaluation_id": eval_id,
-                "error": str(e)
-            })
+            finish(_failed(evaluation_id, rows.get(evaluation_id), result_writer, e))
+            return None
+    
+    # Completions to score, by evaluation type and model
+    groups: Dict[Tuple[str, str], List[Completion]] = {}
+    for completion in await asyncio.gather(*(complete(eval_id) for eval_id in evaluation_ids)):
+        if completion is not None:
+            groups.setdefault((completion.prompt.type, completion.evaluator.model.id), []).append(completion)
+    
+    async def score(group: List[Completion]) -> None:
+        try:
+            scores = await group[0].evaluator.evaluate_batch([c.prompt for c in group], [c.text for c in group])
+        except Exception as e:
+            for completion in group:
+                finish(_failed(completion.evaluation_id, rows.get(completion.evaluation_id), result_writer, e))
+            return
+        for completion, metrics in zip(group, scores):
+            finish(_succeeded(
+                completion.evaluation_id,
+                rows[completion.evaluation_id],
+                result_writer,
+                completion.text,
+                metrics,
+                completion.start_time
+            ))
+    
+    await asyncio.gather(*(score(group) for group in groups.values()))
+    if progress:
+        await progress.close()
     
     return {
         "status": "completed",
         "total": len(evaluation_ids),
+        "failed": failed,
+        "retried": retried,
         "results": results
     }
 
+@celery_app.task(base=SQLAlchemyTask, bind=True)
+def run_batch_evaluation(self, evaluation_ids: list[str]) -> Dict[str, Any]:
+    """Run multiple evaluations in batch."""
+    task_id = self.request.id
+    
+    def report_progress(meta: Dict[str, int]) -> None:
+        # Called from a thread other than the task's, where self.request is not set
+        if task_id:
+            self.update_state(task_id=task_id, state="PROGRESS", meta=meta)
+    
+    try:
+        rows = _load_rows(self.db, evaluation_ids)
+    except Exception as e:
+        result = {
+            "status": "error",
+            "total": len(evaluation_ids),
+            "failed": len(evaluation_ids),
+            "retried": 0,
+            "results": _load_failed(evaluation_ids, e)
+        }
+    else:
+        result = worker_loop.run(_execute_batch(evaluation_ids, rows, report_progress))
+    _requeue(result["results"])
+    unwritten = _unwritten(result["results"])
+    if unwritten:
+        # Run the evaluations whose results were not written again, rather
+        # than acknowledge results held only in memory
+        raise self.retry(args=[unwritten], countdown=retry_delay(self.request.retries))
+    return result
+
+@celery_app.task(base=SQLAlchemyTask, bind=True)
+def embed_prompts(self, prompt_ids: list[str]) -> Dict[str, Any]:
+    """Compute and store expected-answer embeddings for new or updated prompts."""
+    try:
+        prompts = (
+            self.db.query(Prompt)
+            .options(selectinload(Prompt.embeddings))
+            .filter(Prompt.id.in_(prompt_ids))
+            .all()
+        )
+        embedded = store_prompt_embeddings(self.db, prompts)
+        self.db.commit()
+        data_loader.invalidate(prompt_ids=prompt_ids)
+        
+        return {
+            "status": "success",
+            "total": len(prompt_ids),
+            "embedded": embedded
+        }
+        
+    except Exception as e:
+        logger.error(f"Prompt embedding failed: {str(e)}", exc_info=True)
+        self.db.rollback()
+        return {
+            "status": "error",
+            "error": str(e)
+        }
+
 @celery_app.task(base=SQLAlchemyTask, bind=True)
 def check_for_regressions(self, model_id: str, evaluation_type: EvaluationType) -> Dict[str, Any]:
     """Check for performance regressions in recent evaluations."""
@@ -0,0 +1,349 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import Float, String, bindparam, delete, insert, select, update
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError, TimeoutError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.storage import BlobStore, completion_columns
+from app.models.models import Evaluation, EvaluationScore
+
+logger = logging.getLogger(__name__)
+
+# Number of recent flush latencies kept for percentiles
+LATENCY_WINDOW = 1000
+
+def _insert_scores(by_created_at: bool) -> Any:
+    """Copies model_id and created_at from the evaluation row for the score indexes."""
+    source = select(
+        Evaluation.id,
+        bindparam("score_metric", type_=String),
+        bindparam("score_value", type_=Float),
+        Evaluation.model_id,
+        Evaluation.created_at
+    ).where(Evaluation.id == bindparam("score_evaluation_id"))
+    if by_created_at:
+        source = source.where(Evaluation.created_at == bindparam("score_created_at"))
+    return insert(EvaluationScore.__table__).from_select(
+        ["evaluation_id", "metric", "value", "model_id", "created_at"], source
+    )
+
+_INSERT_SCORE = _insert_scores(by_created_at=False)
+_INSERT_PARTITION_SCORE = _insert_scores(by_created_at=True)
+
+def is_transient(error: Exception) -> bool:
+    """Whether a write failed because of the database connection rather than the rows written."""
+    return isinstance(error, (DisconnectionError, InterfaceError, OperationalError, TimeoutError))
+
+def numeric_scores(scores: Optional[Dict[str, Any]]) -> Dict[str, float]:
+    """The numeric metrics of a scores dict; nested or non-numeric values are skipped."""
+    return {
+        metric: float(value)
+        for metric, value in (scores or {}).items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+
+def replace_scores(
+    db: Session,
+    scores: Dict[str, Optional[Dict[str, Any]]],
+    created_at: Optional[Dict[str, datetime]] = None
+) -> None:
+    """
+    Replace the evaluation_scores rows of each evaluation ID with its new
+    scores. Evaluations with a known created_at are only looked up in their
+    partition.
+    """
+    created_at = created_at or {}
+    db.execute(delete(EvaluationScore).where(EvaluationScore.evaluation_id.in_(list(scores))))
+    by_id, by_partition = [], []
+    for evaluation_id, evaluation_scores in scores.items():
+        for metric, value in numeric_scores(evaluation_scores).items():
+            params = {"score_evaluation_id": evaluation_id, "score_metric": metric, "score_value": value}
+            if evaluation_id in created_at:
+                by_partition.append({**params, "score_created_at": created_at[evaluation_id]})
+            else:
+                by_id.append(params)
+    if by_id:
+        db.execute(_INSERT_SCORE, by_id)
+    if by_partition:
+        db.execute(_INSERT_PARTITION_SCORE, by_partition)
+
+def update_evaluations(db: Session, records: List[Dict[str, Any]]) -> None:
+    """
+    Update evaluations from records of column values keyed by "id", with one
+    executemany per set of columns. Records with a created_at also match on
+    it: it is part of the partitioned table's primary key, so Postgres only
+    touches that partition instead of probing every one.
+    """
+    table = Evaluation.__table__
+    groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = defaultdict(list)
+    for record in records:
+        params = {"key_id": record["id"]}
+        if record.get("created_at") is not None:
+            params["key_created_at"] = record["created_at"]
+        params.update((name, value) for name, value in record.items() if name not in ("id", "created_at"))
+        groups[tuple(sorted(params))].append(params)
+    for names, params in groups.items():
+        statement = update(table).where(table.c.id == bindparam("key_id"))
+        if "key_created_at" in names:
+            statement = statement.where(table.c.created_at == bindparam("key_created_at"))
+        db.execute(statement, params)
+
+class EvaluationResultWriter:
+    """
+    Buffers finished evaluation results and writes them in one bulk UPDATE
+    per flush, so a batch costs one commit instead of one per evaluation.
+    A background thread flushes once RESULT_WRITER_BATCH_SIZE results are
+    buffered or RESULT_WRITER_FLUSH_INTERVAL seconds have passed. Scores are
+    also written to evaluation_scores in the same transaction, and long
+    completions to the blob store before it. Call close() on shutdown to
+    write whatever is left.
+
+    When a flush fails on the connection the results are kept for the next
+    one. Otherwise the batch is split in halves until the rows that cannot
+    be written are found; those are dropped and their evaluations marked
+    with the error instead. A result is also dropped after max_attempts
+    failed flushes, and the oldest once max_buffer results are buffered.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        store: Optional[BlobStore] = None,
+        max_attempts: Optional[int] = None,
+        max_buffer: Optional[int] = None
+    ):
+        self.session_factory = session_factory
+        # None means the configured blob store, created on first use
+        self.store = store
+        self.batch_size = batch_size or settings.RESULT_WRITER_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.RESULT_WRITER_FLUSH_INTERVAL
+        self.max_attempts = max_attempts or settings.RESULT_WRITER_MAX_ATTEMPTS
+        self.max_buffer = max_buffer or settings.RESULT_WRITER_MAX_BUFFER
+        self._buffer: Dict[str, Dict[str, Any]] = {}
+        # Failed flushes per buffered evaluation ID
+        self._attempts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._latencies_ms: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.flushes = 0
+        self.rows_written = 0
+        self.failed_flushes = 0
+        self.dropped_rows = 0
+
+    def add(self, evaluation_id: str, **values: Any) -> None:
+        """
+        Buffer column values for an evaluation; later values for the same ID
+        win. Pass the evaluation's created_at when it is known: the write
+        then matches on it instead of setting it, and touches one partition.
+        """
+        self._ensure_started()
+        with self._lock:
+            if evaluation_id not in self._buffer and len(self._buffer) >= self.max_buffer:
+                self._drop_oldest()
+            self._buffer.setdefault(evaluation_id, {}).update(values)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Buffered results belong to the parent process
+                self._buffer.clear()
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Write all buffered results now. Returns the number of rows written."""
+        with self._flush_lock:
+            return self._flush()
+
+    def ensure_written(self, evaluation_ids: Iterable[str]) -> List[str]:
+        """
+        Write all buffered results now, then return those of the given
+        evaluations that are still buffered, e.g. after a transient failure.
+        No other flush can have them in flight meanwhile.
+        """
+        with self._flush_lock:
+            self._flush()
+            with self._lock:
+                return [evaluation_id for evaluation_id in evaluation_ids if evaluation_id in self._buffer]
+
+    def _flush(self) -> int:
+        """Write all buffered results; called with _flush_lock held."""
+        with self._lock:
+            if not self._buffer:
+                return 0
+            pending, self._buffer = self._buffer, {}
+
+        start = time.perf_counter()
+        try:
+            self._write(pending)
+        except Exception as e:
+            self.failed_flushes += 1
+            logger.error(f"Failed to write {len(pending)} evaluation results: {str(e)}", exc_info=True)
+            if is_transient(e):
+                self._retry_later(pending, e)
+                return 0
+            written = self._bisect(pending)
+        else:
+            written = len(pending)
+            self._latencies_ms.append((time.perf_counter() - start) * 1000)
+            self.flushes += 1
+
+        with self._lock:
+            for evaluation_id in pending:
+                if evaluation_id not in self._buffer:
+                    self._attempts.pop(evaluation_id, None)
+        self.rows_written += written
+        return written
+
+    def _write(self, pending: Dict[str, Dict[str, Any]]) -> None:
+        """Write results in one transaction, or raise with nothing written."""
+        db = self.session_factory()
+        try:
+            records = [self._record(evaluation_id, values) for evaluation_id, values in pending.items()]
+            update_evaluations(db, records)
+            scored = {
+                evaluation_id: values["scores"]
+                for evaluation_id, values in pending.items()
+                if "scores" in values
+            }
+            if scored:
+                replace_scores(db, scored, {
+                    evaluation_id: values["created_at"]
+                    for evaluation_id, values in pending.items()
+                    if values.get("created_at") is not None
+                })
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _bisect(self, pending: Dict[str, Dict[str, Any]]) -> int:
+        """Write the halves of a batch that failed, down to the single rows at fault."""
+        if len(pending) > 1:
+            items = list(pending.items())
+            middle = len(items) // 2
+            return self._bisect(dict(items[:middle])) + self._bisect(dict(items[middle:]))
+        try:
+            self._write(pending)
+            return 1
+        except Exception as e:
+            if is_transient(e):
+                self._retry_later(pending, e)
+            else:
+                self._dead_letter(pending, e)
+            return 0
+
+    def _retry_later(self, pending: Dict[str, Dict[str, Any]], error: Exception) -> None:
+        """Keep results for the next flush, without overwriting newer values, unless they have failed too often."""
+        expired = {}
+        with self._lock:
+            for evaluation_id, values in pending.items():
+                attempts = self._attempts.get(evaluation_id, 0) + 1
+                if attempts >= self.max_attempts:
+                    expired[evaluation_id] = values
+                    continue
+                if evaluation_id not in self._buffer and len(self._buffer) >= self.max_buffer:
+                    self._drop_oldest()
+                self._attempts[evaluation_id] = attempts
+                self._buffer[evaluation_id] = {**values, **self._buffer.get(evaluation_id, {})}
+        if expired:
+            self._dead_letter(expired, error)
+
+    def _dead_letter(self, pending: Dict[str, Dict[str, Any]], error: Exception) -> None:
+        """
+        Drop results that cannot be written. Their evaluations are marked
+        with the error, when the database takes that, so they are not left
+        looking pending.
+        """
+        reason = str(getattr(error, "orig", None) or error)
+        self.dropped_rows += len(pending)
+        with self._lock:
+            for evaluation_id in pending:
+                self._attempts.pop(evaluation_id, None)
+        logger.error(
+            f"Dropping results of evaluations {sorted(pending)} after failing to write them: {reason}"
+        )
+        try:
+            self._write({
+                evaluation_id: {
+                    "error": f"Failed to write result: {reason}",
+                    "next_retry_at": None,
+                    "created_at": values.get("created_at")
+                }
+                for evaluation_id, values in pending.items()
+            })
+        except Exception as e:
+            logger.error(f"Failed to record the dropped results: {str(e)}")
+
+    def _drop_oldest(self) -> None:
+        """Make room in the full buffer; called with _lock held."""
+        evaluation_id = next(iter(self._buffer))
+        del self._buffer[evaluation_id]
+        self._attempts.pop(evaluation_id, None)
+        self.dropped_rows += 1
+        logger.error(f"Result buffer is full, dropping the result of evaluation {evaluation_id}")
+
+    def _record(self, evaluation_id: str, values: Dict[str, Any]) -> Dict[str, Any]:
+        record = {"id": evaluation_id, **values}
+        if "completion" in values:
+            record.update(completion_columns(values["completion"], self.store))
+        return record
+
+    def close(self) -> None:
+        """Stop the flusher thread and write any buffered results."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=30)
+        self._thread = None
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies_ms)
+
+        def percentile(p: float) -> float:
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+        return {
+            "buffered": len(self._buffer),
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "dropped_rows": self.dropped_rows,
+            "rows_written": self.rows_written,
+            "flush_ms_last": self._latencies_ms[-1] if self._latencies_ms else 0.0,
+            "flush_ms_p50": percentile(0.5),
+            "flush_ms_p95": percentile(0.95),
+            "flush_ms_max": latencies[-1] if latencies else 0.0,
+        }
+
+# Global instance
+result_writer = EvaluationResultWriter()
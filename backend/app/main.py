@@ -4,8 +4,10 @@ from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 
 from app.core.config import settings
+from app.core.database import AsyncSessionLocal, SessionLocal, async_engine
 from app.api.v1.api import api_router
 from app.core.exceptions import CustomException
+from app.evaluators.reference_embeddings import register_ingest_hooks
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -24,6 +26,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Embed expected answers when prompts are created or updated
+if settings.EMBED_PROMPTS_ON_INGEST:
+    register_ingest_hooks(SessionLocal)
+    register_ingest_hooks(AsyncSessionLocal)
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+
 @app.exception_handler(CustomException)
 async def custom_exception_handler(request, exc: CustomException):
     return JSONResponse(
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, JSON, ForeignKey, DateTime, Enum, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, JSON, ForeignKey, DateTime, Enum, Boolean, Text, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -42,11 +42,25 @@ class Prompt(Base):
     content = Column(Text, nullable=False)
     type = Column(Enum(EvaluationType), nullable=False)
     tags = Column(JSON)  # Array of strings
-    metadata = Column(JSON)
+    metadata_ = Column("metadata", JSON)  # metadata is reserved by declarative classes
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     evaluations = relationship("Evaluation", back_populates="prompt")
+    embeddings = relationship("PromptEmbedding", back_populates="prompt", cascade="all, delete-orphan")
+
+class PromptEmbedding(Base):
+    __tablename__ = "prompt_embeddings"
+
+    prompt_id = Column(String, ForeignKey("prompts.id", ondelete="CASCADE"), primary_key=True)
+    embedding_model = Column(String, primary_key=True)
+    text_hash = Column(String(64), nullable=False)  # SHA-256 of the embedded expected answer
+    dimensions = Column(Integer, nullable=False)
+    vector = Column(LargeBinary, nullable=False)  # float16 bytes
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    prompt = relationship("Prompt", back_populates="embeddings")
 
 class Evaluation(Base):
     __tablename__ = "evaluations"
@@ -54,17 +68,44 @@ class Evaluation(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid4()))
     model_id = Column(String, ForeignKey("models.id"), nullable=False)
     prompt_id = Column(String, ForeignKey("prompts.id"), nullable=False)
-    completion = Column(Text, nullable=False)
+    # Long completions live in the blob store: completion is then NULL and
+    # completion_hash is the blob key. completion_size is in UTF-8 bytes.
+    completion = Column(Text)
+    completion_hash = Column(String(64))
+    completion_size = Column(Integer)
     scores = Column(JSON)  # Dictionary of metric names to scores
-    metadata = Column(JSON)
+    metadata_ = Column("metadata", JSON)  # metadata is reserved by declarative classes
     error = Column(Text)
     duration_ms = Column(Integer)
     token_count = Column(Integer)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Requeues after transient provider failures; next_retry_at is set while one is pending
+    retry_count = Column(Integer, nullable=False, default=0, server_default="0")
+    next_retry_at = Column(DateTime(timezone=True))
+    # The table is range-partitioned on created_at; its primary key is (id, created_at)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     model = relationship("Model", back_populates="evaluations")
     prompt = relationship("Prompt", back_populates="evaluations")
 
+class EvaluationScore(Base):
+    """One numeric metric of an evaluation's scores, normalized so scores can be range-filtered."""
+    __tablename__ = "evaluation_scores"
+
+    # No foreign key: evaluations is partitioned, so id alone is not unique there
+    evaluation_id = Column(String, primary_key=True)
+    metric = Column(String, primary_key=True)
+    value = Column(Float, nullable=False)
+    # Copied from the evaluation so filters by model and date stay on the index
+    model_id = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True))
+
+class DetachedPartition(Base):
+    """An evaluations partition detached for archiving, until it is archived and dropped."""
+    __tablename__ = "detached_partitions"
+
+    name = Column(String, primary_key=True)
+    detached_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class RegressionLog(Base):
     __tablename__ = "regression_logs"
 
@@ -74,18 +115,22 @@ class RegressionLog(Base):
     previous_score = Column(Float)
     current_score = Column(Float)
     difference = Column(Float)
-    metadata = Column(JSON)
+    metadata_ = Column("metadata", JSON)  # metadata is reserved by declarative classes
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class FailureCase(Base):
     __tablename__ = "failure_cases"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid4()))
-    evaluation_id = Column(String, ForeignKey("evaluations.id"), nullable=False)
+    evaluation_id = Column(String, nullable=False)  # not a foreign key, see EvaluationScore
     failure_type = Column(String, nullable=False)
     severity = Column(Integer)  # 1-5 scale
     description = Column(Text)
-    metadata = Column(JSON)
+    metadata_ = Column("metadata", JSON)  # metadata is reserved by declarative classes
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    evaluation = relationship("Evaluation") 
\ No newline at end of file
+    evaluation = relationship(
+        "Evaluation",
+        primaryjoin="FailureCase.evaluation_id == Evaluation.id",
+        foreign_keys=[evaluation_id]
+    ) 
\ No newline at end of file
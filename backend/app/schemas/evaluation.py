@@ -1,13 +1,16 @@
 from typing import Dict, List, Optional, Any
-from pydantic import BaseModel, Field
+from pydantic import AliasChoices, BaseModel, Field
 from datetime import datetime
 from app.models.models import EvaluationType
 from uuid import UUID
 
+# The ORM attribute is metadata_, since metadata is reserved by SQLAlchemy
+METADATA_ALIASES = AliasChoices("metadata_", "metadata")
+
 class EvaluationBase(BaseModel):
     model_id: str
     prompt_id: str
-    metadata: Optional[Dict[str, Any]] = Field(default_factory=dict)
+    metadata: Optional[Dict[str, Any]] = Field(default_factory=dict, validation_alias=METADATA_ALIASES)
 
 class EvaluationCreate(EvaluationBase):
     pass
@@ -15,6 +18,14 @@ class EvaluationCreate(EvaluationBase):
 class EvaluationBatchCreate(BaseModel):
     evaluations: List[EvaluationCreate]
 
+class EvaluationSubmission(BaseModel):
+    model_id: str
+    prompt_id: str
+    id: Optional[str] = None
+    status: str  # "pending" or "error"
+    task_id: Optional[str] = None
+    error: Optional[str] = None
+
 class EvaluationResponse(EvaluationBase):
     id: str
     completion: Optional[str]
@@ -22,7 +33,25 @@ class EvaluationResponse(EvaluationBase):
     error: Optional[str]
     duration_ms: Optional[int]
     token_count: Optional[int]
+    retry_count: int = 0
+    next_retry_at: Optional[datetime] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class EvaluationSummary(BaseModel):
+    """Evaluation as returned by list views; completion and metadata only when requested."""
+    id: str
+    model_id: str
+    prompt_id: str
+    scores: Optional[Dict[str, float]] = None
+    error: Optional[str] = None
+    duration_ms: Optional[int] = None
+    token_count: Optional[int] = None
     created_at: datetime
+    completion: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = Field(None, validation_alias=METADATA_ALIASES)
     
     class Config:
         from_attributes = True
@@ -31,6 +60,8 @@ class EvaluationFilter(BaseModel):
     model_id: Optional[str] = None
     prompt_id: Optional[str] = None
     evaluation_type: Optional[EvaluationType] = None
+    # Score range applies to this metric, which is required with min_score or max_score
+    metric: Optional[str] = None
     min_score: Optional[float] = None
     max_score: Optional[float] = None
     start_date: Optional[datetime] = None
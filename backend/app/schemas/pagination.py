@@ -0,0 +1,10 @@
+from typing import Generic, List, Optional, TypeVar
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+class PaginatedResponse(BaseModel, Generic[T]):
+    items: List[T]
+    limit: int
+    # Pass as cursor to get the next page; None on the last page
+    next_cursor: Optional[str] = None
@@ -0,0 +1,268 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+import diskcache
+import redis
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "completion:v1:"
+STATS_KEY = "completion:v1:stats"
+# Counters kept in the persistent tier for all processes; costs are in
+# micro-dollars since diskcache only increments integers
+SHARED_COUNTERS = ["hits", "misses", "saved_prompt_tokens", "saved_completion_tokens", "saved_cost_micros"]
+# Seconds between updates of the shared counters, so hits stay in process
+SHARED_STATS_INTERVAL = 5.0
+
+# USD per 1K tokens (as of March 2024), matched by longest model name prefix
+TOKEN_COSTS = {
+    "gpt-4": {"input": 0.01, "output": 0.03},
+    "gpt-4-turbo": {"input": 0.01, "output": 0.03},
+    "gpt-3.5-turbo": {"input": 0.0005, "output": 0.0015},
+    "claude-3-opus": {"input": 0.015, "output": 0.075},
+    "claude-3-sonnet": {"input": 0.003, "output": 0.015},
+    "claude-3-haiku": {"input": 0.00025, "output": 0.00125},
+}
+
+def token_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Cost of a call in USD, or 0 for models without a known price."""
+    matches = [name for name in TOKEN_COSTS if model.startswith(name)]
+    if not matches:
+        return 0.0
+    costs = TOKEN_COSTS[max(matches, key=len)]
+    return (prompt_tokens * costs["input"] + completion_tokens * costs["output"]) / 1000
+
+@dataclass
+class CachedCompletion:
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+
+class CompletionCache:
+    """
+    Cache of provider completions keyed by a fingerprint of the request.
+    Lookups go to an in-process TTL/LRU first and then to a persistent tier
+    shared by all processes: Redis, or a diskcache in directory with
+    backend="filesystem". Only requests at or below max_temperature are
+    cached, so sampled runs stay independent. Errors from the persistent
+    tier are logged and treated as misses.
+
+    The cache reads no settings: the app and the top-level models package
+    each build theirs from their own configuration.
+    """
+
+    def __init__(
+        self,
+        backend: str = "memory",
+        ttl: int = 7 * 24 * 3600,
+        memory_size: int = 10000,
+        max_temperature: float = 0.0,
+        enabled: bool = True,
+        directory: Optional[str] = None,
+        redis_url: Optional[str] = None
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.enabled = enabled
+        self.directory = directory
+        self.redis_url = redis_url
+        self._memory: TTLCache = TTLCache(maxsize=memory_size, ttl=self.ttl)
+        self._store: Any = None
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ["memory_hits", "persistent_hits", "misses", "bypassed", "uncacheable", "errors"], 0
+        )
+        self.saved_prompt_tokens = 0
+        self.saved_completion_tokens = 0
+        self.saved_cost = 0.0
+        self._pending = dict.fromkeys(SHARED_COUNTERS, 0)
+        self._pending_since = time.monotonic()
+
+    @staticmethod
+    def fingerprint(
+        provider: str,
+        model: str,
+        messages: List[Dict[str, Any]],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        **params: Any
+    ) -> str:
+        """Hash of everything that determines a completion."""
+        request = {
+            "provider": provider,
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "params": params,
+        }
+        encoded = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+        return KEY_PREFIX + hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def cacheable(self, temperature: Optional[float]) -> bool:
+        return self.enabled and temperature is not None and temperature <= self.max_temperature
+
+    @property
+    def store(self) -> Any:
+        """Open the persistent tier on first use; None with backend="memory"."""
+        if self._store is None and self.backend != "memory":
+            with self._lock:
+                if self._store is None:
+                    self._store = self._open_store()
+        return self._store
+
+    def _open_store(self) -> Any:
+        if self.backend == "redis":
+            if not self.redis_url:
+                raise ValueError("The redis completion cache backend requires redis_url")
+            return redis.Redis.from_url(self.redis_url, socket_timeout=1.0)
+        if self.backend == "filesystem":
+            if not self.directory:
+                raise ValueError("The filesystem completion cache backend requires a directory")
+            return diskcache.Cache(self.directory)
+        raise ValueError(f"Unsupported completion cache backend: {self.backend}")
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    async def get(self, key: str, temperature: Optional[float], bypass: bool = False) -> Optional[CachedCompletion]:
+        """Get a cached completion, or None on a miss or if the request is not cacheable."""
+        if not self.cacheable(temperature):
+            self._count("uncacheable")
+            return None
+        if bypass:
+            self._count("bypassed")
+            return None
+
+        with self._lock:
+            cached = self._memory.get(key)
+        if cached is not None:
+            self._count("memory_hits")
+        elif self.store is not None:
+            cached = await asyncio.to_thread(self._persistent_get, key)
+            if cached is not None:
+                self._count("persistent_hits")
+                with self._lock:
+                    self._memory[key] = cached
+
+        with self._lock:
+            if cached is None:
+                self._counters["misses"] += 1
+                self._pending["misses"] += 1
+            else:
+                self.saved_prompt_tokens += cached.prompt_tokens
+                self.saved_completion_tokens += cached.completion_tokens
+                self.saved_cost += cached.cost
+                self._pending["hits"] += 1
+                self._pending["saved_prompt_tokens"] += cached.prompt_tokens
+                self._pending["saved_completion_tokens"] += cached.completion_tokens
+                self._pending["saved_cost_micros"] += int(round(cached.cost * 1_000_000))
+            due = time.monotonic() - self._pending_since >= SHARED_STATS_INTERVAL
+        if due and self.store is not None:
+            await asyncio.to_thread(self._flush_shared_stats)
+        return cached
+
+    async def set(self, key: str, temperature: Optional[float], completion: CachedCompletion) -> None:
+        """Cache a completion if the request is cacheable."""
+        if not self.cacheable(temperature) or completion.text is None:
+            return
+        with self._lock:
+            self._memory[key] = completion
+        if self.store is not None:
+            await asyncio.to_thread(self._persistent_set, key, completion)
+
+    def _persistent_get(self, key: str) -> Optional[CachedCompletion]:
+        try:
+            value = self.store.get(key)
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"Completion cache read failed: {str(e)}")
+            return None
+        return CachedCompletion(**json.loads(value)) if value is not None else None
+
+    def _persistent_set(self, key: str, completion: CachedCompletion) -> None:
+        value = json.dumps(asdict(completion))
+        try:
+            if self.backend == "redis":
+                self.store.set(key, value, ex=self.ttl)
+            else:
+                self.store.set(key, value, expire=self.ttl)
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"Completion cache write failed: {str(e)}")
+
+    def _flush_shared_stats(self) -> None:
+        """Add this process's counts since the last flush to the shared counters."""
+        with self._lock:
+            deltas = {name: delta for name, delta in self._pending.items() if delta}
+            self._pending = dict.fromkeys(SHARED_COUNTERS, 0)
+            self._pending_since = time.monotonic()
+        if not deltas:
+            return
+        try:
+            if self.backend == "redis":
+                pipeline = self.store.pipeline(transaction=False)
+                for name, delta in deltas.items():
+                    pipeline.hincrby(STATS_KEY, name, delta)
+                pipeline.execute()
+            else:
+                for name, delta in deltas.items():
+                    self.store.incr(f"{STATS_KEY}:{name}", delta)
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"Completion cache stats update failed: {str(e)}")
+
+    def _shared_stats(self) -> Dict[str, Any]:
+        self._flush_shared_stats()
+        try:
+            if self.backend == "redis":
+                values = self.store.hmget(STATS_KEY, SHARED_COUNTERS)
+            else:
+                values = [self.store.get(f"{STATS_KEY}:{name}") for name in SHARED_COUNTERS]
+        except Exception as e:
+            logger.warning(f"Completion cache stats read failed: {str(e)}")
+            return {}
+        shared = {name: int(value or 0) for name, value in zip(SHARED_COUNTERS, values)}
+        lookups = shared["hits"] + shared["misses"]
+        shared["hit_rate"] = shared["hits"] / lookups if lookups else 0.0
+        shared["saved_cost"] = shared.pop("saved_cost_micros") / 1_000_000
+        return shared
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of this process, plus those of all processes sharing the persistent tier."""
+        with self._lock:
+            counters = dict(self._counters)
+            hits = counters["memory_hits"] + counters["persistent_hits"]
+            lookups = hits + counters["misses"]
+            stats = {
+                "backend": self.backend,
+                **counters,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_items": len(self._memory),
+                "saved_prompt_tokens": self.saved_prompt_tokens,
+                "saved_completion_tokens": self.saved_completion_tokens,
+                "saved_cost": round(self.saved_cost, 6),
+            }
+        if self.store is not None:
+            stats["shared"] = self._shared_stats()
+        return stats
+
+    def clear(self) -> None:
+        """Drop the in-process tier and reset this process's counters."""
+        with self._lock:
+            self._memory.clear()
+            for name in self._counters:
+                self._counters[name] = 0
+            self.saved_prompt_tokens = 0
+            self.saved_completion_tokens = 0
+            self.saved_cost = 0.0
+            self._pending = dict.fromkeys(SHARED_COUNTERS, 0)
@@ -1,70 +1,132 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+import os
 import openai
 from openai import AsyncOpenAI
 from app.core.config import settings
-from app.core.exceptions import APIKeyError, RateLimitError
+from app.core.exceptions import APIKeyError, ProviderTimeoutError, ProviderUnavailableError, RateLimitError
 from app.models.models import Model
+from app.services.completion_cache import CachedCompletion, CompletionCache, TOKEN_COSTS, token_cost
+from app.services.rate_limiter import estimate_tokens, rate_limiter
+from app.services.single_flight import SingleFlight
 import time
 import asyncio
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_exponential,
-    retry_if_exception_type
-)
 
-# Initialize OpenAI client
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+# Initialize OpenAI client; transient failures are retried by requeueing the
+# evaluation, not by sleeping in the worker. The client cannot be created
+# without a key, and every call checks for one first.
+client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0) if settings.OPENAI_API_KEY else None
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=4, max=10),
-    retry=retry_if_exception_type((openai.RateLimitError, openai.APITimeoutError))
+# Global instances
+completion_cache = CompletionCache(
+    backend=settings.COMPLETION_CACHE_BACKEND,
+    ttl=settings.COMPLETION_CACHE_TTL_SECONDS,
+    memory_size=settings.COMPLETION_CACHE_MEMORY_SIZE,
+    max_temperature=settings.COMPLETION_CACHE_MAX_TEMPERATURE,
+    enabled=settings.COMPLETION_CACHE_ENABLED,
+    directory=os.path.join(settings.CACHE_DIR, "completions"),
+    redis_url=settings.COMPLETION_CACHE_REDIS_URL,
 )
-async def get_completion(
-    model: Model,
-    prompt: str,
-    temperature: float = 0.7,
-    max_tokens: Optional[int] = None,
-    stream: bool = False
-) -> str:
-    """
-    Get completion from OpenAI API with retry logic and error handling.
-    """
-    if not settings.OPENAI_API_KEY:
-        raise APIKeyError("OpenAI")
-        
+single_flight = SingleFlight(
+    completion_cache,
+    enabled=settings.SINGLE_FLIGHT_ENABLED,
+    lease_seconds=settings.SINGLE_FLIGHT_LEASE_SECONDS,
+    wait_seconds=settings.SINGLE_FLIGHT_WAIT_SECONDS,
+    result_ttl=settings.SINGLE_FLIGHT_RESULT_TTL_SECONDS,
+)
+
+async def _create_completion(
+    model_name: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: Optional[int],
+    stream: bool,
+    params: Dict[str, Any]
+) -> CachedCompletion:
+    """Call the chat completions API and return the text with its token usage and cost."""
     try:
-        # Extract model name from parameters
-        model_name = model.parameters.get("model_name", "gpt-4")
-        
         # Prepare the completion request
         completion = await client.chat.completions.create(
             model=model_name,
-            messages=[{"role": "user", "content": prompt}],
+            messages=messages,
             temperature=temperature,
             max_tokens=max_tokens,
-            stream=stream
+            stream=stream,
+            **params
         )
         
         if stream:
-            # Handle streaming response
+            # Handle streaming response; token usage is not reported
             full_response = ""
             async for chunk in completion:
                 if chunk.choices[0].delta.content is not None:
                     full_response += chunk.choices[0].delta.content
-            return full_response
-        else:
-            # Handle regular response
-            return completion.choices[0].message.content
+            return CachedCompletion(full_response)
+        
+        # Handle regular response
+        usage = completion.usage
+        prompt_tokens = usage.prompt_tokens if usage else 0
+        completion_tokens = usage.completion_tokens if usage else 0
+        return CachedCompletion(
+            completion.choices[0].message.content,
+            prompt_tokens,
+            completion_tokens,
+            token_cost(model_name, prompt_tokens, completion_tokens)
+        )
             
     except openai.RateLimitError as e:
         raise RateLimitError("OpenAI")
+    except openai.APITimeoutError:
+        raise ProviderTimeoutError("OpenAI")
+    except (openai.InternalServerError, openai.APIConnectionError) as e:
+        raise ProviderUnavailableError("OpenAI", str(e))
     except openai.AuthenticationError:
         raise APIKeyError("OpenAI")
     except Exception as e:
         raise Exception(f"OpenAI API error: {str(e)}")
 
+async def get_completion(
+    model: Model,
+    prompt: str,
+    temperature: float = 0.7,
+    max_tokens: Optional[int] = None,
+    stream: bool = False,
+    bypass_cache: bool = False,
+    **params: Any
+) -> str:
+    """
+    Get completion from OpenAI API. Rate limits, timeouts and server errors
+    raise a TransientProviderError, for the caller to retry later.
+    Deterministic requests are served from the completion cache when
+    possible, and identical ones already in flight, in this or another
+    worker, share that call. bypass_cache=True skips the cache lookup and
+    refreshes the entry. Other params, such as top_p or seed, are passed to
+    the API as they are.
+    """
+    # Extract model name from parameters
+    model_name = (model.parameters or {}).get("model_name", "gpt-4")
+    messages = [{"role": "user", "content": prompt}]
+    cache_key = completion_cache.fingerprint("openai", model_name, messages, temperature, max_tokens, **params)
+    cached = await completion_cache.get(cache_key, temperature, bypass=bypass_cache)
+    if cached is not None:
+        return cached.text
+    
+    if not settings.OPENAI_API_KEY:
+        raise APIKeyError("OpenAI")
+    
+    async def call() -> CachedCompletion:
+        async with rate_limiter.limit("openai", model_name, estimate_tokens(messages, max_tokens)) as usage:
+            result = await _create_completion(model_name, messages, temperature, max_tokens, stream, params)
+            if result.prompt_tokens or result.completion_tokens:
+                usage.actual_tokens = result.prompt_tokens + result.completion_tokens
+        await completion_cache.set(cache_key, temperature, result)
+        return result
+    
+    if single_flight.applies(temperature):
+        result = await single_flight.do(cache_key, call)
+    else:
+        result = await call()
+    return result.text
+
 async def get_embeddings(text: str) -> list[float]:
     """
     Get embeddings from OpenAI's embedding model.
@@ -126,17 +188,10 @@ async def estimate_cost(
     """
     Estimate the cost of an API call based on token count and model.
     """
-    # Token costs per 1K tokens (as of March 2024)
-    costs = {
-        "gpt-4": {"input": 0.01, "output": 0.03},
-        "gpt-4-turbo": {"input": 0.01, "output": 0.03},
-        "gpt-3.5-turbo": {"input": 0.0005, "output": 0.0015}
-    }
-    
-    if model not in costs:
+    if model not in TOKEN_COSTS:
         raise ValueError(f"Unknown model: {model}")
         
     token_count = await get_token_count(text, model)
     cost_type = "output" if is_completion else "input"
     
-    return (token_count / 1000) * costs[model][cost_type] 
\ No newline at end of file
+    return (token_count / 1000) * TOKEN_COSTS[model][cost_type] 
\ No newline at end of file
@@ -0,0 +1,346 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import diskcache
+import redis
+from app.core.config import settings
+from app.core.exceptions import ProviderTimeoutError, RateLimitError
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ratelimit:v1:"
+# Idle buckets are full again after a minute, so their state can expire
+BUCKET_TTL_MS = 120_000
+# Rough characters per token, for estimating a request's tokens before the call
+CHARS_PER_TOKEN = 4
+
+# Refills the bucket's request and token balances at rpm and tpm per minute,
+# up to burst seconds' worth, then takes one request and the given tokens if
+# both are available. Returns 0, or the milliseconds to wait before trying
+# again. A limit of 0 means that dimension is not limited. Balances may go
+# negative after a penalty or an adjustment for actual usage, which makes
+# callers wait longer.
+_TAKE_SCRIPT = """
+local now = redis.call("TIME")
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local rpm = tonumber(ARGV[1])
+local tpm = tonumber(ARGV[2])
+local tokens = tonumber(ARGV[3])
+local burst = tonumber(ARGV[5])
+local max_requests = math.max(1, rpm * burst / 60)
+local max_tokens = math.max(tokens, tpm * burst / 60)
+local state = redis.call("HMGET", KEYS[1], "requests", "tokens", "ts")
+local requests = tonumber(state[1]) or max_requests
+local available = tonumber(state[2]) or max_tokens
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+requests = math.min(max_requests, requests + elapsed * rpm / 60000)
+available = math.min(max_tokens, available + elapsed * tpm / 60000)
+local wait = 0
+if rpm > 0 and requests < 1 then
+    wait = math.max(wait, (1 - requests) * 60000 / rpm)
+end
+if tpm > 0 and available < tokens then
+    wait = math.max(wait, (tokens - available) * 60000 / tpm)
+end
+if wait == 0 then
+    requests = requests - 1
+    available = available - tokens
+end
+redis.call("HSET", KEYS[1], "requests", tostring(requests), "tokens", tostring(available), "ts", now)
+redis.call("PEXPIRE", KEYS[1], ARGV[4])
+return math.ceil(wait)
+"""
+# Adds to the request and token balances, e.g. to refund over-estimated tokens
+_ADJUST_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    redis.call("HINCRBYFLOAT", KEYS[1], "requests", ARGV[1])
+    redis.call("HINCRBYFLOAT", KEYS[1], "tokens", ARGV[2])
+end
+return 0
+"""
+
+def estimate_tokens(messages: List[Dict[str, Any]], max_tokens: Optional[int]) -> int:
+    """Upper estimate of a call's tokens: the prompt plus the most it may generate."""
+    prompt_chars = sum(len(str(message.get("content", ""))) for message in messages)
+    completion_tokens = max_tokens or settings.RATE_LIMIT_DEFAULT_COMPLETION_TOKENS
+    return prompt_chars // CHARS_PER_TOKEN + 1 + completion_tokens
+
+def _take(
+    state: Optional[Tuple[float, float, float]],
+    now: float,
+    rpm: float,
+    tpm: float,
+    tokens: float,
+    burst: float
+) -> Tuple[Tuple[float, float, float], float]:
+    """Python version of _TAKE_SCRIPT; returns the new state and the seconds to wait."""
+    max_requests = max(1.0, rpm * burst / 60)
+    max_tokens = max(tokens, tpm * burst / 60)
+    requests, available, updated = state or (max_requests, max_tokens, now)
+    elapsed = max(0.0, now - updated)
+    requests = min(max_requests, requests + elapsed * rpm / 60)
+    available = min(max_tokens, available + elapsed * tpm / 60)
+    wait = 0.0
+    if rpm > 0 and requests < 1:
+        wait = max(wait, (1 - requests) * 60 / rpm)
+    if tpm > 0 and available < tokens:
+        wait = max(wait, (tokens - available) * 60 / tpm)
+    if wait == 0:
+        requests -= 1
+        available -= tokens
+    return (requests, available, now), wait
+
+@dataclass
+class Usage:
+    """Tokens reserved for a call; set actual_tokens once the provider reports them."""
+    estimated_tokens: int
+    actual_tokens: Optional[int] = None
+
+class AIMDLimit:
+    """
+    Concurrency limit with additive increase and multiplicative decrease:
+    each successful call raises the limit by 1/limit, so by about one per
+    limit's worth of calls, and a 429 or timeout multiplies it by backoff.
+    Decreases within cooldown seconds of the last one are ignored, since
+    calls already in flight report the same congestion.
+    """
+
+    def __init__(self, initial: float, minimum: float, maximum: float, backoff: float, cooldown: float):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < max(1, int(self.limit)))
+            self.in_flight += 1
+
+    async def release(self, outcome: str) -> None:
+        """Free a slot and adjust the limit for the call's outcome: success, congestion or error."""
+        async with self._condition:
+            self.in_flight -= 1
+            if outcome == "success":
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif outcome == "congestion":
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = now
+            self._condition.notify_all()
+
+class RateLimiter:
+    """
+    Proactive per-provider and per-model limiter for completion calls.
+
+    Requests per minute and tokens per minute are enforced by a token bucket
+    shared by all workers: a Lua script in Redis, or a diskcache under
+    CACHE_DIR with backend="filesystem" (per process with "memory"). Limits
+    come from PROVIDER_RATE_LIMITS, scaled by RATE_LIMIT_HEADROOM to stay
+    just under the provider's. Tokens are reserved from an estimate and
+    reconciled with the reported usage after the call. Buckets hold
+    RATE_LIMIT_BURST_SECONDS worth of capacity, so bursts stay within what
+    providers allow over short windows. A 429 also pauses the bucket for
+    RATE_LIMIT_PENALTY_SECONDS, for every worker.
+
+    Concurrency per provider and model is controlled by an AIMD limit in
+    each process, starting at the provider's PROVIDER_CONCURRENCY.
+    If the shared store fails, calls go ahead without rate limiting.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Dict[str, float]]] = None,
+        backend: Optional[str] = None,
+        redis_url: Optional[str] = None,
+        directory: Optional[str] = None,
+        headroom: Optional[float] = None,
+        burst_seconds: Optional[float] = None
+    ):
+        self.limits = settings.PROVIDER_RATE_LIMITS if limits is None else limits
+        self.backend = backend or settings.RATE_LIMIT_BACKEND
+        self.redis_url = redis_url or settings.RATE_LIMIT_REDIS_URL
+        self.directory = directory or os.path.join(settings.CACHE_DIR, "rate_limits")
+        self.headroom = headroom or settings.RATE_LIMIT_HEADROOM
+        self.burst_seconds = burst_seconds or settings.RATE_LIMIT_BURST_SECONDS
+        self._store: Any = None
+        self._scripts: Dict[str, Any] = {}
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._concurrency: Dict[Tuple[asyncio.AbstractEventLoop, str], AIMDLimit] = {}
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def store(self) -> Any:
+        """Open the shared store on first use; None with backend="memory"."""
+        if self._store is None and self.backend != "memory":
+            with self._lock:
+                if self._store is None:
+                    if self.backend == "redis":
+                        self._store = redis.Redis.from_url(self.redis_url, socket_timeout=1.0)
+                    elif self.backend == "filesystem":
+                        self._store = diskcache.Cache(self.directory)
+                    else:
+                        raise ValueError(f"Unsupported rate limit backend: {self.backend}")
+        return self._store
+
+    def rate_limit(self, provider: str, model: str) -> Tuple[float, float]:
+        """(requests, tokens) per minute for a model after headroom; 0 means unlimited."""
+        limits = self.limits.get(f"{provider}:{model}") or self.limits.get(provider) or {}
+        return limits.get("rpm", 0) * self.headroom, limits.get("tpm", 0) * self.headroom
+
+    def concurrency(self, provider: str, model: str) -> AIMDLimit:
+        key = (asyncio.get_running_loop(), f"{provider}:{model}")
+        limit = self._concurrency.get(key)
+        if limit is None:
+            limit = self._concurrency[key] = AIMDLimit(
+                initial=settings.PROVIDER_CONCURRENCY.get(provider, settings.DEFAULT_PROVIDER_CONCURRENCY),
+                minimum=1,
+                maximum=settings.ADAPTIVE_CONCURRENCY_MAX,
+                backoff=settings.ADAPTIVE_CONCURRENCY_BACKOFF,
+                cooldown=settings.ADAPTIVE_CONCURRENCY_COOLDOWN_SECONDS
+            )
+        return limit
+
+    def _count(self, key: str, name: str, value: float = 1) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(
+                key, dict.fromkeys(["calls", "throttled", "throttled_seconds", "congestion", "errors"], 0)
+            )
+            counters[name] += value
+
+    @asynccontextmanager
+    async def limit(self, provider: str, model: str, estimated_tokens: int) -> AsyncIterator[Usage]:
+        """
+        Hold a concurrency slot and reserve one request and estimated_tokens
+        from the model's bucket, waiting as needed. Set actual_tokens on the
+        yielded Usage to correct the reservation.
+        """
+        key = f"{provider}:{model}"
+        concurrency = self.concurrency(provider, model)
+        await concurrency.acquire()
+        usage = Usage(estimated_tokens)
+        outcome = "error"
+        try:
+            await self._wait_for_capacity(key, *self.rate_limit(provider, model), estimated_tokens)
+            self._count(key, "calls")
+            yield usage
+            outcome = "success"
+        except (RateLimitError, ProviderTimeoutError, asyncio.TimeoutError) as e:
+            outcome = "congestion"
+            self._count(key, "congestion")
+            if isinstance(e, RateLimitError):
+                await self._penalize(key, provider, model)
+            raise
+        finally:
+            await concurrency.release(outcome)
+            if usage.actual_tokens is not None:
+                await self._adjust(key, provider, model, 0, usage.estimated_tokens - usage.actual_tokens)
+
+    async def _wait_for_capacity(self, key: str, rpm: float, tpm: float, tokens: int) -> None:
+        if not rpm and not tpm:
+            return
+        # A request larger than the whole bucket could never be admitted
+        tokens = min(tokens, tpm) if tpm else 0
+        while True:
+            try:
+                wait = await self._call_store(self._take_remote, self._take_local, key, rpm, tpm, tokens)
+            except Exception as e:
+                self._count(key, "errors")
+                logger.warning(f"Rate limiter unavailable, not limiting {key}: {str(e)}")
+                return
+            if wait <= 0:
+                return
+            self._count(key, "throttled")
+            self._count(key, "throttled_seconds", wait)
+            # Jitter keeps waiting workers from retrying in lockstep
+            await asyncio.sleep(wait * random.uniform(1.0, 1.2))
+
+    async def _penalize(self, key: str, provider: str, model: str) -> None:
+        """Pause the bucket for every worker after a 429."""
+        rpm, tpm = self.rate_limit(provider, model)
+        seconds = settings.RATE_LIMIT_PENALTY_SECONDS
+        await self._adjust(key, provider, model, -rpm * seconds / 60, -tpm * seconds / 60)
+
+    async def _adjust(self, key: str, provider: str, model: str, requests: float, tokens: float) -> None:
+        rpm, tpm = self.rate_limit(provider, model)
+        if (not rpm and not tpm) or (not requests and not tokens):
+            return
+        try:
+            await self._call_store(self._adjust_remote, self._adjust_local, key, requests, tokens)
+        except Exception as e:
+            self._count(key, "errors")
+            logger.warning(f"Rate limiter adjustment failed for {key}: {str(e)}")
+
+    async def _call_store(self, remote, local, *args: Any) -> Any:
+        if self.store is None:
+            return local(*args)
+        return await asyncio.to_thread(remote, *args)
+
+    def _take_local(self, key: str, rpm: float, tpm: float, tokens: int) -> float:
+        with self._lock:
+            self._buckets[key], wait = _take(
+                self._buckets.get(key), time.monotonic(), rpm, tpm, tokens, self.burst_seconds
+            )
+        return wait
+
+    def _adjust_local(self, key: str, requests: float, tokens: float) -> None:
+        with self._lock:
+            if key in self._buckets:
+                current, available, updated = self._buckets[key]
+                self._buckets[key] = (current + requests, available + tokens, updated)
+
+    def _take_remote(self, key: str, rpm: float, tpm: float, tokens: int) -> float:
+        if self.backend == "redis":
+            wait_ms = self._script("take", _TAKE_SCRIPT)(
+                keys=[KEY_PREFIX + key],
+                args=[rpm, tpm, tokens, BUCKET_TTL_MS, self.burst_seconds]
+            )
+            return int(wait_ms) / 1000
+        with self.store.transact():
+            state, wait = _take(self.store.get(KEY_PREFIX + key), time.time(), rpm, tpm, tokens, self.burst_seconds)
+            self.store.set(KEY_PREFIX + key, state, expire=BUCKET_TTL_MS / 1000)
+        return wait
+
+    def _adjust_remote(self, key: str, requests: float, tokens: float) -> None:
+        if self.backend == "redis":
+            self._script("adjust", _ADJUST_SCRIPT)(keys=[KEY_PREFIX + key], args=[requests, tokens])
+            return
+        with self.store.transact():
+            state = self.store.get(KEY_PREFIX + key)
+            if state is not None:
+                current, available, updated = state
+                self.store.set(
+                    KEY_PREFIX + key, (current + requests, available + tokens, updated), expire=BUCKET_TTL_MS / 1000
+                )
+
+    def _script(self, name: str, source: str) -> Any:
+        if name not in self._scripts:
+            self._scripts[name] = self.store.register_script(source)
+        return self._scripts[name]
+
+    def stats(self) -> Dict[str, Any]:
+        """Per provider and model: calls, throttling, congestion and the current concurrency limits."""
+        with self._lock:
+            stats = {key: dict(counters) for key, counters in self._counters.items()}
+        for (_, key), limit in list(self._concurrency.items()):
+            entry = stats.setdefault(key, {})
+            entry["concurrency_limit"] = round(limit.limit, 2)
+            entry["in_flight"] = limit.in_flight
+        for entry in stats.values():
+            if "throttled_seconds" in entry:
+                entry["throttled_seconds"] = round(entry["throttled_seconds"], 3)
+        return stats
+
+# Global instance
+rate_limiter = RateLimiter()
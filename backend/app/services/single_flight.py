@@ -0,0 +1,243 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from dataclasses import asdict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from uuid import uuid4
+from app.services.completion_cache import CachedCompletion, CompletionCache
+
+logger = logging.getLogger(__name__)
+
+LEASE_PREFIX = "singleflight:v1:lease:"
+RESULT_PREFIX = "singleflight:v1:result:"
+# Waiters poll for the leader's result, backing off up to the max interval
+POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 1.0
+
+# Deletes or extends a lease only if it is still held by the given token
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+_RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight completion calls so that one upstream
+    call serves every concurrent caller. Within a process, callers of the
+    same key await the first caller's future. Across processes, the first
+    caller takes a lease in the completion cache's persistent tier (Redis or
+    diskcache), renews it while the call runs and publishes the result
+    there for result_ttl seconds; the others poll for it. If the leader
+    fails or dies, its lease is released or expires and a waiter takes over.
+    """
+
+    def __init__(
+        self,
+        cache: CompletionCache,
+        enabled: bool = True,
+        lease_seconds: float = 30,
+        wait_seconds: float = 300,
+        result_ttl: float = 60
+    ):
+        self.cache = cache
+        self.enabled = enabled
+        self.lease_seconds = lease_seconds
+        self.wait_seconds = wait_seconds
+        self.result_ttl = result_ttl
+        self._inflight: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Future] = {}
+        self._scripts: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ["upstream_calls", "local_coalesced", "remote_coalesced", "takeovers", "wait_timeouts", "errors"], 0
+        )
+
+    def applies(self, temperature: Optional[float]) -> bool:
+        """Only deterministic requests are coalesced; sampled ones stay independent."""
+        return self.enabled and temperature is not None and temperature <= self.cache.max_temperature
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[CachedCompletion]]) -> CachedCompletion:
+        """Run fn unless an identical call is in flight here or in another process, and return its result."""
+        loop = asyncio.get_running_loop()
+        local_key = (loop, key)
+        while local_key in self._inflight:
+            future = self._inflight[local_key]
+            try:
+                result = await asyncio.shield(future)
+                self._count("local_coalesced")
+                return result
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leading call was cancelled, not us: take over
+
+        future = loop.create_future()
+        self._inflight[local_key] = future
+        try:
+            result = await self._distributed(key, fn)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark it retrieved; local waiters, if any, still get it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(local_key) is future:
+                del self._inflight[local_key]
+
+    async def _distributed(self, key: str, fn: Callable[[], Awaitable[CachedCompletion]]) -> CachedCompletion:
+        if self.cache.store is None:
+            return await self._call(fn)
+
+        lease_key = LEASE_PREFIX + key
+        result_key = RESULT_PREFIX + key
+        deadline = time.monotonic() + self.wait_seconds
+        waited = False
+        while True:
+            token = uuid4().hex
+            try:
+                acquired = await asyncio.to_thread(self._acquire, lease_key, result_key, token)
+            except Exception as e:
+                # Without the shared tier, fall back to calling the provider directly
+                self._count("errors")
+                logger.warning(f"Single-flight lease failed: {str(e)}")
+                return await self._call(fn)
+
+            if acquired:
+                if waited:
+                    self._count("takeovers")
+                return await self._lead(lease_key, result_key, token, fn)
+
+            waited = True
+            result = await self._wait(lease_key, result_key, deadline)
+            if result is not None:
+                self._count("remote_coalesced")
+                return result
+            if time.monotonic() >= deadline:
+                self._count("wait_timeouts")
+                return await self._call(fn)
+
+    async def _call(self, fn: Callable[[], Awaitable[CachedCompletion]]) -> CachedCompletion:
+        self._count("upstream_calls")
+        return await fn()
+
+    async def _lead(
+        self,
+        lease_key: str,
+        result_key: str,
+        token: str,
+        fn: Callable[[], Awaitable[CachedCompletion]]
+    ) -> CachedCompletion:
+        renewer = asyncio.create_task(self._renew(lease_key, token))
+        try:
+            result = await self._call(fn)
+            try:
+                await asyncio.to_thread(self._publish, result_key, result)
+            except Exception as e:
+                self._count("errors")
+                logger.warning(f"Single-flight publish failed: {str(e)}")
+            return result
+        finally:
+            renewer.cancel()
+            try:
+                await asyncio.to_thread(self._release, lease_key, token)
+            except Exception as e:
+                # The lease expires on its own
+                logger.warning(f"Single-flight release failed: {str(e)}")
+
+    async def _renew(self, lease_key: str, token: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self._extend, lease_key, token)
+            except Exception as e:
+                logger.warning(f"Single-flight lease renewal failed: {str(e)}")
+
+    async def _wait(self, lease_key: str, result_key: str, deadline: float) -> Optional[CachedCompletion]:
+        """Poll for the leader's result; None once its lease is gone without one, or at the deadline."""
+        interval = POLL_INTERVAL
+        while time.monotonic() < deadline:
+            try:
+                value, leased = await asyncio.to_thread(self._poll, lease_key, result_key)
+            except Exception as e:
+                self._count("errors")
+                logger.warning(f"Single-flight poll failed: {str(e)}")
+                return None
+            if value is not None:
+                return CachedCompletion(**json.loads(value))
+            if not leased:
+                return None
+            await asyncio.sleep(min(interval, max(0.0, deadline - time.monotonic())))
+            interval = min(interval * 2, MAX_POLL_INTERVAL)
+        return None
+
+    def _script(self, name: str, source: str) -> Any:
+        if name not in self._scripts:
+            self._scripts[name] = self.cache.store.register_script(source)
+        return self._scripts[name]
+
+    def _acquire(self, lease_key: str, result_key: str, token: str) -> bool:
+        store = self.cache.store
+        if self.cache.backend == "redis":
+            acquired = bool(store.set(lease_key, token, nx=True, px=int(self.lease_seconds * 1000)))
+        else:
+            acquired = store.add(lease_key, token, expire=self.lease_seconds)
+        if acquired:
+            # Waiters must not pick up the result of an earlier flight
+            store.delete(result_key)
+        return acquired
+
+    def _extend(self, lease_key: str, token: str) -> None:
+        store = self.cache.store
+        if self.cache.backend == "redis":
+            self._script("renew", _RENEW_SCRIPT)(keys=[lease_key], args=[token, int(self.lease_seconds * 1000)])
+            return
+        with store.transact():
+            if store.get(lease_key) == token:
+                store.touch(lease_key, expire=self.lease_seconds)
+
+    def _release(self, lease_key: str, token: str) -> None:
+        store = self.cache.store
+        if self.cache.backend == "redis":
+            self._script("release", _RELEASE_SCRIPT)(keys=[lease_key], args=[token])
+            return
+        with store.transact():
+            if store.get(lease_key) == token:
+                store.delete(lease_key)
+
+    def _publish(self, result_key: str, result: CachedCompletion) -> None:
+        value = json.dumps(asdict(result))
+        if self.cache.backend == "redis":
+            self.cache.store.set(result_key, value, px=int(self.result_ttl * 1000))
+        else:
+            self.cache.store.set(result_key, value, expire=self.result_ttl)
+
+    def _poll(self, lease_key: str, result_key: str) -> Tuple[Optional[str], bool]:
+        store = self.cache.store
+        if self.cache.backend == "redis":
+            value, lease = store.mget([result_key, lease_key])
+        else:
+            value, lease = store.get(result_key), store.get(lease_key)
+        return value, lease is not None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counters, "in_flight": len(self._inflight)}
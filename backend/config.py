@@ -39,6 +39,35 @@ class Settings(BaseSettings):
     # Cache
     CACHE_TYPE: str = "memory"  # memory or filesystem
     CACHE_DIR: str = "./cache"
+    COMPLETION_CACHE_ENABLED: bool = True
+    COMPLETION_CACHE_BACKEND: str = "filesystem"  # redis, filesystem or memory
+    COMPLETION_CACHE_REDIS_URL: str = "redis://localhost:6379/1"
+    COMPLETION_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    COMPLETION_CACHE_MEMORY_SIZE: int = 10000  # entries
+    COMPLETION_CACHE_MAX_TEMPERATURE: float = 0.0  # requests sampled above this are never cached
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_LEASE_SECONDS: float = 30  # renewed while the call runs
+    SINGLE_FLIGHT_WAIT_SECONDS: float = 300  # then waiters call themselves
+    SINGLE_FLIGHT_RESULT_TTL_SECONDS: float = 60
+    
+    # Circuit breakers per provider and model, over a rolling window of calls
+    CIRCUIT_BREAKER_ENABLED: bool = True
+    CIRCUIT_BREAKER_WINDOW_SECONDS: float = 60
+    CIRCUIT_BREAKER_MIN_CALLS: int = 10  # calls in the window before it can open
+    CIRCUIT_BREAKER_ERROR_RATE: float = 0.5  # share of failed calls that opens it
+    CIRCUIT_BREAKER_SLOW_CALL_SECONDS: float = 20
+    CIRCUIT_BREAKER_SLOW_CALL_RATE: float = 0.5  # share of slow calls that opens it
+    CIRCUIT_BREAKER_OPEN_SECONDS: float = 30  # then probe calls are let through
+    CIRCUIT_BREAKER_HALF_OPEN_CALLS: int = 3  # successful probes that close it
+    
+    # Hedged requests: a second request once the first is slower than the percentile
+    HEDGE_ENABLED: bool = False  # default for requests that don't say
+    HEDGE_MODEL: Optional[str] = None  # model of the second request; the same model if unset
+    HEDGE_PERCENTILE: float = 0.95  # of the model's recent latencies
+    HEDGE_MIN_DELAY_SECONDS: float = 0.5
+    HEDGE_DEFAULT_DELAY_SECONDS: float = 2.0  # until HEDGE_MIN_SAMPLES latencies are known
+    HEDGE_MIN_SAMPLES: int = 20
+    HEDGE_LATENCY_WINDOW: int = 200  # latencies kept per model
     
     # Logging
     LOG_LEVEL: str = "INFO"
@@ -0,0 +1,213 @@
+"""
+Circuit breakers for API-based language models.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open."""
+
+    def __init__(self, name: str):
+        self.name = name
+        super().__init__(f"Circuit for {name} is open")
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one provider and model.
+
+    Calls are recorded in a rolling window of window_seconds. Once it holds
+    at least min_calls, the circuit opens when the share of failed calls
+    reaches error_rate or the share of calls slower than slow_call_seconds
+    reaches slow_call_rate. While open, calls are rejected straight away.
+    After open_seconds the circuit is half-open: up to half_open_calls
+    probes go through, and it closes if they all succeed and opens again
+    on the first failed or slow one.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = 60,
+        min_calls: int = 10,
+        error_rate: float = 0.5,
+        slow_call_seconds: float = 30,
+        slow_call_rate: float = 0.5,
+        open_seconds: float = 30,
+        half_open_calls: int = 3,
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._state = CLOSED
+        self._opened_at = 0.0
+        # (finished at, duration, failed) per call in the window
+        self._calls: Deque[Tuple[float, float, bool]] = deque()
+        self._failures = 0
+        self._slow = 0
+        self._probes = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._expire_open(time.monotonic())
+            return self._state
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """
+        Record the duration and outcome of the enclosed call, or raise
+        CircuitOpenError without running it if the circuit does not allow it.
+        A cancelled call is not recorded.
+        """
+        self._acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self._record(time.monotonic() - start, failed=True)
+            raise
+        except BaseException:
+            self._abandon()
+            raise
+        else:
+            self._record(time.monotonic() - start, failed=False)
+
+    def _acquire(self) -> None:
+        with self._lock:
+            self._expire_open(time.monotonic())
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return
+            self.rejected += 1
+        raise CircuitOpenError(self.name)
+
+    def _abandon(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def _record(self, duration: float, failed: bool) -> None:
+        now = time.monotonic()
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if failed or slow:
+                    self._open(now)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._close()
+                return
+            if self._state == OPEN:
+                # Started before the circuit opened
+                return
+
+            self._calls.append((now, duration, failed))
+            self._failures += failed
+            self._slow += slow
+            self._expire_calls(now)
+            calls = len(self._calls)
+            if calls >= self.min_calls and (
+                self._failures / calls >= self.error_rate or self._slow / calls >= self.slow_call_rate
+            ):
+                self._open(now)
+
+    def _expire_calls(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            _, duration, failed = self._calls.popleft()
+            self._failures -= failed
+            self._slow -= duration >= self.slow_call_seconds
+
+    def _expire_open(self, now: float) -> None:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+            logger.info(f"Circuit for {self.name} is half-open")
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self.times_opened += 1
+        logger.warning(f"Circuit for {self.name} opened")
+
+    def _close(self) -> None:
+        self._state = CLOSED
+        self._calls.clear()
+        self._failures = 0
+        self._slow = 0
+        logger.info(f"Circuit for {self.name} closed")
+
+    def stats(self) -> Dict[str, Any]:
+        """State and rolling-window error rate, slow-call rate and latency percentiles."""
+        with self._lock:
+            now = time.monotonic()
+            self._expire_open(now)
+            self._expire_calls(now)
+            calls = len(self._calls)
+            latencies = sorted(duration for _, duration, _ in self._calls)
+            stats = {
+                "state": self._state,
+                "calls": calls,
+                "error_rate": self._failures / calls if calls else 0.0,
+                "slow_call_rate": self._slow / calls if calls else 0.0,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+            }
+
+        def percentile(p: float) -> float:
+            return round(latencies[min(calls - 1, int(p * calls))] * 1000, 1) if latencies else 0.0
+
+        stats["latency_ms_p50"] = percentile(0.5)
+        stats["latency_ms_p99"] = percentile(0.99)
+        return stats
+
+class CircuitBreakerRegistry:
+    """Circuit breakers by provider and model, created on first use with shared settings."""
+
+    def __init__(self, enabled: bool = True, **options: Any):
+        self.enabled = enabled
+        self.options = options
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: Optional[str], model: str) -> CircuitBreaker:
+        name = f"{provider}:{model}"
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(name, CircuitBreaker(name, **self.options))
+        return breaker
+
+    @contextmanager
+    def guard(self, provider: Optional[str], model: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        with self.get(provider, model).guard():
+            yield
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: breaker.stats() for name, breaker in list(self._breakers.items())}
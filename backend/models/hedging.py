@@ -0,0 +1,146 @@
+"""
+Hedged requests for API-based language models.
+"""
+
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Tuple
+import asyncio
+import logging
+import threading
+import time
+from app.services.completion_cache import CachedCompletion, token_cost
+
+logger = logging.getLogger(__name__)
+
+class Hedger:
+    """
+    Sends a second request when the first has not answered within a
+    percentile of the model's recent latencies, and returns whichever
+    answers first; the other is cancelled.
+
+    Latencies are kept per model for the last `window` calls. Until a model
+    has min_samples of them, default_delay is used. The delay is never
+    shorter than min_delay, so fast models are not hedged on every call.
+    Tokens spent on a cancelled request are not reported by the provider,
+    so they are counted as the winner's usage, which is an upper bound.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        min_delay: float = 0.5,
+        default_delay: float = 2.0,
+        min_samples: int = 20,
+        window: int = 200,
+    ):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.window = window
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ["requests", "hedged", "hedge_wins", "wasted_prompt_tokens", "wasted_completion_tokens"], 0
+        )
+        self.wasted_cost = 0.0
+
+    def observe(self, model: str, seconds: float) -> None:
+        with self._lock:
+            latencies = self._latencies.get(model)
+            if latencies is None:
+                latencies = self._latencies[model] = deque(maxlen=self.window)
+            latencies.append(seconds)
+
+    def delay(self, model: str) -> float:
+        """Seconds to wait for the model before hedging."""
+        with self._lock:
+            latencies = sorted(self._latencies.get(model, ()))
+        if len(latencies) < self.min_samples:
+            return max(self.min_delay, self.default_delay)
+        return max(self.min_delay, latencies[min(len(latencies) - 1, int(self.percentile * len(latencies)))])
+
+    async def race(
+        self,
+        primary: Tuple[str, Callable[[], Awaitable[CachedCompletion]]],
+        backup: Tuple[str, Callable[[], Awaitable[CachedCompletion]]],
+    ) -> Tuple[str, CachedCompletion]:
+        """
+        Call primary, a (model, call) pair, and backup as well if primary is
+        still running after delay(model). Returns the model that answered
+        first with its completion. If both fail, primary's error is raised.
+        """
+        primary_model, primary_call = primary
+        backup_model, backup_call = backup
+        self._count("requests")
+        first = asyncio.ensure_future(primary_call())
+        second = None
+        started = {first: time.monotonic()}
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.delay(primary_model))
+            if done:
+                return primary_model, first.result()
+
+            self._count("hedged")
+            logger.info(f"Hedging {primary_model} with {backup_model}")
+            second = asyncio.ensure_future(backup_call())
+            started[second] = time.monotonic()
+            models = {first: primary_model, second: backup_model}
+            pending = {first, second}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if not task.cancelled() and task.exception() is None]
+                if not winners:
+                    continue
+                winner = first if first in winners else winners[0]
+                result = winner.result()
+                for loser in models:
+                    if loser is not winner:
+                        self._waste(models[loser], loser, result, started[loser])
+                if winner is second:
+                    self._count("hedge_wins")
+                return models[winner], result
+            # Both failed
+            return primary_model, first.result()
+        finally:
+            for task in (first, second):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def _waste(
+        self,
+        model: str,
+        task: "asyncio.Future[CachedCompletion]",
+        winner: CachedCompletion,
+        started: float,
+    ) -> None:
+        """Count the tokens of a request whose answer is not used."""
+        if task.done():
+            if task.cancelled() or task.exception() is not None:
+                return
+            usage = task.result()
+        else:
+            # Still running: it is cancelled, and took at least this long
+            self.observe(model, time.monotonic() - started)
+            usage = winner
+        with self._lock:
+            self._counters["wasted_prompt_tokens"] += usage.prompt_tokens
+            self._counters["wasted_completion_tokens"] += usage.completion_tokens
+            self.wasted_cost += token_cost(model, usage.prompt_tokens, usage.completion_tokens)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hedge rate, wasted tokens and cost, and the current hedging delay of each model."""
+        with self._lock:
+            counters = dict(self._counters)
+            models = list(self._latencies)
+            wasted_cost = self.wasted_cost
+        return {
+            **counters,
+            "hedge_rate": counters["hedged"] / counters["requests"] if counters["requests"] else 0.0,
+            "wasted_cost": round(wasted_cost, 6),
+            "delay_ms": {model: round(self.delay(model) * 1000, 1) for model in models},
+        }
@@ -4,9 +4,15 @@ LLM Client module for managing API-based language models.
 
 from typing import Optional, Dict, Any, List
 import logging
+import os
+import time
 from openai import OpenAI, AsyncOpenAI
 from anthropic import Anthropic
+from app.services.completion_cache import CachedCompletion, CompletionCache, token_cost
+from app.services.single_flight import SingleFlight
 from config import settings
+from .circuit_breaker import CircuitBreakerRegistry, CircuitOpenError
+from .hedging import Hedger
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +24,39 @@ class LLMClient:
         self.openai_client = None
         self.async_openai_client = None
         self.anthropic_client = None
+        self.completion_cache = CompletionCache(
+            backend=settings.COMPLETION_CACHE_BACKEND,
+            ttl=settings.COMPLETION_CACHE_TTL_SECONDS,
+            memory_size=settings.COMPLETION_CACHE_MEMORY_SIZE,
+            max_temperature=settings.COMPLETION_CACHE_MAX_TEMPERATURE,
+            enabled=settings.COMPLETION_CACHE_ENABLED,
+            directory=os.path.join(settings.CACHE_DIR, "completions"),
+            redis_url=settings.COMPLETION_CACHE_REDIS_URL,
+        )
+        self.single_flight = SingleFlight(
+            self.completion_cache,
+            enabled=settings.SINGLE_FLIGHT_ENABLED,
+            lease_seconds=settings.SINGLE_FLIGHT_LEASE_SECONDS,
+            wait_seconds=settings.SINGLE_FLIGHT_WAIT_SECONDS,
+            result_ttl=settings.SINGLE_FLIGHT_RESULT_TTL_SECONDS,
+        )
+        self.circuit_breakers = CircuitBreakerRegistry(
+            enabled=settings.CIRCUIT_BREAKER_ENABLED,
+            window_seconds=settings.CIRCUIT_BREAKER_WINDOW_SECONDS,
+            min_calls=settings.CIRCUIT_BREAKER_MIN_CALLS,
+            error_rate=settings.CIRCUIT_BREAKER_ERROR_RATE,
+            slow_call_seconds=settings.CIRCUIT_BREAKER_SLOW_CALL_SECONDS,
+            slow_call_rate=settings.CIRCUIT_BREAKER_SLOW_CALL_RATE,
+            open_seconds=settings.CIRCUIT_BREAKER_OPEN_SECONDS,
+            half_open_calls=settings.CIRCUIT_BREAKER_HALF_OPEN_CALLS,
+        )
+        self.hedger = Hedger(
+            percentile=settings.HEDGE_PERCENTILE,
+            min_delay=settings.HEDGE_MIN_DELAY_SECONDS,
+            default_delay=settings.HEDGE_DEFAULT_DELAY_SECONDS,
+            min_samples=settings.HEDGE_MIN_SAMPLES,
+            window=settings.HEDGE_LATENCY_WINDOW,
+        )
         self._initialize_clients()
     
     def _initialize_clients(self):
@@ -45,20 +84,56 @@ class LLMClient:
         model: Optional[str] = None,
         max_tokens: int = 1000,
         temperature: float = 0.7,
+        bypass_cache: bool = False,
+        hedge: Optional[bool] = None,
         **kwargs: Any,
     ) -> str:
-        """Generate text using the available LLM APIs."""
+        """
+        Generate text using the available LLM APIs. Deterministic requests
+        are served from the completion cache when possible, and identical
+        ones already in flight, in this or another process, share that call.
+        bypass_cache=True skips the cache lookup and refreshes the entry.
+        While the model's circuit is open, requests go straight to
+        FALLBACK_MODEL instead of waiting for the provider to fail.
+        With hedge=True (HEDGE_ENABLED by default), a second request goes to
+        HEDGE_MODEL, or the same model, once the first is slower than
+        HEDGE_PERCENTILE of the model's recent latencies; the first answer
+        wins and the other request is cancelled.
+        """
+        hedge = settings.HEDGE_ENABLED if hedge is None else hedge
         model = model or settings.DEFAULT_MODEL
+        provider = self._provider(model)
+        messages = [{"role": "user", "content": prompt}]
+        cache_key = self.completion_cache.fingerprint(provider, model, messages, temperature, max_tokens, **kwargs)
+        cached = await self.completion_cache.get(cache_key, temperature, bypass=bypass_cache)
+        if cached is not None:
+            return cached.text
+        
+        async def call() -> CachedCompletion:
+            if hedge:
+                hedge_model = settings.HEDGE_MODEL or model
+                winner, result = await self.hedger.race(
+                    (model, lambda: self._call_model(model, prompt, max_tokens, temperature, **kwargs)),
+                    (hedge_model, lambda: self._call_model(hedge_model, prompt, max_tokens, temperature, **kwargs)),
+                )
+                if winner != model:
+                    # Another model's answer is not cached under this request
+                    return result
+            else:
+                result = await self._call_model(model, prompt, max_tokens, temperature, **kwargs)
+            await self.completion_cache.set(cache_key, temperature, result)
+            return result
         
         try:
-            if "gpt" in model.lower():
-                return await self._generate_openai(prompt, model, max_tokens, temperature, **kwargs)
-            elif "claude" in model.lower():
-                return await self._generate_anthropic(prompt, model, max_tokens, temperature, **kwargs)
+            if self.single_flight.applies(temperature):
+                result = await self.single_flight.do(cache_key, call)
             else:
-                raise ValueError(f"Unsupported model: {model}")
+                result = await call()
         except Exception as e:
-            logger.error(f"Error generating text with {model}: {str(e)}")
+            if isinstance(e, CircuitOpenError):
+                logger.info(f"Skipping {model}: {str(e)}")
+            else:
+                logger.error(f"Error generating text with {model}: {str(e)}")
             # Try fallback model
             if model != settings.FALLBACK_MODEL:
                 logger.info(f"Attempting fallback to {settings.FALLBACK_MODEL}")
@@ -67,9 +142,42 @@ class LLMClient:
                     model=settings.FALLBACK_MODEL,
                     max_tokens=max_tokens,
                     temperature=temperature,
+                    bypass_cache=bypass_cache,
+                    hedge=hedge,
                     **kwargs
                 )
             raise
+        
+        return result.text
+    
+    async def _call_model(
+        self,
+        model: str,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        **kwargs: Any,
+    ) -> CachedCompletion:
+        """Call a model through its circuit breaker and record its latency for hedging."""
+        provider = self._provider(model)
+        start = time.monotonic()
+        with self.circuit_breakers.guard(provider, model):
+            if provider == "openai":
+                result = await self._generate_openai(prompt, model, max_tokens, temperature, **kwargs)
+            elif provider == "anthropic":
+                result = await self._generate_anthropic(prompt, model, max_tokens, temperature, **kwargs)
+            else:
+                raise ValueError(f"Unsupported model: {model}")
+        self.hedger.observe(model, time.monotonic() - start)
+        return result
+    
+    @staticmethod
+    def _provider(model: str) -> Optional[str]:
+        if "gpt" in model.lower():
+            return "openai"
+        if "claude" in model.lower():
+            return "anthropic"
+        return None
     
     async def _generate_openai(
         self,
@@ -78,7 +186,7 @@ class LLMClient:
         max_tokens: int,
         temperature: float,
         **kwargs: Any,
-    ) -> str:
+    ) -> CachedCompletion:
         """Generate text using OpenAI's API."""
         if not self.async_openai_client:
             raise ValueError("OpenAI client not initialized. Please check your API key.")
@@ -90,7 +198,13 @@ class LLMClient:
             temperature=temperature,
             **kwargs
         )
-        return response.choices[0].message.content
+        usage = response.usage
+        return CachedCompletion(
+            response.choices[0].message.content,
+            usage.prompt_tokens,
+            usage.completion_tokens,
+            token_cost(model, usage.prompt_tokens, usage.completion_tokens),
+        )
     
     async def _generate_anthropic(
         self,
@@ -99,7 +213,7 @@ class LLMClient:
         max_tokens: int,
         temperature: float,
         **kwargs: Any,
-    ) -> str:
+    ) -> CachedCompletion:
         """Generate text using Anthropic's API."""
         if not self.anthropic_client:
             raise ValueError("Anthropic client not initialized. Please check your API key.")
@@ -111,7 +225,13 @@ class LLMClient:
             messages=[{"role": "user", "content": prompt}],
             **kwargs
         )
-        return response.content[0].text
+        usage = response.usage
+        return CachedCompletion(
+            response.content[0].text,
+            usage.input_tokens,
+            usage.output_tokens,
+            token_cost(model, usage.input_tokens, usage.output_tokens),
+        )
 
 # Global instance
 llm_client = LLMClient() 
\ No newline at end of file
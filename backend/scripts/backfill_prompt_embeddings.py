@@ -0,0 +1,64 @@
+"""
+Backfill expected-answer embeddings for existing prompts.
+
+The job walks prompts in primary-key order and commits once per batch. The
+last committed prompt ID is written to a checkpoint file, so an interrupted
+run resumes where it stopped; prompts that already have an up-to-date
+embedding are skipped either way.
+
+Usage: python -m scripts.backfill_prompt_embeddings [--batch-size N] [--model NAME] [--checkpoint PATH]
+"""
+import argparse
+import logging
+import os
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.evaluators.embeddings import embedding_key
+from app.evaluators.reference_embeddings import backfill_prompt_embeddings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def read_checkpoint(path: str) -> str | None:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read().strip() or None
+
+def write_checkpoint(path: str, prompt_id: str) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(prompt_id)
+    os.replace(tmp_path, path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--model", default=embedding_key(), help="Embedding key, e.g. all-MiniLM-L6-v2@onnx")
+    parser.add_argument("--checkpoint", default=None)
+    args = parser.parse_args()
+
+    checkpoint = args.checkpoint or os.path.join(
+        settings.CACHE_DIR, f"backfill_prompt_embeddings.{args.model.replace('/', '_').replace('@', '_')}.checkpoint"
+    )
+    os.makedirs(os.path.dirname(checkpoint) or ".", exist_ok=True)
+    after_id = read_checkpoint(checkpoint)
+    if after_id:
+        logger.info(f"Resuming after prompt {after_id}")
+
+    db = SessionLocal()
+    total = 0
+    try:
+        for last_id, written in backfill_prompt_embeddings(db, args.model, args.batch_size, after_id):
+            total += written
+            write_checkpoint(checkpoint, last_id)
+            logger.info(f"Embedded {written} prompts in batch ending at {last_id} ({total} total)")
+    finally:
+        db.close()
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    logger.info(f"Backfill completed: {total} prompts embedded with {args.model}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compare embedding backends on single-core similarity-scoring throughput and
+check that their similarity scores stay within tolerance of the reference
+torch backend.
+
+Usage: python -m scripts.bench_embedding_backends [--backends torch-int8 onnx] [--pairs N] [--threads N]
+"""
+import argparse
+import sys
+import time
+from app.core.config import settings
+from app.evaluators.embedding_backends import REFERENCE_BACKEND
+from app.evaluators.embeddings import check_parity, embedding_key, embedding_registry, pair_similarities
+
+def make_pairs(n: int) -> list[tuple[str, str]]:
+    subjects = ["Paris", "the Pacific Ocean", "Mount Everest", "photosynthesis", "the Roman Empire"]
+    return [
+        (
+            f"{subjects[i % len(subjects)]} is described in answer number {i} with some extra context.",
+            f"The expected answer mentions {subjects[(i * 3) % len(subjects)]}."
+        )
+        for i in range(n)
+    ]
+
+def throughput(model, pairs: list[tuple[str, str]], repeats: int) -> float:
+    """Scored pairs per second."""
+    pair_similarities(model, pairs[:8])  # warm up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        pair_similarities(model, pairs)
+    return len(pairs) * repeats / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL_NAME)
+    parser.add_argument("--backends", nargs="+", default=["torch-int8", "onnx"])
+    parser.add_argument("--pairs", type=int, default=256)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=1, help="Torch threads, to measure per-core throughput")
+    parser.add_argument("--tolerance", type=float, default=settings.EMBEDDING_PARITY_TOLERANCE)
+    args = parser.parse_args()
+
+    import torch
+    torch.set_num_threads(args.threads)
+
+    pairs = make_pairs(args.pairs)
+    reference = embedding_registry.get(embedding_key(args.model, REFERENCE_BACKEND))
+    reference_rate = throughput(reference, pairs, args.repeats)
+    print(f"{REFERENCE_BACKEND:<12} {reference_rate:8.1f} pairs/s  1.00x")
+
+    failed = False
+    for backend in args.backends:
+        try:
+            candidate = embedding_registry.get(embedding_key(args.model, backend))
+        except ImportError as e:
+            print(f"{backend:<12} skipped: {e}")
+            continue
+
+        rate = throughput(candidate, pairs, args.repeats)
+        report = check_parity(reference, candidate, pairs, args.tolerance)
+        failed = failed or not report.passed
+        print(
+            f"{backend:<12} {rate:8.1f} pairs/s  {rate / reference_rate:.2f}x  "
+            f"max |diff| {report.max_abs_diff:.4f}  mean |diff| {report.mean_abs_diff:.4f}  "
+            f"{'ok' if report.passed else 'FAILED'}"
+        )
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Micro-benchmark for FactualQAEvaluator scoring.
+
+Counts embedding forward passes (encode calls) and encoded texts per prompt
+for the legacy per-metric encoding path, the per-prompt scoring path and
+the vectorized batch path.
+
+Usage: python -m scripts.bench_factual_qa [--prompts N] [--fake]
+"""
+import argparse
+import asyncio
+import hashlib
+import time
+from typing import Any, List
+import numpy as np
+from app.evaluators.embeddings import embedding_key, embedding_registry
+from app.evaluators.factual_qa import FactualQAEvaluator
+from app.models.models import Model, ModelProvider, Prompt
+
+class CountingModel:
+    """Wraps an embedding model and counts encode calls and encoded texts."""
+
+    def __init__(self, model: Any):
+        self.model = model
+        self.calls = 0
+        self.texts = 0
+
+    def encode(self, sentences, **kwargs):
+        self.calls += 1
+        self.texts += 1 if isinstance(sentences, str) else len(sentences)
+        return self.model.encode(sentences, **kwargs)
+
+    def reset(self) -> None:
+        self.calls = 0
+        self.texts = 0
+
+class HashingModel:
+    """Deterministic stand-in for a sentence embedding model."""
+
+    dimension = 384
+
+    def encode(self, sentences, normalize_embeddings: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else sentences
+        vectors = np.stack([
+            np.random.default_rng(int(hashlib.md5(t.encode()).hexdigest()[:8], 16)).standard_normal(self.dimension)
+            for t in texts
+        ]).astype(np.float32)
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors[0] if single else vectors
+
+def legacy_metrics(model: Any, completion: str, expected: str) -> None:
+    """The pre-context scoring path: every metric encodes both texts separately."""
+    for _ in ("semantic_similarity", "contradiction_score"):
+        emb1 = model.encode(completion)
+        emb2 = model.encode(expected)
+        np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
+
+def make_pairs(n: int) -> List[tuple[str, str]]:
+    return [
+        (f"The capital of country {i} is city {i * 7}.", f"City {i * 7}")
+        for i in range(n)
+    ]
+
+def report(name: str, model: CountingModel, n: int, elapsed: float) -> None:
+    print(
+        f"{name:<8} encode calls/prompt: {model.calls / n:.2f}  "
+        f"texts/prompt: {model.texts / n:.2f}  "
+        f"ms/prompt: {elapsed * 1000 / n:.3f}"
+    )
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--prompts", type=int, default=200)
+    parser.add_argument("--fake", action="store_true", help="Use a hashing model instead of loading weights")
+    args = parser.parse_args()
+
+    if args.fake:
+        embedding_registry.register(embedding_key(), HashingModel())
+    model = CountingModel(embedding_registry.get())
+    pairs = make_pairs(args.prompts)
+
+    start = time.perf_counter()
+    for completion, expected in pairs:
+        legacy_metrics(model, completion, expected)
+    report("legacy", model, len(pairs), time.perf_counter() - start)
+
+    model.reset()
+    evaluator = FactualQAEvaluator(Model(name="bench", provider=ModelProvider.OPENAI, parameters={}))
+    evaluator.embedding_model = model
+    start = time.perf_counter()
+    for completion, expected in pairs:
+        await evaluator.calculate_metrics(completion, expected)
+    report("context", model, len(pairs), time.perf_counter() - start)
+
+    model.reset()
+    prompts = [Prompt(content="", metadata_={"expected_answer": expected}) for _, expected in pairs]
+    start = time.perf_counter()
+    await evaluator.evaluate_batch(prompts, [completion for completion, _ in pairs])
+    report("batch", model, len(pairs), time.perf_counter() - start)
+
+if __name__ == "__main__":
+    asyncio.run(main())
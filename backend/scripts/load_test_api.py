@@ -0,0 +1,80 @@
+"""
+Load test for the evaluation API's responsiveness under slow queries.
+
+Measures latency of a fast probe request (GET /evaluations/{id}) on its own,
+then again while other clients keep slow list queries in flight against the
+same server. With non-blocking endpoints the probe p99 should stay close to
+its baseline; with blocking ones it climbs to the slow query's duration.
+
+Usage: python -m scripts.load_test_api --evaluation-id ID [--base-url URL] [--slow-clients N] [--duration S]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import List
+import httpx
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+async def probe(client: httpx.AsyncClient, path: str, deadline: float, latencies: List[float]) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+async def slow_load(client: httpx.AsyncClient, path: str, deadline: float) -> None:
+    while time.perf_counter() < deadline:
+        await client.get(path)
+
+async def run_phase(args: argparse.Namespace, slow_clients: int) -> List[float]:
+    """Run probes for args.duration seconds alongside slow_clients slow-query loops."""
+    latencies: List[float] = []
+    limits = httpx.Limits(max_connections=args.probe_clients + slow_clients)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120, limits=limits) as client:
+        deadline = time.perf_counter() + args.duration
+        probe_path = f"/evaluations/{args.evaluation_id}"
+        await asyncio.gather(
+            *[probe(client, probe_path, deadline, latencies) for _ in range(args.probe_clients)],
+            *[slow_load(client, args.slow_path, deadline) for _ in range(slow_clients)]
+        )
+    return latencies
+
+def report(name: str, latencies: List[float]) -> None:
+    print(
+        f"{name:<10} {len(latencies):6d} requests  "
+        f"p50 {percentile(latencies, 0.5):7.1f} ms  "
+        f"p95 {percentile(latencies, 0.95):7.1f} ms  "
+        f"p99 {percentile(latencies, 0.99):7.1f} ms"
+    )
+
+async def main_async(args: argparse.Namespace) -> int:
+    baseline = await run_phase(args, slow_clients=0)
+    report("baseline", baseline)
+    loaded = await run_phase(args, slow_clients=args.slow_clients)
+    report("loaded", loaded)
+
+    ratio = percentile(loaded, 0.99) / max(percentile(baseline, 0.99), 1e-3)
+    print(f"p99 ratio (loaded / baseline): {ratio:.2f}x")
+    return 0 if ratio <= args.max_p99_ratio else 1
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8000/api/v1")
+    parser.add_argument("--evaluation-id", required=True, help="Existing evaluation used for probe requests")
+    parser.add_argument("--slow-path", default="/evaluations/", help="Request that runs a slow query")
+    parser.add_argument("--probe-clients", type=int, default=4)
+    parser.add_argument("--slow-clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per phase")
+    parser.add_argument("--max-p99-ratio", type=float, default=2.0, help="Fail if loaded p99 exceeds baseline by more")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main_async(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Move existing long completions out of the evaluations table into the blob store.
+
+Walks evaluations in (created_at, id) order and commits once per batch.
+Moved rows no longer match, so an interrupted run can simply be restarted.
+Postgres only returns the freed space after a VACUUM FULL (or pg_repack) of
+each partition. --restore moves blob-stored completions back inline, e.g.
+before downgrading the completion_blobs migration.
+
+Usage: python -m scripts.offload_completions [--batch-size N] [--restore]
+"""
+import argparse
+import logging
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.storage import completion_columns, load_completions
+from app.models.models import Evaluation
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _batches(db: Session, query, batch_size: int) -> Iterator[list]:
+    after: Optional[Tuple[datetime, str]] = None
+    while True:
+        page = query
+        if after:
+            page = page.where(tuple_(Evaluation.created_at, Evaluation.id) > tuple_(*after))
+        rows = db.execute(page.order_by(Evaluation.created_at, Evaluation.id).limit(batch_size)).all()
+        if not rows:
+            return
+        yield rows
+        after = (rows[-1].created_at, rows[-1].id)
+
+def offload(db: Session, batch_size: int) -> int:
+    query = select(Evaluation.id, Evaluation.created_at, Evaluation.completion).where(
+        Evaluation.completion_hash.is_(None),
+        func.octet_length(Evaluation.completion) >= settings.COMPLETION_BLOB_MIN_BYTES
+    )
+    moved = 0
+    for rows in _batches(db, query, batch_size):
+        db.execute(update(Evaluation), [
+            {"id": row.id, **completion_columns(row.completion)} for row in rows
+        ])
+        db.commit()
+        moved += len(rows)
+        logger.info(f"Moved {moved} completions to the blob store")
+    return moved
+
+def restore(db: Session, batch_size: int) -> int:
+    query = select(Evaluation.id, Evaluation.created_at, Evaluation.completion_hash).where(
+        Evaluation.completion_hash.is_not(None)
+    )
+    restored = 0
+    for rows in _batches(db, query, batch_size):
+        completions = load_completions(row.completion_hash for row in rows)
+        db.execute(update(Evaluation), [
+            {"id": row.id, "completion": completions[row.completion_hash], "completion_hash": None}
+            for row in rows
+        ])
+        db.commit()
+        restored += len(rows)
+        logger.info(f"Restored {restored} completions inline")
+    return restored
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--restore", action="store_true")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.restore:
+            restore(db, args.batch_size)
+        else:
+            offload(db, args.batch_size)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
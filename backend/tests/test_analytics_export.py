@@ -0,0 +1,127 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List
+import pytest
+from sqlalchemy import create_engine, null
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.analytics.export import dataset_path, export_evaluations, read_watermark
+from app.analytics.reader import query_evaluations, score_summary
+from app.core.database import Base
+from app.models.models import Evaluation, EvaluationType, Model, ModelProvider, Prompt
+
+START = datetime(2026, 8, 31, 23, 0, tzinfo=timezone.utc)
+
+@pytest.fixture
+def db() -> Session:
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    yield db
+    db.close()
+    engine.dispose()
+
+def add_evaluations(db: Session, model_name: str, scores: List[dict], start: datetime = START) -> List[str]:
+    model = db.get(Model, model_name) or Model(id=model_name, name=model_name, provider=ModelProvider.OPENAI, parameters={})
+    prompt = Prompt(content="Capital of France?", type=EvaluationType.FACTUAL_QA, metadata_={})
+    evaluations = [
+        Evaluation(model=model, prompt=prompt, scores=score, created_at=start + timedelta(hours=i))
+        for i, score in enumerate(scores)
+    ]
+    db.add_all(evaluations)
+    db.commit()
+    return [evaluation.id for evaluation in evaluations]
+
+def parquet_files(root: str) -> List[str]:
+    return sorted(
+        os.path.relpath(os.path.join(directory, name), dataset_path(root))
+        for directory, _, names in os.walk(dataset_path(root))
+        for name in names if name.endswith(".parquet")
+    )
+
+def test_export_partitions_by_model_and_month(db: Session, tmp_path):
+    root = str(tmp_path)
+    add_evaluations(db, "m1", [{"accuracy": 0.5}, {"accuracy": 1.0, "label": "ok"}])
+    add_evaluations(db, "m2", [{"toxicity": 0.1}])
+
+    assert export_evaluations(db, root=root, lag=timedelta(0)) == {"rows": 3, "files": 3}
+
+    directories = {os.path.dirname(path) for path in parquet_files(root)}
+    assert directories == {"model_id=m1/month=2026-08", "model_id=m1/month=2026-09", "model_id=m2/month=2026-08"}
+    frame = query_evaluations(root=root).sort_values(["model_id", "created_at"])
+    assert list(frame["evaluation_type"]) == ["factual_qa"] * 3
+    # Files with different score columns read as one table, with missing scores null
+    assert frame["score_accuracy"].tolist()[:2] == [0.5, 1.0]
+    assert frame["score_toxicity"].isna().tolist() == [True, True, False]
+    assert "score_label" not in frame
+
+def test_export_is_incremental_and_skips_recent_rows(db: Session, tmp_path):
+    root = str(tmp_path)
+    first = add_evaluations(db, "m1", [{"accuracy": 0.5}])
+    export_evaluations(db, root=root, lag=timedelta(0))
+    recent = datetime.now(timezone.utc)
+    second = add_evaluations(db, "m1", [{"accuracy": 0.7}], start=START + timedelta(days=1))
+    add_evaluations(db, "m2", [{"accuracy": 0.9}], start=recent)
+
+    assert export_evaluations(db, root=root, lag=timedelta(minutes=10))["rows"] == 1
+    assert export_evaluations(db, root=root, lag=timedelta(minutes=10))["rows"] == 0
+
+    assert sorted(query_evaluations(root=root)["id"]) == sorted(first + second)
+    assert read_watermark(dataset_path(root))[1] == second[0]
+
+def test_rerun_after_a_lost_watermark_does_not_duplicate_rows(db: Session, tmp_path):
+    root = str(tmp_path)
+    add_evaluations(db, "m1", [{"accuracy": 0.5}, {"accuracy": 0.6}])
+    export_evaluations(db, root=root, lag=timedelta(0))
+    os.remove(os.path.join(dataset_path(root), "_watermark.json"))
+
+    export_evaluations(db, root=root, lag=timedelta(0))
+
+    assert len(query_evaluations(root=root)) == 2
+
+def test_reader_filters_and_summarizes(db: Session, tmp_path):
+    root = str(tmp_path)
+    add_evaluations(db, "m1", [{"accuracy": value} for value in (0.2, 0.4, 0.6, 0.8)])
+    add_evaluations(db, "m2", [{"accuracy": 0.9}])
+    export_evaluations(db, root=root, lag=timedelta(0))
+
+    frame = query_evaluations(["id", "score_accuracy"], root=root, model_ids=["m1"], min_scores={"accuracy": 0.5})
+    assert sorted(frame["score_accuracy"]) == [0.6, 0.8]
+    frame = query_evaluations(["id"], root=root, start_date=START + timedelta(hours=1), end_date=START + timedelta(hours=2))
+    assert len(frame) == 2
+
+    summary = score_summary("accuracy", root=root, model_ids=["m1"])
+    assert [(row.month, row["count"]) for _, row in summary.iterrows()] == [("2026-08", 1.0), ("2026-09", 3.0)]
+
+def test_export_stops_before_unfinished_evaluations(db: Session, tmp_path):
+    root = str(tmp_path)
+    start = datetime.now(timezone.utc) - timedelta(hours=3)
+    done, pending, retrying, later = add_evaluations(db, "m1", [{"accuracy": 0.5}] * 4, start=start)
+    db.query(Evaluation).filter(Evaluation.id.in_([pending, retrying])).update({"scores": null()})
+    db.query(Evaluation).filter(Evaluation.id == retrying).update({"error": "rate limited", "next_retry_at": start})
+    db.commit()
+
+    assert export_evaluations(db, root=root, lag=timedelta(0))["rows"] == 1
+
+    db.query(Evaluation).filter(Evaluation.id == pending).update({"scores": {"accuracy": 0.7}})
+    db.commit()
+    assert export_evaluations(db, root=root, lag=timedelta(0))["rows"] == 1
+
+    # A final error finishes an evaluation too
+    db.query(Evaluation).filter(Evaluation.id == retrying).update({"next_retry_at": None})
+    db.commit()
+    assert export_evaluations(db, root=root, lag=timedelta(0))["rows"] == 2
+
+    frame = query_evaluations(["id", "score_accuracy", "error"], root=root).set_index("id")
+    assert frame.loc[pending, "score_accuracy"] == 0.7
+    assert frame.loc[retrying, "error"] == "rate limited"
+    assert sorted(frame.index) == sorted([done, pending, retrying, later])
+
+def test_long_unfinished_evaluations_do_not_hold_back_the_export(db: Session, tmp_path):
+    root = str(tmp_path)
+    start = datetime.now(timezone.utc) - timedelta(days=2)
+    lost, _ = add_evaluations(db, "m1", [{"accuracy": 0.5}] * 2, start=start)
+    db.query(Evaluation).filter(Evaluation.id == lost).update({"scores": null()})
+    db.commit()
+
+    assert export_evaluations(db, root=root, lag=timedelta(0))["rows"] == 2
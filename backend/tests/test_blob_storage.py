@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from app.core import storage
+from app.core.exceptions import StorageError
+from app.core.storage import BlobStore, LocalBlobStore, S3BlobStore, blob_key, completion_columns, load_completions
+
+def test_local_store_roundtrip_and_dedup(tmp_path: Path):
+    store = LocalBlobStore(root=str(tmp_path))
+    data = b"The capital of France is Paris. " * 100
+
+    key = store.put(data)
+    assert store.put(data) == key == blob_key(data)
+    assert store.get(key) == data
+
+    files = list(tmp_path.rglob("*.zst"))
+    assert len(files) == 1
+    assert files[0].stat().st_size < len(data)
+
+def test_local_store_missing_blob(tmp_path: Path):
+    store = LocalBlobStore(root=str(tmp_path))
+    with pytest.raises(StorageError):
+        store.get(blob_key(b"never stored"))
+
+def test_completion_columns_inline_below_threshold(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr("app.core.storage.settings.COMPLETION_BLOB_MIN_BYTES", 16)
+    store = LocalBlobStore(root=str(tmp_path))
+
+    short = completion_columns("Paris", store)
+    assert short == {"completion": "Paris", "completion_hash": None, "completion_size": 5}
+
+    text = "Paris est la capitale de la France. " * 3
+    long = completion_columns(text, store)
+    assert long["completion"] is None
+    assert long["completion_size"] == len(text.encode("utf-8"))
+    assert load_completions([long["completion_hash"]], store) == {long["completion_hash"]: text}
+
+def test_s3_store_roundtrip():
+    moto = pytest.importorskip("moto")
+    boto3 = pytest.importorskip("boto3")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="blobs")
+        store = S3BlobStore(bucket="blobs", prefix="completions", client=client)
+        keys = [store.put(f"completion {i}".encode("utf-8") * 50) for i in range(3)]
+
+        assert store.exists(keys[0])
+        assert store.get_many(keys + keys[:1]) == {
+            key: f"completion {i}".encode("utf-8") * 50 for i, key in enumerate(keys)
+        }
+        with pytest.raises(StorageError):
+            store.get(blob_key(b"never stored"))
+
+def test_blob_store_requires_the_storage_methods():
+    class Incomplete(BlobStore):
+        def exists(self, key: str) -> bool:
+            return False
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_s3_settings_are_only_needed_once_the_store_is_used(monkeypatch):
+    env = {**os.environ, "STORAGE_TYPE": "s3", "S3_BUCKET": "", "PYTHONPATH": str(Path(__file__).parents[1])}
+    script = "import sys, app.core.storage, app.evaluators.writer; print('boto3' in sys.modules)"
+    imported = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True)
+
+    assert imported.returncode == 0, imported.stderr
+    assert imported.stdout.strip() == "False"
+    monkeypatch.setattr(storage, "_blob_store", None)
+    monkeypatch.setattr(storage.settings, "STORAGE_TYPE", "s3")
+    monkeypatch.setattr(storage.settings, "S3_BUCKET", "")
+    with pytest.raises(StorageError):
+        storage.get_blob_store()
@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+from models.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+def make_breaker(**options) -> CircuitBreaker:
+    defaults = dict(window_seconds=60, min_calls=4, error_rate=0.5, slow_call_seconds=10, open_seconds=0.05)
+    return CircuitBreaker("openai:gpt-4", **{**defaults, **options})
+
+def call(breaker: CircuitBreaker, fail: bool = False) -> None:
+    with breaker.guard():
+        if fail:
+            raise RuntimeError("provider down")
+
+def test_opens_on_error_rate_and_rejects_calls():
+    breaker = make_breaker()
+    call(breaker)
+    call(breaker)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            call(breaker, fail=True)
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        call(breaker)
+    assert breaker.stats()["rejected"] == 1
+
+def test_stays_closed_below_min_calls():
+    breaker = make_breaker()
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            call(breaker, fail=True)
+
+    assert breaker.state == CLOSED
+
+def test_opens_on_slow_calls():
+    breaker = make_breaker(slow_call_seconds=0.01, min_calls=2)
+
+    async def slow():
+        with breaker.guard():
+            await asyncio.sleep(0.02)
+
+    asyncio.run(slow())
+    asyncio.run(slow())
+
+    assert breaker.state == OPEN
+    assert breaker.stats()["times_opened"] == 1
+
+def test_half_open_probes_close_or_reopen():
+    breaker = make_breaker(min_calls=1, half_open_calls=2)
+    with pytest.raises(RuntimeError):
+        call(breaker, fail=True)
+    asyncio.run(asyncio.sleep(0.06))
+    assert breaker.state == HALF_OPEN
+
+    with pytest.raises(RuntimeError):
+        call(breaker, fail=True)
+    assert breaker.state == OPEN
+
+    asyncio.run(asyncio.sleep(0.06))
+    call(breaker)
+    call(breaker)
+    assert breaker.state == CLOSED
+
+def test_cancelled_probe_frees_its_slot():
+    breaker = make_breaker(min_calls=1, half_open_calls=1)
+    with pytest.raises(RuntimeError):
+        call(breaker, fail=True)
+    asyncio.run(asyncio.sleep(0.06))
+
+    async def cancelled():
+        with breaker.guard():
+            raise asyncio.CancelledError()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(cancelled())
+    call(breaker)
+
+    assert breaker.state == CLOSED
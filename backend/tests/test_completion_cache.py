@@ -0,0 +1,68 @@
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from app.services.completion_cache import CachedCompletion, CompletionCache, token_cost
+
+MESSAGES = [{"role": "user", "content": "What is the capital of France?"}]
+
+def test_fingerprint_covers_request_parameters():
+    key = CompletionCache.fingerprint("openai", "gpt-4", MESSAGES, 0.0, 100)
+
+    assert key == CompletionCache.fingerprint("openai", "gpt-4", list(MESSAGES), 0.0, 100)
+    assert key != CompletionCache.fingerprint("openai", "gpt-4", MESSAGES, 0.0, 200)
+    assert key != CompletionCache.fingerprint("openai", "gpt-4", MESSAGES, 0.0, 100, top_p=0.5)
+    assert key != CompletionCache.fingerprint("anthropic", "gpt-4", MESSAGES, 0.0, 100)
+
+def test_memory_hit_counts_saved_tokens():
+    cache = CompletionCache(backend="memory", max_temperature=0.0, enabled=True)
+    key = cache.fingerprint("openai", "gpt-4", MESSAGES, 0.0, None)
+    completion = CachedCompletion("Paris", 20, 5, token_cost("gpt-4", 20, 5))
+
+    assert asyncio.run(cache.get(key, 0.0)) is None
+    asyncio.run(cache.set(key, 0.0, completion))
+
+    assert asyncio.run(cache.get(key, 0.0)) == completion
+    assert asyncio.run(cache.get(key, 0.0, bypass=True)) is None
+    stats = cache.stats()
+    assert stats["memory_hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["bypassed"] == 1
+    assert stats["saved_completion_tokens"] == 5
+    assert stats["saved_cost"] == round(20 * 0.01 / 1000 + 5 * 0.03 / 1000, 6)
+
+def test_sampled_requests_are_not_cached():
+    cache = CompletionCache(backend="memory", max_temperature=0.0, enabled=True)
+    key = cache.fingerprint("openai", "gpt-4", MESSAGES, 0.7, None)
+
+    asyncio.run(cache.set(key, 0.7, CachedCompletion("Paris")))
+
+    assert asyncio.run(cache.get(key, 0.7)) is None
+    assert cache.stats()["uncacheable"] == 1
+
+def test_filesystem_tier_is_shared(tmp_path: Path):
+    first = CompletionCache(backend="filesystem", directory=str(tmp_path), max_temperature=0.0, enabled=True)
+    key = first.fingerprint("openai", "gpt-4", MESSAGES, 0.0, None)
+    asyncio.run(first.set(key, 0.0, CachedCompletion("Paris", 20, 5)))
+
+    second = CompletionCache(backend="filesystem", directory=str(tmp_path), max_temperature=0.0, enabled=True)
+
+    assert asyncio.run(second.get(key, 0.0)).text == "Paris"
+    stats = second.stats()
+    assert stats["persistent_hits"] == 1
+    assert stats["shared"]["hits"] == 1
+    assert stats["shared"]["saved_prompt_tokens"] == 20
+
+def test_persistent_backends_require_a_location():
+    with pytest.raises(ValueError):
+        CompletionCache(backend="filesystem").store
+
+def test_models_package_does_not_load_the_app_settings():
+    env = {**os.environ, "PYTHONPATH": str(Path(__file__).parents[1])}
+    script = "import sys, models.llm_client, models.hedging; print('app.core.config' in sys.modules)"
+    imported = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True)
+
+    assert imported.returncode == 0, imported.stderr
+    assert imported.stdout.strip() == "False"
@@ -0,0 +1,38 @@
+from pathlib import Path
+import numpy as np
+from app.evaluators.embedding_cache import EmbeddingCache
+
+def test_memory_cache_roundtrip_in_float16():
+    cache = EmbeddingCache(cache_type="memory", size_limit=1024)
+    embedding = np.array([0.1, -0.25, 0.5], dtype=np.float32)
+
+    assert cache.get("mini", "Paris") is None
+    cache.set("mini", "Paris", embedding)
+    cached = cache.get("mini", "Paris")
+
+    np.testing.assert_allclose(cached, embedding, atol=1e-3)
+    assert cached.dtype == np.float32
+    assert cache.get("other-model", "Paris") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["size_bytes"] == embedding.size * 2
+
+def test_memory_cache_evicts_when_full():
+    cache = EmbeddingCache(cache_type="memory", size_limit=16)
+    embedding = np.zeros(4, dtype=np.float32)
+
+    cache.set_many("mini", ["a", "b", "c"], [embedding] * 3)
+
+    assert cache.get_many("mini", ["a", "b", "c"])[0] is None
+    assert cache.stats()["items"] == 2
+
+def test_filesystem_cache_persists(tmp_path: Path):
+    embedding = np.array([1.0, 0.0], dtype=np.float32)
+    cache = EmbeddingCache(cache_type="filesystem", directory=str(tmp_path))
+    cache.set("mini", "Paris", embedding)
+
+    reopened = EmbeddingCache(cache_type="filesystem", directory=str(tmp_path))
+
+    np.testing.assert_allclose(reopened.get("mini", "Paris"), embedding)
+    assert reopened.stats()["hits"] == 1
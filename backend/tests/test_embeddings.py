@@ -0,0 +1,94 @@
+from typing import List
+import numpy as np
+from app.evaluators.embeddings import EmbeddingModelRegistry, check_parity, encode_bucketed
+
+class FakeModel:
+    def __init__(self, name: str, backend: str):
+        self.name = name
+        self.backend = backend
+
+def make_registry(loads: List[str]) -> EmbeddingModelRegistry:
+    def loader(name: str, backend: str) -> FakeModel:
+        loads.append(f"{name}/{backend}")
+        return FakeModel(name, backend)
+    return EmbeddingModelRegistry(loader=loader)
+
+def test_registry_loads_model_once():
+    loads: List[str] = []
+    registry = make_registry(loads)
+
+    first = registry.get("mini")
+    second = registry.get("mini")
+
+    assert first is second
+    assert loads == ["mini/torch"]
+
+def test_registry_warm_up_reports_stats():
+    loads: List[str] = []
+    registry = make_registry(loads)
+
+    info = registry.warm_up(["mini", "large"])
+
+    assert [i.name for i in info] == ["mini", "large"]
+    assert registry.is_loaded("large")
+    stats = registry.stats()
+    assert stats["mini"]["load_time_s"] >= 0
+    assert stats["mini"]["memory_bytes"] is None
+
+def test_registry_clear_forces_reload():
+    loads: List[str] = []
+    registry = make_registry(loads)
+
+    registry.get("mini")
+    registry.clear()
+    registry.get("mini")
+
+    assert loads == ["mini/torch", "mini/torch"]
+
+def test_registry_loads_backend_from_key():
+    loads: List[str] = []
+    registry = make_registry(loads)
+
+    model = registry.get("mini@onnx")
+
+    assert model.backend == "onnx"
+    assert registry.stats()["mini@onnx"]["backend"] == "onnx"
+    assert loads == ["mini/onnx"]
+
+class RecordingModel:
+    def __init__(self):
+        self.batches: List[List[str]] = []
+
+    def encode(self, texts, normalize_embeddings: bool = False, **kwargs):
+        self.batches.append(list(texts))
+        vectors = np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_encode_bucketed_groups_by_length_and_keeps_order():
+    model = RecordingModel()
+    texts = ["aaaa", "a", "aaa", "a", "aa"]
+
+    embeddings = encode_bucketed(model, texts, batch_size=2)
+
+    assert model.batches == [["a", "aa"], ["aaa", "aaaa"]]
+    expected = np.array([[len(t), 1.0] for t in texts])
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    np.testing.assert_allclose(embeddings, expected, rtol=1e-6)
+
+class NoisyModel(RecordingModel):
+    def __init__(self, noise: float):
+        super().__init__()
+        self.noise = noise
+
+    def encode(self, texts, normalize_embeddings: bool = False, **kwargs):
+        vectors = np.array([[len(t), 1.0 + self.noise] for t in texts], dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_check_parity_against_reference():
+    pairs = [("a", "aaaa"), ("aa", "aaa"), ("aaaaaa", "a")]
+
+    assert check_parity(RecordingModel(), NoisyModel(0.01), pairs, tolerance=0.02).passed
+    report = check_parity(RecordingModel(), NoisyModel(2.0), pairs, tolerance=0.02)
+    assert not report.passed
+    assert report.pairs == 3
+    assert report.max_abs_diff >= report.mean_abs_diff
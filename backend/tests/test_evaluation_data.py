@@ -0,0 +1,89 @@
+from typing import List
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.core.database import Base
+from app.evaluators import data
+from app.evaluators.data import EvaluationDataLoader
+from app.models.models import Evaluation, EvaluationType, Model, ModelProvider, Prompt
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def statements(engine) -> List[str]:
+    statements: List[str] = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+@pytest.fixture
+def db(engine) -> Session:
+    db = sessionmaker(bind=engine)()
+    yield db
+    db.close()
+
+def add_evaluations(db: Session, count: int) -> List[str]:
+    model = Model(name="gpt-4", provider=ModelProvider.OPENAI, parameters={})
+    prompt = Prompt(content="Capital of France?", type=EvaluationType.FACTUAL_QA, metadata_={"expected_answer": "Paris"})
+    evaluations = [Evaluation(model=model, prompt=prompt) for _ in range(count)]
+    db.add_all(evaluations)
+    db.commit()
+    return [evaluation.id for evaluation in evaluations]
+
+def tables(statements: List[str]) -> List[str]:
+    return [statement.split("FROM ")[1].split()[0] for statement in statements if statement.startswith("SELECT")]
+
+def test_load_batches_queries_and_joins_rows(db: Session, statements: List[str]):
+    ids = add_evaluations(db, 3)
+    statements.clear()
+
+    rows = EvaluationDataLoader(ttl=60, max_size=10).load(db, ids + [ids[0], "missing"])
+
+    assert set(rows) == set(ids)
+    evaluation, model, prompt = rows[ids[1]]
+    assert (evaluation.id, model.name, prompt.metadata_) == (ids[1], "gpt-4", {"expected_answer": "Paris"})
+    assert tables(statements) == ["evaluations", "models", "prompts", "prompt_embeddings"]
+
+def test_in_clauses_are_chunked(db: Session, statements: List[str], monkeypatch):
+    ids = add_evaluations(db, 5)
+    statements.clear()
+    chunks = data._chunks
+    monkeypatch.setattr(data, "_chunks", lambda ids: chunks(ids, size=2))
+
+    rows = EvaluationDataLoader(ttl=60, max_size=10).load(db, ids)
+
+    assert len(rows) == 5
+    assert tables(statements).count("evaluations") == 3
+
+def test_models_and_prompts_are_served_from_the_cache(db: Session, statements: List[str]):
+    ids = add_evaluations(db, 2)
+    loader = EvaluationDataLoader(ttl=60, max_size=10)
+    loader.load(db, ids[:1])
+    statements.clear()
+
+    rows = loader.load(db, ids[1:])
+    db.commit()
+
+    assert tables(statements) == ["evaluations"]
+    assert loader.stats()["hits"] == 2
+    # Cached rows are detached, so the commit didn't expire them
+    assert rows[ids[1]].model.name == "gpt-4"
+
+def test_invalidated_rows_are_loaded_again(db: Session, statements: List[str]):
+    ids = add_evaluations(db, 1)
+    loader = EvaluationDataLoader(ttl=60, max_size=10)
+    prompt_id = loader.load(db, ids)[ids[0]].prompt.id
+    db.query(Prompt).filter(Prompt.id == prompt_id).update({"content": "Capital of Italy?"})
+    db.commit()
+    statements.clear()
+
+    loader.invalidate(prompt_ids=[prompt_id])
+    rows = loader.load(db, ids)
+
+    assert tables(statements) == ["evaluations", "prompts", "prompt_embeddings"]
+    assert rows[ids[0]].prompt.content == "Capital of Italy?"
@@ -0,0 +1,367 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from app.core.database import Base
+from app.core.event_loop import WorkerEventLoop
+from app.core.exceptions import TransientProviderError
+from app.evaluators import tasks
+from app.evaluators.data import EvaluationDataLoader
+from app.evaluators.writer import EvaluationResultWriter
+from app.models.models import Evaluation, EvaluationType, Model, ModelProvider, Prompt
+from app.services import rate_limiter
+from app.services.rate_limiter import RateLimiter
+
+class RecordingWriter:
+    def __init__(self):
+        self.values: Dict[str, Dict[str, Any]] = {}
+        self.flushes = 0
+
+    def add(self, evaluation_id: str, **values: Any) -> None:
+        self.values.setdefault(evaluation_id, {}).update(values)
+
+    def ensure_written(self, evaluation_ids: List[str]) -> List[str]:
+        self.flushes += 1
+        return []
+
+class StubEvaluator:
+    """
+    Answers after a short sleep under the rate limiter, like the provider
+    services, and records how many calls overlap per provider.
+    """
+    in_flight: Dict[str, int] = {}
+    peak: Dict[str, int] = {}
+    failures: Dict[str, Exception] = {}
+    # Connections checked out of the pool while each completion was running
+    checked_out: List[int] = []
+    pool: Any = None
+    # Size of each evaluate_batch call
+    batches: List[int] = []
+
+    def __init__(self, model: Model):
+        self.model = model
+
+    async def get_completion(self, prompt: Prompt) -> str:
+        provider = self.model.provider
+        async with rate_limiter.rate_limiter.limit(provider.value, self.model.name, 0):
+            StubEvaluator.in_flight[provider] = StubEvaluator.in_flight.get(provider, 0) + 1
+            StubEvaluator.peak[provider] = max(StubEvaluator.peak.get(provider, 0), StubEvaluator.in_flight[provider])
+            StubEvaluator.checked_out.append(StubEvaluator.pool.checkedout())
+            try:
+                await asyncio.sleep(0.01)
+                if prompt.content in StubEvaluator.failures:
+                    raise StubEvaluator.failures[prompt.content]
+                return f"answer to {prompt.content}"
+            finally:
+                StubEvaluator.in_flight[provider] -= 1
+
+    async def evaluate_batch(self, prompts: List[Prompt], completions: List[str]) -> List[Dict[str, float]]:
+        StubEvaluator.batches.append(len(prompts))
+        return [{"score": 1.0} for _ in prompts]
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path}/evaluations.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    StubEvaluator.pool = engine.pool
+    monkeypatch.setattr(tasks, "SessionLocal", factory)
+    # Tasks run directly don't close their session after returning
+    monkeypatch.setattr(tasks.SQLAlchemyTask, "_local", threading.local())
+    yield factory
+    engine.dispose()
+
+@pytest.fixture
+def worker_loop(monkeypatch) -> WorkerEventLoop:
+    loop = WorkerEventLoop()
+    monkeypatch.setattr(tasks, "worker_loop", loop)
+    yield loop
+    loop.stop()
+
+@pytest.fixture
+def writer(monkeypatch) -> RecordingWriter:
+    writer = RecordingWriter()
+    StubEvaluator.in_flight, StubEvaluator.peak, StubEvaluator.failures = {}, {}, {}
+    StubEvaluator.checked_out, StubEvaluator.batches = [], []
+    monkeypatch.setattr(tasks, "result_writer", writer)
+    monkeypatch.setattr(tasks, "data_loader", EvaluationDataLoader(ttl=60, max_size=100))
+    monkeypatch.setattr(tasks, "get_evaluator", lambda evaluation_type, model: StubEvaluator(model))
+    monkeypatch.setattr(rate_limiter, "rate_limiter", RateLimiter(limits={}, backend="memory"))
+    return writer
+
+def add_evaluations(db: Session, provider: ModelProvider, contents: List[str]) -> List[str]:
+    model = Model(name=f"{provider.value}-model", provider=provider, parameters={})
+    db.add(model)
+    evaluations = []
+    for content in contents:
+        prompt = Prompt(content=content, type=EvaluationType.REASONING, metadata_={})
+        evaluation = Evaluation(model=model, prompt=prompt)
+        db.add_all([prompt, evaluation])
+        evaluations.append(evaluation)
+    db.commit()
+    return [evaluation.id for evaluation in evaluations]
+
+def test_batch_runs_concurrently_up_to_each_providers_limit(session_factory, writer, monkeypatch):
+    monkeypatch.setattr(tasks.settings, "PROVIDER_CONCURRENCY", {"openai": 3, "anthropic": 1})
+    monkeypatch.setattr(tasks.settings, "ADAPTIVE_CONCURRENCY_MAX", 3)
+    db = session_factory()
+    openai_ids = add_evaluations(db, ModelProvider.OPENAI, [f"o{i}" for i in range(10)])
+    anthropic_ids = add_evaluations(db, ModelProvider.ANTHROPIC, [f"a{i}" for i in range(3)])
+    ids = openai_ids + anthropic_ids
+    progress: List[Dict[str, int]] = []
+
+    result = asyncio.run(tasks._execute_batch(ids, tasks._load_rows(db, ids), progress.append))
+
+    assert result["total"] == 13
+    assert result["failed"] == 0
+    assert {r["status"] for r in result["results"]} == {"success"}
+    assert StubEvaluator.peak[ModelProvider.OPENAI] == 3
+    assert progress[-1] == {"total": 13, "completed": 13, "failed": 0, "retried": 0}
+    assert set(writer.values) == set(openai_ids + anthropic_ids)
+    assert writer.values[openai_ids[0]]["completion"] == "answer to o0"
+
+def test_concurrency_ramps_up_past_the_initial_limit_after_successes(session_factory, writer, monkeypatch):
+    monkeypatch.setattr(tasks.settings, "PROVIDER_CONCURRENCY", {"openai": 2})
+    monkeypatch.setattr(tasks.settings, "ADAPTIVE_CONCURRENCY_MAX", 64)
+    db = session_factory()
+    ids = add_evaluations(db, ModelProvider.OPENAI, [f"o{i}" for i in range(60)])
+
+    result = asyncio.run(tasks._execute_batch(ids, tasks._load_rows(db, ids)))
+
+    assert result["failed"] == 0
+    assert StubEvaluator.peak[ModelProvider.OPENAI] > 2
+
+def test_batch_scores_each_models_completions_in_one_call(session_factory, writer):
+    db = session_factory()
+    openai_ids = add_evaluations(db, ModelProvider.OPENAI, [f"o{i}" for i in range(6)])
+    anthropic_ids = add_evaluations(db, ModelProvider.ANTHROPIC, [f"a{i}" for i in range(3)])
+    ids = openai_ids + anthropic_ids
+
+    result = asyncio.run(tasks._execute_batch(ids, tasks._load_rows(db, ids)))
+
+    assert result["failed"] == 0
+    assert sorted(StubEvaluator.batches) == [3, 6]
+    assert writer.values[anthropic_ids[2]]["scores"] == {"score": 1.0}
+
+def test_evaluators_are_created_off_the_event_loop_thread(session_factory, writer, monkeypatch):
+    threads: List[threading.Thread] = []
+
+    def get_evaluator(evaluation_type, model):
+        threads.append(threading.current_thread())
+        return StubEvaluator(model)
+
+    monkeypatch.setattr(tasks, "get_evaluator", get_evaluator)
+    db = session_factory()
+    ids = add_evaluations(db, ModelProvider.OPENAI, ["one", "two"])
+    rows = tasks._load_rows(db, ids)
+
+    async def run() -> threading.Thread:
+        await tasks._execute_batch(ids, rows)
+        await tasks._execute_evaluation(ids[0], rows[ids[0]], writer)
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(run())
+
+    assert len(threads) == 3
+    assert loop_thread not in threads
+
+def test_progress_is_reported_in_order_off_the_event_loop_thread():
+    reported: List[int] = []
+    threads: List[threading.Thread] = []
+
+    def report(progress: Dict[str, int]) -> None:
+        threads.append(threading.current_thread())
+        time.sleep(0.02)
+        reported.append(progress["completed"])
+
+    async def run() -> threading.Thread:
+        progress = tasks.ProgressReporter(report)
+        for completed in range(1, 11):
+            progress.update({"completed": completed})
+            await asyncio.sleep(0.005)
+        await progress.close()
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(run())
+
+    # Updates made during a slow call are coalesced, and the last always arrives
+    assert reported == sorted(reported)
+    assert reported[-1] == 10
+    assert len(reported) < 10
+    assert loop_thread not in threads
+
+def test_async_workers_stop_the_loop_and_flush_on_worker_shutdown():
+    env = {**os.environ, "CELERY_WORKER_MODE": "async", "PYTHONPATH": str(Path(__file__).parents[1])}
+    script = (
+        "from celery.signals import worker_shutdown\n"
+        "from app.evaluators import tasks\n"
+        "closed = []\n"
+        "tasks.result_writer.close = lambda: closed.append(True)\n"
+        "async def ping(): return 1\n"
+        "tasks.worker_loop.run(ping())\n"
+        "worker_shutdown.send(sender=None)\n"
+        "print(tasks.worker_loop.stats()['running'], closed)\n"
+    )
+    shutdown = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True)
+
+    assert shutdown.returncode == 0, shutdown.stderr
+    assert shutdown.stdout.strip().splitlines()[-1] == "False [True]"
+
+def test_batch_counts_failures_retries_and_missing_evaluations(session_factory, writer, monkeypatch):
+    StubEvaluator.failures = {"bad": ValueError("broken"), "busy": TransientProviderError("rate limited")}
+    db = session_factory()
+    ok_id, bad_id, busy_id = add_evaluations(db, ModelProvider.OPENAI, ["ok", "bad", "busy"])
+
+    ids = [ok_id, bad_id, busy_id, "missing"]
+
+    result = asyncio.run(tasks._execute_batch(ids, tasks._load_rows(db, ids)))
+
+    statuses = {r["evaluation_id"]: r["status"] for r in result["results"]}
+    assert statuses == {ok_id: "success", bad_id: "error", busy_id: "retry", "missing": "error"}
+    assert (result["failed"], result["retried"]) == (2, 1)
+    created_at = db.get(Evaluation, bad_id).created_at
+    assert writer.values[bad_id] == {"created_at": created_at, "error": "broken", "next_retry_at": None}
+    assert writer.values[busy_id]["retry_count"] == 1
+    assert "missing" not in writer.values
+
+@pytest.mark.parametrize("acks_late", [True, False])
+def test_tasks_release_their_connection_before_waiting_on_providers(session_factory, writer, worker_loop, monkeypatch, acks_late: bool):
+    monkeypatch.setattr(tasks.celery_app.conf, "task_acks_late", acks_late)
+    monkeypatch.setattr(tasks, "_requeue", lambda results: None)
+    monkeypatch.setattr(tasks.run_batch_evaluation, "update_state", lambda **kwargs: None)
+    db = session_factory()
+    single_id, *batch_ids = add_evaluations(db, ModelProvider.OPENAI, ["one", "two", "three"])
+    db.close()
+
+    assert tasks.run_evaluation.run(single_id)["status"] == "success"
+    assert tasks.run_batch_evaluation.run(batch_ids)["failed"] == 0
+    assert StubEvaluator.checked_out == [0, 0, 0]
+    # Late-acknowledged tasks write their results before returning; early
+    # acknowledged ones leave them to the writer's thresholds
+    assert writer.flushes == (2 if acks_late else 0)
+
+def test_results_not_written_are_retried_instead_of_acknowledged(session_factory, writer, worker_loop, tmp_path, monkeypatch):
+    unavailable = create_engine(f"sqlite:///{tmp_path}/missing/evaluations.db")
+    result_writer = EvaluationResultWriter(session_factory=sessionmaker(bind=unavailable), batch_size=1000, flush_interval=3600)
+    retries: List[Dict[str, Any]] = []
+
+    def retry(**options) -> Exception:
+        retries.append(options)
+        return RuntimeError("retry")
+
+    monkeypatch.setattr(tasks, "result_writer", result_writer)
+    monkeypatch.setattr(tasks.celery_app.conf, "task_acks_late", True)
+    monkeypatch.setattr(tasks, "_requeue", lambda results: None)
+    monkeypatch.setattr(tasks.run_batch_evaluation, "update_state", lambda **kwargs: None)
+    for task in (tasks.run_evaluation, tasks.run_batch_evaluation):
+        monkeypatch.setattr(task, "retry", retry)
+    db = session_factory()
+    single_id, *batch_ids = add_evaluations(db, ModelProvider.OPENAI, ["one", "two", "three"])
+    db.close()
+
+    try:
+        with pytest.raises(RuntimeError, match="retry"):
+            tasks.run_evaluation.run(single_id)
+        with pytest.raises(RuntimeError, match="retry"):
+            tasks.run_batch_evaluation.run(batch_ids)
+    finally:
+        result_writer._stopped.set()
+        result_writer._wakeup.set()
+        unavailable.dispose()
+
+    assert "args" not in retries[0]
+    assert sorted(retries[1]["args"][0]) == sorted(batch_ids)
+    # The results stay buffered for the next flush
+    assert result_writer.stats()["buffered"] == 3
+
+def test_failed_load_is_reported_as_an_error(session_factory, writer, worker_loop, monkeypatch):
+    def fail(db, evaluation_ids):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(tasks.data_loader, "load", fail)
+
+    result = tasks.run_evaluation.run("e1")
+    batch = tasks.run_batch_evaluation.run(["e2", "e3"])
+
+    assert result == {"status": "error", "evaluation_id": "e1", "error": "Failed to load evaluation: database unavailable"}
+    assert (batch["status"], batch["failed"]) == ("error", 2)
+    assert set(writer.values) == {"e1", "e2", "e3"}
+
+def test_retry_delay_backs_off_with_jitter_up_to_the_maximum(monkeypatch):
+    monkeypatch.setattr(tasks.settings, "EVALUATION_RETRY_BASE_SECONDS", 5.0)
+    monkeypatch.setattr(tasks.settings, "EVALUATION_RETRY_MAX_SECONDS", 300.0)
+
+    for retry_count, (low, high) in [(0, (2.5, 5.0)), (2, (10.0, 20.0)), (10, (150.0, 300.0))]:
+        delays = [tasks.retry_delay(retry_count) for _ in range(200)]
+        assert low <= min(delays) and max(delays) <= high
+        assert len(set(delays)) > 1
+
+def test_transient_failures_are_retried_until_max_retries(session_factory, writer, monkeypatch):
+    monkeypatch.setattr(tasks.settings, "EVALUATION_MAX_RETRIES", 2)
+    monkeypatch.setattr(tasks, "retry_delay", lambda retry_count: 10.0 * (retry_count + 1))
+    StubEvaluator.failures = {"busy": TransientProviderError("rate limited")}
+    db = session_factory()
+    busy_id, = add_evaluations(db, ModelProvider.OPENAI, ["busy"])
+    rows = tasks._load_rows(db, [busy_id])[busy_id]
+
+    def execute(retry_count: int) -> Dict[str, Any]:
+        return asyncio.run(tasks._execute_evaluation(busy_id, rows, writer, retry_count))
+
+    first = execute(0)
+    assert (first["status"], first["retry_count"], first["countdown"]) == ("retry", 1, 10.0)
+    assert writer.values[busy_id]["retry_count"] == 1
+    assert writer.values[busy_id]["next_retry_at"] is not None
+    assert execute(1)["countdown"] == 20.0
+
+    # The row's count is used when the message carries an older one
+    rows.evaluation.retry_count = 2
+    last = execute(0)
+    assert last == {"status": "error", "evaluation_id": busy_id, "error": "rate limited"}
+    assert writer.values[busy_id]["next_retry_at"] is None
+
+def test_requeue_sends_retries_over_one_connection(writer, monkeypatch):
+    connections: List[object] = []
+    sent: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def producer_or_acquire():
+        connections.append(object())
+        yield connections[-1]
+
+    def apply_async(args, kwargs, countdown, producer):
+        if args == ["e3"]:
+            raise ConnectionError("broker unavailable")
+        sent.append({"args": args, "kwargs": kwargs, "countdown": countdown, "producer": producer})
+
+    monkeypatch.setattr(tasks.celery_app, "producer_or_acquire", producer_or_acquire)
+    monkeypatch.setattr(tasks.run_evaluation, "apply_async", apply_async)
+    results = [
+        {"status": "retry", "evaluation_id": "e1", "error": "rate limited", "retry_count": 1, "countdown": 5.0},
+        {"status": "success", "evaluation_id": "e2", "metrics": {}},
+        {"status": "retry", "evaluation_id": "e3", "error": "rate limited", "retry_count": 2, "countdown": 9.0},
+    ]
+
+    tasks._requeue(results)
+
+    assert sent == [{"args": ["e1"], "kwargs": {"retry_count": 1}, "countdown": 5.0, "producer": connections[0]}]
+    assert len(connections) == 1
+    # A retry that could not be queued is failed rather than left pending
+    assert results[2]["status"] == "error"
+    assert writer.values["e3"] == {"error": "Failed to requeue evaluation: broker unavailable", "next_retry_at": None}
+    assert "e1" not in writer.values
+
+def test_requeue_without_retries_does_not_connect(monkeypatch):
+    def producer_or_acquire():
+        raise AssertionError("no broker connection expected")
+
+    monkeypatch.setattr(tasks.celery_app, "producer_or_acquire", producer_or_acquire)
+
+    tasks._requeue([{"status": "success", "evaluation_id": "e1", "metrics": {}}])
@@ -0,0 +1,356 @@
+import asyncio
+import csv
+import io
+import json
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence
+import pytest
+from fastapi import BackgroundTasks, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from app.core.config import settings
+from app.core.database import Base, get_async_db
+from app.core.pagination import decode_cursor, encode_cursor
+from app.api.v1.endpoints import evaluations
+from app.models.models import Evaluation, EvaluationScore, EvaluationType, Model, ModelProvider, Prompt
+from app.schemas.evaluation import EvaluationBatchCreate, EvaluationCreate, EvaluationFilter
+
+def run(coro):
+    return asyncio.run(coro)
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch) -> async_sessionmaker:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/evaluations.db", poolclass=NullPool)
+
+    async def create_all() -> None:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    run(create_all())
+    factory = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+    monkeypatch.setattr(evaluations, "AsyncSessionLocal", factory)
+    return factory
+
+class Broker:
+    """Records published messages; send_task raises the queued failures first."""
+
+    def __init__(self):
+        self.sent: List[Dict[str, Any]] = []
+        self.failures: List[Exception] = []
+
+    def send_task(self, name: str, args: List[Any], producer: Any = None) -> SimpleNamespace:
+        if self.failures:
+            raise self.failures.pop(0)
+        self.sent.append({"name": name, "args": args})
+        return SimpleNamespace(id=f"task-{len(self.sent)}")
+
+@pytest.fixture
+def broker(monkeypatch) -> Broker:
+    broker = Broker()
+    monkeypatch.setattr(evaluations.celery_app, "send_task", broker.send_task)
+    monkeypatch.setattr(evaluations.celery_app, "producer_or_acquire", lambda: nullcontext())
+    return broker
+
+def seed(session_factory: async_sessionmaker) -> Dict[str, str]:
+    async def add() -> Dict[str, str]:
+        async with session_factory() as db:
+            model = Model(name="gpt-4", provider=ModelProvider.OPENAI, parameters={})
+            prompt = Prompt(content="Capital of France?", type=EvaluationType.FACTUAL_QA, metadata_={"expected_answer": "Paris"})
+            unsupported = Prompt(content="2 + 2?", type=EvaluationType.MATH, metadata_={})
+            db.add_all([model, prompt, unsupported])
+            await db.commit()
+            return {"model": model.id, "prompt": prompt.id, "unsupported": unsupported.id}
+
+    return run(add())
+
+def stored(session_factory: async_sessionmaker) -> Dict[str, Evaluation]:
+    async def load() -> Dict[str, Evaluation]:
+        async with session_factory() as db:
+            return {evaluation.id: evaluation for evaluation in (await db.execute(select(Evaluation))).scalars()}
+
+    return run(load())
+
+def call(session_factory: async_sessionmaker, endpoint, *args: Any, **kwargs: Any) -> Any:
+    async def call_with_session() -> Any:
+        async with session_factory() as db:
+            return await endpoint(*args, db=db, **kwargs)
+
+    return run(call_with_session())
+
+def test_create_evaluation_queues_it(session_factory, broker):
+    ids = seed(session_factory)
+
+    response = call(
+        session_factory, evaluations.create_evaluation,
+        EvaluationCreate(model_id=ids["model"], prompt_id=ids["prompt"], metadata={"run": 1}), BackgroundTasks()
+    )
+
+    assert response["status"] == "pending"
+    assert broker.sent == [{"name": "app.evaluators.tasks.run_evaluation", "args": [response["id"]]}]
+    evaluation = stored(session_factory)[response["id"]]
+    assert (evaluation.metadata_, evaluation.completion, evaluation.error) == ({"run": 1}, None, None)
+
+@pytest.fixture
+def client(session_factory) -> TestClient:
+    app = FastAPI()
+    app.include_router(evaluations.router, prefix="/evaluations")
+
+    async def get_db():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = get_db
+    with TestClient(app) as client:
+        yield client
+
+def test_create_evaluation_response_is_a_submission(session_factory, broker, client):
+    ids = seed(session_factory)
+
+    response = client.post("/evaluations/", json={"model_id": ids["model"], "prompt_id": ids["prompt"]})
+
+    assert response.status_code == 200
+    [evaluation_id] = stored(session_factory)
+    assert response.json() == {
+        "id": evaluation_id,
+        "model_id": ids["model"],
+        "prompt_id": ids["prompt"],
+        "status": "pending",
+        "task_id": "task-1",
+        "error": None
+    }
+
+def test_evaluation_that_cannot_be_queued_is_marked_failed(session_factory, broker):
+    ids = seed(session_factory)
+    broker.failures = [ConnectionError("broker down")]
+
+    with pytest.raises(HTTPException):
+        call(
+            session_factory, evaluations.create_evaluation,
+            EvaluationCreate(model_id=ids["model"], prompt_id=ids["prompt"]), BackgroundTasks()
+        )
+
+    [evaluation] = stored(session_factory).values()
+    assert evaluation.error == "Failed to queue evaluation: broker down"
+
+def test_batch_creates_valid_items_and_queues_them_in_chunks(session_factory, broker, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_SUBMIT_CHUNK_SIZE", 2)
+    ids = seed(session_factory)
+    items = [EvaluationCreate(model_id=ids["model"], prompt_id=ids["prompt"]) for _ in range(3)] + [
+        EvaluationCreate(model_id="missing", prompt_id=ids["prompt"]),
+        EvaluationCreate(model_id=ids["model"], prompt_id=ids["unsupported"]),
+    ]
+
+    responses = call(session_factory, evaluations.create_batch_evaluation, EvaluationBatchCreate(evaluations=items), BackgroundTasks())
+
+    assert [response["status"] for response in responses] == ["pending"] * 3 + ["error"] * 2
+    created = [response["id"] for response in responses[:3]]
+    assert [message["args"] for message in broker.sent] == [[created[:2]], [created[2:]]]
+    assert [response["task_id"] for response in responses[:3]] == ["task-1", "task-1", "task-2"]
+    rows = stored(session_factory)
+    assert set(rows) == set(created)
+    # Completions are NULL until a result is written
+    assert {(row.completion, row.error) for row in rows.values()} == {(None, None)}
+
+def test_batch_chunks_that_cannot_be_queued_are_marked_failed(session_factory, broker, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_SUBMIT_CHUNK_SIZE", 2)
+    ids = seed(session_factory)
+    items = [EvaluationCreate(model_id=ids["model"], prompt_id=ids["prompt"]) for _ in range(3)]
+    broker.failures = [ConnectionError("broker down")]
+
+    responses = call(session_factory, evaluations.create_batch_evaluation, EvaluationBatchCreate(evaluations=items), BackgroundTasks())
+
+    assert [response["status"] for response in responses] == ["error", "error", "pending"]
+    rows = stored(session_factory)
+    assert [rows[response["id"]].error for response in responses] == [
+        "Failed to queue evaluation: broker down", "Failed to queue evaluation: broker down", None
+    ]
+
+def add_evaluation(session_factory: async_sessionmaker, ids: Dict[str, str], **values: Any) -> str:
+    async def add() -> str:
+        async with session_factory() as db:
+            evaluation = Evaluation(model_id=ids["model"], prompt_id=ids["prompt"], **values)
+            db.add(evaluation)
+            await db.commit()
+            return evaluation.id
+
+    return run(add())
+
+def test_get_evaluation_reads_blob_stored_completions(session_factory, monkeypatch):
+    ids = seed(session_factory)
+    inline_id = add_evaluation(session_factory, ids, completion="Paris", scores={"accuracy": 1.0})
+    blob_id = add_evaluation(session_factory, ids, completion_hash="abc", completion_size=5)
+    monkeypatch.setattr(evaluations, "load_completions", lambda hashes: {"abc": "Paris" * 1000})
+
+    inline = call(session_factory, evaluations.get_evaluation, inline_id)
+    blob = call(session_factory, evaluations.get_evaluation, blob_id)
+
+    assert (inline.completion, inline.scores) == ("Paris", {"accuracy": 1.0})
+    assert blob.completion == "Paris" * 1000
+    with pytest.raises(HTTPException) as error:
+        call(session_factory, evaluations.get_evaluation, "missing")
+    assert error.value.status_code == 404
+
+def test_delete_evaluation_removes_its_scores(session_factory):
+    ids = seed(session_factory)
+    kept_id = add_evaluation(session_factory, ids)
+    deleted_id = add_evaluation(session_factory, ids)
+
+    async def add_scores() -> None:
+        async with session_factory() as db:
+            db.add_all([
+                EvaluationScore(evaluation_id=evaluation_id, metric="accuracy", value=1.0, model_id=ids["model"])
+                for evaluation_id in (kept_id, deleted_id)
+            ])
+            await db.commit()
+
+    async def remaining_scores() -> List[str]:
+        async with session_factory() as db:
+            return list((await db.execute(select(EvaluationScore.evaluation_id))).scalars())
+
+    run(add_scores())
+
+    assert call(session_factory, evaluations.delete_evaluation, deleted_id)["status"] == "success"
+    assert set(stored(session_factory)) == {kept_id}
+    assert run(remaining_scores()) == [kept_id]
+    with pytest.raises(HTTPException) as error:
+        call(session_factory, evaluations.delete_evaluation, deleted_id)
+    assert error.value.status_code == 404
+
+def test_lookups_match_created_at_when_given(session_factory):
+    ids = seed(session_factory)
+    created_at = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    evaluation_id = add_evaluation(session_factory, ids, created_at=created_at, completion="Paris")
+
+    found = call(session_factory, evaluations.get_evaluation, evaluation_id, created_at=created_at)
+
+    assert found.completion == "Paris"
+    for endpoint in (evaluations.get_evaluation, evaluations.delete_evaluation):
+        with pytest.raises(HTTPException) as error:
+            call(session_factory, endpoint, evaluation_id, created_at=created_at + timedelta(days=1))
+        assert error.value.status_code == 404
+    assert set(stored(session_factory)) == {evaluation_id}
+    assert call(session_factory, evaluations.delete_evaluation, evaluation_id, created_at=created_at)["status"] == "success"
+    assert stored(session_factory) == {}
+
+def list_page(session_factory: async_sessionmaker, cursor: Optional[str] = None, limit: int = 2, include: Sequence[str] = (), **filters: Any) -> Dict[str, Any]:
+    return call(
+        session_factory, evaluations.list_evaluations,
+        filters=EvaluationFilter(**filters), cursor=cursor, limit=limit, include=list(include)
+    )
+
+def test_list_pages_through_evaluations_newest_first(session_factory):
+    ids = seed(session_factory)
+    start = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    # Two share each timestamp, so pages must break ties on id
+    created = [
+        add_evaluation(session_factory, ids, created_at=start + timedelta(hours=i // 2))
+        for i in range(5)
+    ]
+    expected = sorted(created, key=lambda evaluation_id: (created.index(evaluation_id) // 2, evaluation_id), reverse=True)
+
+    seen, cursor = [], None
+    for _ in range(3):
+        page = list_page(session_factory, cursor)
+        seen.extend(item.id for item in page["items"])
+        cursor = page["next_cursor"]
+
+    assert seen == expected
+    assert cursor is None
+
+def test_cursor_is_combined_with_filters(session_factory):
+    ids = seed(session_factory)
+    other = seed(session_factory)
+    start = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    mine = [add_evaluation(session_factory, ids, created_at=start + timedelta(minutes=i)) for i in range(3)]
+    for i in range(3):
+        add_evaluation(session_factory, other, created_at=start + timedelta(minutes=i, seconds=30))
+
+    first = list_page(session_factory, model_id=ids["model"])
+    second = list_page(session_factory, first["next_cursor"], model_id=ids["model"])
+
+    assert [item.id for item in first["items"] + second["items"]] == mine[::-1]
+    assert second["next_cursor"] is None
+
+def test_malformed_cursor_is_rejected(session_factory):
+    with pytest.raises(HTTPException) as error:
+        list_page(session_factory, "not-a-cursor")
+
+    assert error.value.status_code == 400
+
+def test_cursor_round_trips():
+    created_at = datetime(2026, 10, 1, 12, 30, tzinfo=timezone.utc)
+
+    assert decode_cursor(encode_cursor(created_at, "e1")) == (created_at, "e1")
+
+def test_score_range_applies_to_the_given_metric(session_factory):
+    ids = seed(session_factory)
+    high_id = add_evaluation(session_factory, ids)
+    low_id = add_evaluation(session_factory, ids)
+
+    async def add_scores() -> None:
+        async with session_factory() as db:
+            db.add_all([
+                EvaluationScore(evaluation_id=high_id, metric="accuracy", value=0.9, model_id=ids["model"]),
+                EvaluationScore(evaluation_id=high_id, metric="toxicity", value=0.1, model_id=ids["model"]),
+                EvaluationScore(evaluation_id=low_id, metric="accuracy", value=0.2, model_id=ids["model"]),
+                EvaluationScore(evaluation_id=low_id, metric="toxicity", value=0.8, model_id=ids["model"]),
+            ])
+            await db.commit()
+
+    run(add_scores())
+
+    page = list_page(session_factory, limit=10, metric="accuracy", min_score=0.5)
+    assert [item.id for item in page["items"]] == [high_id]
+    page = list_page(session_factory, limit=10, metric="toxicity", max_score=0.5)
+    assert [item.id for item in page["items"]] == [high_id]
+
+@pytest.mark.parametrize("bounds", [{"min_score": 0.5}, {"max_score": 0.5}])
+def test_score_range_without_metric_is_rejected(session_factory, bounds: Dict[str, float]):
+    with pytest.raises(HTTPException) as error:
+        list_page(session_factory, **bounds)
+
+    assert error.value.status_code == 422
+
+def export(session_factory: async_sessionmaker, export_format: str, include: Sequence[str] = (), **filters: Any) -> List[str]:
+    async def read() -> List[str]:
+        response = await evaluations.export_evaluations(
+            filters=EvaluationFilter(**filters), export_format=export_format, include=list(include)
+        )
+        return [chunk async for chunk in response.body_iterator]
+
+    return run(read())
+
+def test_export_streams_ndjson_in_batches(session_factory, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(evaluations, "load_completions", lambda hashes: {"abc": "Paris" * 1000})
+    ids = seed(session_factory)
+    start = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    created = [
+        add_evaluation(session_factory, ids, completion="Paris", created_at=start + timedelta(minutes=i))
+        for i in range(4)
+    ]
+    blob_id = add_evaluation(session_factory, ids, completion_hash="abc", created_at=start + timedelta(minutes=5))
+
+    chunks = export(session_factory, "ndjson", include=["completion"])
+
+    assert len(chunks) == 3
+    items = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    assert [item["id"] for item in items] == created + [blob_id]
+    assert [item["completion"] for item in items] == ["Paris"] * 4 + ["Paris" * 1000]
+    assert "completion_hash" not in items[0]
+    assert datetime.fromisoformat(items[0]["created_at"]).replace(tzinfo=timezone.utc) == start
+
+def test_export_writes_csv_with_a_header(session_factory):
+    ids = seed(session_factory)
+    evaluation_id = add_evaluation(session_factory, ids, scores={"accuracy": 1.0}, metadata_={"run": 1})
+
+    rows = list(csv.reader(io.StringIO("".join(export(session_factory, "csv", include=["metadata"])))))
+
+    header, row = rows
+    assert header[:3] == ["id", "model_id", "prompt_id"] and header[-1] == "metadata"
+    values = dict(zip(header, row))
+    assert (values["id"], values["scores"], values["metadata"]) == (evaluation_id, '{"accuracy": 1.0}', '{"run": 1}')
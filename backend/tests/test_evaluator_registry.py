@@ -0,0 +1,57 @@
+import pytest
+from app.core.exceptions import EvaluationError
+from app.evaluators import registry
+from app.evaluators.registry import EvaluatorPool, get_evaluator_class, is_supported
+from app.models.models import EvaluationType, Model
+
+created = []
+
+class StubEvaluator:
+    def __init__(self, model: Model):
+        self.model = model
+        created.append(self)
+
+@pytest.fixture(autouse=True)
+def stub_registry(monkeypatch):
+    created.clear()
+    monkeypatch.setitem(registry.EVALUATORS, EvaluationType.REASONING, f"{__name__}:StubEvaluator")
+    monkeypatch.setattr(registry, "_evaluator_classes", {})
+
+def make_model(model_id: str) -> Model:
+    return Model(id=model_id, name=model_id, provider="openai", parameters={})
+
+def test_evaluator_classes_resolve_lazily_from_their_path():
+    assert is_supported(EvaluationType.REASONING)
+    assert not is_supported(EvaluationType.MATH)
+    assert registry._evaluator_classes == {}
+
+    assert get_evaluator_class(EvaluationType.REASONING) is StubEvaluator
+    assert registry._evaluator_classes == {EvaluationType.REASONING: StubEvaluator}
+
+def test_unsupported_type_raises():
+    with pytest.raises(EvaluationError):
+        get_evaluator_class(EvaluationType.MATH)
+
+def test_pool_reuses_warm_evaluators_with_the_callers_model():
+    pool = EvaluatorPool(max_size=2)
+    model = make_model("m1")
+    reloaded = make_model("m1")
+
+    first = pool.get(EvaluationType.REASONING, model)
+    second = pool.get(EvaluationType.REASONING, reloaded)
+
+    assert first is second
+    assert second.model is reloaded
+    assert len(created) == 1
+    assert pool.stats()["hits"] == 1
+
+def test_pool_evicts_least_recently_used():
+    pool = EvaluatorPool(max_size=2)
+    first = pool.get(EvaluationType.REASONING, make_model("m1"))
+    pool.get(EvaluationType.REASONING, make_model("m2"))
+    pool.get(EvaluationType.REASONING, make_model("m1"))
+    pool.get(EvaluationType.REASONING, make_model("m3"))
+
+    assert pool.get(EvaluationType.REASONING, make_model("m1")) is first
+    assert pool.stats()["evictions"] == 1
+    assert len(created) == 3
@@ -0,0 +1,148 @@
+import asyncio
+import threading
+from typing import List
+import numpy as np
+import pytest
+from app.evaluators import factual_qa
+from app.evaluators.embedding_cache import EmbeddingCache
+from app.evaluators.embeddings import EmbeddingModelRegistry
+from app.evaluators.factual_qa import FactualQAEvaluator
+from app.models.models import Model, Prompt
+from app.services import openai as openai_service
+from app.services.completion_cache import CachedCompletion, CompletionCache
+from app.services.single_flight import SingleFlight
+
+class RecordingModel:
+    """Embeds a text as its length and vowel count, normalized."""
+
+    def __init__(self):
+        self.batches: List[List[str]] = []
+        self.threads: List[threading.Thread] = []
+
+    def encode(self, texts, normalize_embeddings: bool = False, **kwargs):
+        self.batches.append(list(texts))
+        self.threads.append(threading.current_thread())
+        vectors = np.array([[len(t) + 1.0, sum(c in "aeiou" for c in t)] for t in texts], dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+@pytest.fixture
+def embedding_model(monkeypatch) -> RecordingModel:
+    model = RecordingModel()
+    monkeypatch.setattr(factual_qa, "embedding_registry", EmbeddingModelRegistry(loader=lambda name, backend: model))
+    monkeypatch.setattr(factual_qa, "embedding_cache", EmbeddingCache(cache_type="memory", size_limit=1024 ** 2))
+    return model
+
+@pytest.fixture
+def evaluator(embedding_model: RecordingModel) -> FactualQAEvaluator:
+    return FactualQAEvaluator(Model(id="m1", name="gpt-4", provider="openai", parameters={}))
+
+def test_scoring_encodes_completion_and_expected_once(evaluator: FactualQAEvaluator, embedding_model: RecordingModel):
+    metrics = asyncio.run(evaluator.calculate_metrics("Paris is the capital", "Paris"))
+
+    assert embedding_model.batches == [["Paris is the capital", "Paris"]]
+    assert metrics["contradiction_score"] == pytest.approx(1.0 - metrics["semantic_similarity"])
+
+def test_scoring_reuses_cached_expected_embedding(evaluator: FactualQAEvaluator, embedding_model: RecordingModel):
+    asyncio.run(evaluator.calculate_metrics("Paris is the capital", "Paris"))
+    asyncio.run(evaluator.calculate_metrics("It is Paris", "Paris"))
+
+    assert embedding_model.batches[1] == ["It is Paris"]
+
+def test_prompt_metadata_supplies_expected_answer(evaluator: FactualQAEvaluator):
+    prompt = Prompt(content="Capital of France?", metadata_={"expected_answer": "Paris"})
+
+    assert evaluator.get_expected(prompt) == "Paris"
+
+@pytest.mark.parametrize("completion, expected", [
+    ("Paris is the capital", "Paris"),
+    ("The capital is Lyon", "paris france"),
+    ("Paris", "   "),
+])
+def test_batch_and_single_scoring_agree(evaluator: FactualQAEvaluator, completion: str, expected: str):
+    prompt = Prompt(content="Capital of France?", metadata_={"expected_answer": expected})
+
+    single = asyncio.run(evaluator.calculate_metrics(completion, expected))
+    batch = asyncio.run(evaluator.evaluate_batch([prompt], [completion]))[0]
+
+    assert batch["answer_presence"] == single["answer_presence"]
+    # The second call reads the expected answer's embedding from the float16 cache
+    assert batch == pytest.approx(single, abs=1e-3)
+
+def test_expected_answer_without_tokens_scores_zero_presence(evaluator: FactualQAEvaluator):
+    assert evaluator._check_answer_presence("Paris", "   ") == 0.0
+    assert list(evaluator._batch_answer_presence(["Paris", "Paris"], ["   ", "paris"])) == [0.0, 1.0]
+
+def test_embedding_work_runs_off_the_event_loop_thread(evaluator: FactualQAEvaluator, embedding_model: RecordingModel, monkeypatch):
+    prompt = Prompt(content="Capital of France?", metadata_={"expected_answer": "Paris"})
+    cache_threads: List[threading.Thread] = []
+    cache = factual_qa.embedding_cache
+    for name in ["get", "set", "get_many", "set_many"]:
+        def record(*args, method=getattr(cache, name), **kwargs):
+            cache_threads.append(threading.current_thread())
+            return method(*args, **kwargs)
+        monkeypatch.setattr(cache, name, record)
+
+    async def score() -> threading.Thread:
+        await evaluator.calculate_metrics("Paris is the capital", "Paris")
+        await evaluator.validate_response("Rome", "Rome is the capital")
+        await evaluator.evaluate_batch([prompt], ["It is Paris"])
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(score())
+
+    assert len(embedding_model.threads) == 3
+    assert loop_thread not in embedding_model.threads
+    assert cache_threads and loop_thread not in cache_threads
+
+@pytest.fixture
+def provider_calls(monkeypatch) -> List[tuple]:
+    """Completion requests that reached the stubbed OpenAI API."""
+    calls: List[tuple] = []
+
+    async def create_completion(model_name, messages, temperature, max_tokens, stream, params) -> CachedCompletion:
+        calls.append((model_name, temperature, max_tokens, params))
+        await asyncio.sleep(0.01)
+        return CachedCompletion("Paris", 10, 2)
+
+    cache = CompletionCache(backend="memory", max_temperature=0.0, enabled=True)
+    monkeypatch.setattr(openai_service, "_create_completion", create_completion)
+    monkeypatch.setattr(openai_service, "completion_cache", cache)
+    monkeypatch.setattr(openai_service, "single_flight", SingleFlight(cache, enabled=True))
+    monkeypatch.setattr(openai_service.settings, "OPENAI_API_KEY", "test-key")
+    return calls
+
+def make_evaluator(**parameters) -> FactualQAEvaluator:
+    return FactualQAEvaluator(Model(id="m1", name="gpt-4", provider="openai", parameters={"model_name": "gpt-4o", **parameters}))
+
+def test_deterministic_completions_are_served_from_the_cache(embedding_model, provider_calls: List[tuple]):
+    evaluator = make_evaluator(temperature=0, max_tokens=64, seed=7)
+    prompt = Prompt(content="Capital of France?", metadata_={"expected_answer": "Paris"})
+
+    async def complete_twice() -> List[str]:
+        return [await evaluator.get_completion(prompt), await evaluator.get_completion(prompt)]
+
+    assert asyncio.run(complete_twice()) == ["Paris", "Paris"]
+    assert provider_calls == [("gpt-4o", 0, 64, {"seed": 7})]
+    assert openai_service.completion_cache.stats()["memory_hits"] == 1
+
+def test_sampled_completions_are_not_cached(embedding_model, provider_calls: List[tuple]):
+    evaluator = make_evaluator()
+    prompt = Prompt(content="Capital of France?", metadata_={"expected_answer": "Paris"})
+
+    async def complete_twice() -> List[str]:
+        return [await evaluator.get_completion(prompt), await evaluator.get_completion(prompt)]
+
+    asyncio.run(complete_twice())
+
+    assert [call[1] for call in provider_calls] == [0.7, 0.7]
+
+def test_overlapping_deterministic_completions_share_one_call(embedding_model, provider_calls: List[tuple]):
+    evaluator = make_evaluator(temperature=0)
+    prompt = Prompt(content="Capital of France?", metadata_={"expected_answer": "Paris"})
+
+    async def complete_together() -> List[str]:
+        return await asyncio.gather(*(evaluator.get_completion(prompt) for _ in range(5)))
+
+    assert asyncio.run(complete_together()) == ["Paris"] * 5
+    assert len(provider_calls) == 1
+    assert openai_service.single_flight.stats()["local_coalesced"] == 4
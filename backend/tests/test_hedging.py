@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from app.services.completion_cache import CachedCompletion
+from models.hedging import Hedger
+
+def make_hedger(**options) -> Hedger:
+    defaults = dict(percentile=0.9, min_delay=0.01, default_delay=0.05, min_samples=5, window=10)
+    return Hedger(**{**defaults, **options})
+
+def respond(text: str, seconds: float, cancelled: list = None):
+    async def call() -> CachedCompletion:
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(text)
+            raise
+        return CachedCompletion(text, 20, 5)
+    return call
+
+def fail(seconds: float):
+    async def call() -> CachedCompletion:
+        await asyncio.sleep(seconds)
+        raise RuntimeError("provider down")
+    return call
+
+def test_fast_primary_is_not_hedged():
+    hedger = make_hedger()
+    backup_calls = []
+
+    async def backup() -> CachedCompletion:
+        backup_calls.append(1)
+        return CachedCompletion("backup")
+
+    model, result = asyncio.run(hedger.race(("gpt-4", respond("primary", 0.0)), ("gpt-4", backup)))
+
+    assert (model, result.text) == ("gpt-4", "primary")
+    assert not backup_calls
+    assert hedger.stats()["hedged"] == 0
+
+def test_slow_primary_is_hedged_and_cancelled():
+    hedger = make_hedger()
+    cancelled = []
+
+    model, result = asyncio.run(hedger.race(
+        ("gpt-4", respond("primary", 1.0, cancelled)),
+        ("claude-3-opus", respond("backup", 0.0)),
+    ))
+
+    assert (model, result.text) == ("claude-3-opus", "backup")
+    assert cancelled == ["primary"]
+    stats = hedger.stats()
+    assert stats["hedge_rate"] == 1.0
+    assert stats["hedge_wins"] == 1
+    assert stats["wasted_prompt_tokens"] == 20
+    assert stats["wasted_cost"] == pytest.approx(20 * 0.01 / 1000 + 5 * 0.03 / 1000)
+
+def test_primary_wins_if_backup_fails():
+    hedger = make_hedger()
+
+    model, result = asyncio.run(hedger.race(("gpt-4", respond("primary", 0.1)), ("gpt-4", fail(0.0))))
+
+    assert result.text == "primary"
+    assert hedger.stats()["hedge_wins"] == 0
+
+def test_primary_error_is_raised_if_both_fail():
+    hedger = make_hedger()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(hedger.race(("gpt-4", fail(0.1)), ("gpt-4", fail(0.0))))
+
+def test_delay_follows_the_latency_percentile():
+    hedger = make_hedger()
+    assert hedger.delay("gpt-4") == 0.05
+
+    for seconds in [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]:
+        hedger.observe("gpt-4", seconds)
+
+    assert hedger.delay("gpt-4") == 1.0
+    hedger.percentile = 0.5
+    assert hedger.delay("gpt-4") == 0.6
@@ -0,0 +1,142 @@
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import List
+import pytest
+from sqlalchemy import create_engine, insert, inspect, select, text
+from sqlalchemy.orm import Session
+from app.analytics.export import dataset_path, write_watermark
+from app.analytics.reader import query_evaluations
+from app.core import partitions
+from app.core.database import Base
+from app.core.partitions import Partition, add_months, month_start, partition_name
+from app.models.models import DetachedPartition, Evaluation, EvaluationScore, EvaluationType, Model, ModelProvider, Prompt
+
+NOW = datetime.now(timezone.utc)
+
+class RecordingConnection:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/evaluations.db")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+def utc(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+def test_month_arithmetic():
+    assert month_start(datetime(2026, 12, 31, 23, 59)) == date(2026, 12, 1)
+    assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert partition_name(date(2027, 2, 1)) == "evaluations_y2027m02"
+
+def test_partition_bounds_are_parsed():
+    assert partitions._parse_bound("'2026-10-01 00:00:00+00'") == datetime(2026, 10, 1, tzinfo=timezone.utc)
+    assert partitions._parse_bound("'2026-10-01 00:00:00'") == datetime(2026, 10, 1, tzinfo=timezone.utc)
+    assert partitions._parse_bound("MINVALUE") is None
+
+def test_partitions_are_created_from_the_last_one_through_months_ahead(monkeypatch):
+    current = month_start(NOW)
+    monkeypatch.setattr(partitions, "list_partitions", lambda conn: [
+        Partition("evaluations_legacy", None, utc(current)),
+        Partition(partition_name(current), utc(current), utc(add_months(current, 1))),
+        Partition("evaluations_default", None, None),
+    ])
+    conn = RecordingConnection()
+
+    created = partitions.ensure_partitions(conn, months_ahead=2)
+
+    assert created == [partition_name(add_months(current, 1)), partition_name(add_months(current, 2))]
+    assert f"FROM ('{add_months(current, 2).isoformat()}') TO ('{add_months(current, 3).isoformat()}')" in conn.statements[-1]
+
+def test_detached_partitions_are_recorded_in_the_detaching_transaction():
+    conn = RecordingConnection()
+
+    partitions.detach_partition(conn, "evaluations_y2025m01")
+
+    assert conn.statements == [
+        "INSERT INTO detached_partitions (name) VALUES (:name)",
+        'ALTER TABLE evaluations DETACH PARTITION "evaluations_y2025m01"',
+    ]
+
+def add_archived_month(engine, table_name: str, created_at: datetime) -> List[str]:
+    """Rows in evaluations, copied to table_name as if it were a detached partition."""
+    with Session(engine) as db:
+        model = Model(id="m1", name="gpt-4", provider=ModelProvider.OPENAI, parameters={})
+        prompt = Prompt(content="Capital of France?", type=EvaluationType.FACTUAL_QA, metadata_={})
+        evaluations = [
+            Evaluation(model=model, prompt=prompt, completion="Paris", scores={"accuracy": 1.0}, metadata_={"run": 1}, created_at=created_at),
+            Evaluation(model=model, prompt=prompt, completion_hash="abc", completion_size=5000, created_at=created_at + timedelta(days=1)),
+        ]
+        db.add_all(evaluations)
+        db.flush()
+        db.add_all([
+            EvaluationScore(evaluation_id=evaluation.id, metric="accuracy", value=1.0, model_id="m1")
+            for evaluation in evaluations
+        ])
+        db.commit()
+        ids = [evaluation.id for evaluation in evaluations]
+    with engine.begin() as conn:
+        conn.execute(text(f'CREATE TABLE "{table_name}" AS SELECT * FROM evaluations'))
+    return ids
+
+def test_archive_writes_every_column_needed_to_restore_rows(engine, tmp_path):
+    root = str(tmp_path)
+    ids = add_archived_month(engine, "evaluations_y2025m01", datetime(2025, 1, 10, tzinfo=timezone.utc))
+
+    with engine.connect() as conn:
+        assert partitions.archive_table(conn, "evaluations_y2025m01", root) == 2
+
+    frame = query_evaluations(root=root, archive=True).sort_values("created_at")
+    assert list(frame["id"]) == ids
+    assert set(frame["month"]) == {"2025-01"}
+    assert list(frame["evaluation_type"]) == ["factual_qa"] * 2
+    assert json.loads(frame["scores"].iloc[0]) == {"accuracy": 1.0}
+    assert json.loads(frame["metadata"].iloc[0]) == {"run": 1}
+    assert frame["completion"].iloc[0] == "Paris"
+    assert (frame["completion_hash"].iloc[1], frame["completion_size"].iloc[1]) == ("abc", 5000)
+
+@pytest.mark.parametrize("exported", [True, False])
+def test_expired_partitions_are_archived_once_exported(engine, tmp_path, monkeypatch, exported: bool):
+    root = str(tmp_path)
+    cutoff = add_months(month_start(NOW), -12)
+    expired_start = add_months(cutoff, -1)
+    ids = add_archived_month(engine, partition_name(expired_start), utc(expired_start))
+    attached = [
+        Partition(partition_name(expired_start), utc(expired_start), utc(cutoff)),
+        Partition(partition_name(cutoff), utc(cutoff), utc(add_months(cutoff, 1))),
+        Partition("evaluations_default", None, None),
+    ]
+    detached: List[str] = []
+
+    def detach(conn, name: str) -> None:
+        conn.execute(insert(DetachedPartition).values(name=name))
+        detached.append(name)
+
+    monkeypatch.setattr(partitions, "list_partitions", lambda conn: attached)
+    monkeypatch.setattr(partitions, "detach_partition", detach)
+    # SQLite's schema is "main"
+    monkeypatch.setattr(partitions, "list_detached", lambda conn: [("main", name) for name in detached])
+    if exported:
+        os.makedirs(dataset_path(root))
+        write_watermark(dataset_path(root), utc(cutoff), "last")
+
+    result = partitions.archive_expired_partitions(engine, retention_months=12, root=root)
+
+    if not exported:
+        assert result == {"archived": []}
+        assert detached == []
+        return
+    assert result == {"archived": [{"partition": partition_name(expired_start), "rows": 2}]}
+    assert partition_name(expired_start) not in inspect(engine).get_table_names()
+    with engine.connect() as conn:
+        assert conn.execute(select(EvaluationScore.evaluation_id)).all() == []
+        assert conn.execute(select(DetachedPartition.name)).all() == []
+    assert sorted(query_evaluations(["id"], root=root, archive=True)["id"]) == sorted(ids)
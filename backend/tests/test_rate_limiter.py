@@ -0,0 +1,75 @@
+import asyncio
+import time
+from pathlib import Path
+import pytest
+from app.core.exceptions import RateLimitError
+from app.services.rate_limiter import AIMDLimit, RateLimiter, _take
+
+def test_bucket_refills_at_the_configured_rate():
+    state, wait = _take(None, 0.0, 60, 0, 0, burst=2)
+    assert wait == 0
+    state, wait = _take(state, 0.0, 60, 0, 0, burst=2)
+    assert wait == 0
+    state, wait = _take(state, 0.0, 60, 0, 0, burst=2)
+    assert wait == pytest.approx(1.0)
+    state, wait = _take(state, 1.0, 60, 0, 0, burst=2)
+    assert wait == 0
+
+def test_token_budget_limits_large_requests():
+    state, wait = _take(None, 0.0, 0, 6000, 1000, burst=10)
+    assert wait == 0
+    state, wait = _take(state, 0.0, 0, 6000, 1000, burst=10)
+    assert wait == pytest.approx(10.0)
+
+def test_aimd_increases_on_success_and_backs_off_once_per_cooldown():
+    async def run() -> AIMDLimit:
+        limit = AIMDLimit(initial=4, minimum=1, maximum=8, backoff=0.5, cooldown=60)
+        for _ in range(4):
+            await limit.acquire()
+            await limit.release("success")
+        assert limit.limit == pytest.approx(4.9, abs=0.05)
+        for _ in range(3):
+            await limit.acquire()
+            await limit.release("congestion")
+        return limit
+
+    limit = asyncio.run(run())
+
+    assert limit.limit == pytest.approx(2.45, abs=0.05)
+    assert limit.in_flight == 0
+
+def test_calls_wait_for_capacity():
+    limiter = RateLimiter(limits={"openai": {"rpm": 600}}, backend="memory", headroom=1.0, burst_seconds=0.1)
+
+    async def call():
+        async with limiter.limit("openai", "gpt-4", 100):
+            pass
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(4)))
+
+    started = time.monotonic()
+    asyncio.run(run())
+
+    # One call per 0.1s after the first
+    assert time.monotonic() - started >= 0.3
+    assert limiter.stats()["openai:gpt-4"]["calls"] == 4
+    assert limiter.stats()["openai:gpt-4"]["throttled"] >= 3
+
+def test_workers_share_the_bucket_and_a_429_pauses_it(tmp_path: Path):
+    limits = {"openai:gpt-4": {"rpm": 60, "tpm": 0}}
+    first = RateLimiter(limits=limits, backend="filesystem", directory=str(tmp_path), headroom=1.0, burst_seconds=1)
+    second = RateLimiter(limits=limits, backend="filesystem", directory=str(tmp_path), headroom=1.0, burst_seconds=1)
+
+    async def rate_limited():
+        async with first.limit("openai", "gpt-4", 10):
+            raise RateLimitError("openai")
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(rate_limited())
+
+    # The first call took the only request; the penalty adds two seconds more
+    state = second.store.get("ratelimit:v1:openai:gpt-4")
+    _, wait = _take(state, state[2], 60, 0, 0, burst=1)
+    assert wait == pytest.approx(3.0)
+    assert first.stats()["openai:gpt-4"]["congestion"] == 1
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+from typing import List
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from app.core.database import Base
+from app.evaluators import reference_embeddings
+from app.evaluators.reference_embeddings import EMBED_PROMPTS_TASK, register_ingest_hooks
+from app.models.models import EvaluationType, Prompt
+
+class IngestSession(Session):
+    pass
+
+@pytest.fixture
+def publishing_threads() -> List[threading.Thread]:
+    return []
+
+@pytest.fixture
+def sent(monkeypatch, publishing_threads: List[threading.Thread]) -> List[tuple]:
+    sent: List[tuple] = []
+
+    def send_task(name, args) -> None:
+        publishing_threads.append(threading.current_thread())
+        sent.append((name, args))
+
+    monkeypatch.setattr(reference_embeddings.celery_app, "send_task", send_task)
+    return sent
+
+def make_factory():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    factory = async_sessionmaker(engine, expire_on_commit=False, sync_session_class=IngestSession)
+    return engine, factory
+
+register_ingest_hooks(make_factory()[1])
+
+def test_prompts_written_through_async_sessions_are_embedded(sent: List[tuple], publishing_threads: List[threading.Thread]):
+    engine, factory = make_factory()
+    loop_threads: List[threading.Thread] = []
+
+    async def run() -> List[str]:
+        loop_threads.append(threading.current_thread())
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with factory() as db:
+            prompts = [
+                Prompt(content="Capital of France?", type=EvaluationType.FACTUAL_QA, metadata_={"expected_answer": "Paris"}),
+                Prompt(content="Write a poem", type=EvaluationType.SAFETY, metadata_={}),
+            ]
+            db.add_all(prompts)
+            await db.commit()
+            return [prompt.id for prompt in prompts]
+
+    # asyncio.run waits for the default executor, which publishes the task
+    prompt_ids = asyncio.run(run())
+
+    assert sent == [(EMBED_PROMPTS_TASK, [[prompt_ids[0]]])]
+    assert publishing_threads[0] is not loop_threads[0]
+
+def test_rolled_back_prompts_are_not_embedded(sent: List[tuple]):
+    engine, factory = make_factory()
+
+    async def run() -> None:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with factory() as db:
+            db.add(Prompt(content="Capital of Italy?", type=EvaluationType.FACTUAL_QA, metadata_={"expected_answer": "Rome"}))
+            await db.flush()
+            await db.rollback()
+
+    asyncio.run(run())
+
+    assert sent == []
+
+def test_async_factory_needs_its_own_session_class():
+    with pytest.raises(ValueError):
+        register_ingest_hooks(async_sessionmaker(create_async_engine("sqlite+aiosqlite://")))
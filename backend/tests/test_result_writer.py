@@ -0,0 +1,149 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from app.core.database import Base
+from app.evaluators.writer import EvaluationResultWriter
+from app.models.models import Evaluation, EvaluationScore, EvaluationType, Model, ModelProvider, Prompt
+
+class Unserializable:
+    pass
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/evaluations.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+@pytest.fixture
+def unavailable(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/missing/evaluations.db")
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+@pytest.fixture
+def make_writer(session_factory):
+    writers: List[EvaluationResultWriter] = []
+
+    def make(**options) -> EvaluationResultWriter:
+        options = {"session_factory": session_factory, "batch_size": 1000, "flush_interval": 3600, **options}
+        writer = EvaluationResultWriter(**options)
+        writers.append(writer)
+        return writer
+
+    yield make
+    for writer in writers:
+        writer._stopped.set()
+        writer._wakeup.set()
+
+def add_evaluations(db: Session, count: int, **values) -> List[str]:
+    model = Model(name="gpt-4", provider=ModelProvider.OPENAI, parameters={})
+    prompt = Prompt(content="Capital of France?", type=EvaluationType.FACTUAL_QA, metadata_={})
+    evaluations = [Evaluation(model=model, prompt=prompt, **values) for _ in range(count)]
+    db.add_all(evaluations)
+    db.commit()
+    return [evaluation.id for evaluation in evaluations]
+
+def stored(db: Session) -> Dict[str, Evaluation]:
+    db.expire_all()
+    return {evaluation.id: evaluation for evaluation in db.query(Evaluation).all()}
+
+def test_flush_writes_results_and_scores(session_factory, make_writer):
+    db = session_factory()
+    ids = add_evaluations(db, 2)
+    writer = make_writer()
+    writer.add(ids[0], completion="Paris", scores={"accuracy": 1.0, "label": "ok"})
+    writer.add(ids[1], error="boom")
+
+    assert writer.flush() == 2
+
+    rows = stored(db)
+    assert (rows[ids[0]].completion, rows[ids[0]].scores) == ("Paris", {"accuracy": 1.0, "label": "ok"})
+    assert rows[ids[1]].error == "boom"
+    assert [(s.evaluation_id, s.metric, s.value) for s in db.query(EvaluationScore)] == [(ids[0], "accuracy", 1.0)]
+
+def test_rows_that_cannot_be_written_are_dropped_and_marked(session_factory, make_writer):
+    db = session_factory()
+    ids = add_evaluations(db, 5)
+    writer = make_writer()
+    for evaluation_id in ids:
+        writer.add(evaluation_id, completion=f"answer {evaluation_id}", scores={"accuracy": 0.5})
+    writer.add(ids[2], scores={"accuracy": Unserializable()})
+
+    assert writer.flush() == 4
+
+    rows = stored(db)
+    assert {evaluation_id for evaluation_id, row in rows.items() if row.completion} == set(ids) - {ids[2]}
+    assert rows[ids[2]].completion is None
+    assert rows[ids[2]].error.startswith("Failed to write result:")
+    assert writer.stats()["dropped_rows"] == 1
+    assert writer.stats()["buffered"] == 0
+
+def test_results_are_kept_while_the_database_is_unavailable(session_factory, unavailable, make_writer):
+    db = session_factory()
+    ids = add_evaluations(db, 2)
+    writer = make_writer(session_factory=unavailable, max_attempts=3)
+    writer.add(ids[0], completion="Paris")
+    writer.add(ids[1], completion="Rome")
+
+    assert writer.flush() == 0
+    writer.add(ids[1], completion="Rome, Italy")
+    writer.session_factory = session_factory
+
+    assert writer.flush() == 2
+    rows = stored(db)
+    # The newer value buffered during the outage wins
+    assert (rows[ids[0]].completion, rows[ids[1]].completion) == ("Paris", "Rome, Italy")
+    assert writer.stats()["failed_flushes"] == 1
+
+def test_results_are_dropped_after_max_attempts(session_factory, unavailable, make_writer):
+    db = session_factory()
+    ids = add_evaluations(db, 1)
+    writer = make_writer(session_factory=unavailable, max_attempts=3)
+    writer.add(ids[0], completion="Paris")
+
+    for _ in range(3):
+        writer.flush()
+
+    assert writer.stats()["buffered"] == 0
+    assert writer.stats()["dropped_rows"] == 1
+
+def test_full_buffer_drops_the_oldest_result(make_writer):
+    writer = make_writer(max_buffer=2)
+    writer.add("e1", completion="a")
+    writer.add("e2", completion="b")
+    writer.add("e2", error=None)
+    writer.add("e3", completion="c")
+
+    assert list(writer._buffer) == ["e2", "e3"]
+    assert writer.stats()["dropped_rows"] == 1
+
+def test_ensure_written_reports_results_still_buffered(session_factory, unavailable, make_writer):
+    db = session_factory()
+    ids = add_evaluations(db, 2)
+    writer = make_writer(session_factory=unavailable)
+    writer.add(ids[0], completion="Paris")
+    writer.add(ids[1], completion="Rome")
+
+    assert writer.ensure_written([ids[0]]) == [ids[0]]
+    writer.session_factory = session_factory
+
+    assert writer.ensure_written(ids) == []
+    assert stored(db)[ids[1]].completion == "Rome"
+
+def test_results_are_matched_on_created_at_when_given(session_factory, make_writer):
+    db = session_factory()
+    created_at = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    ids = add_evaluations(db, 3, created_at=created_at)
+    writer = make_writer()
+    writer.add(ids[0], created_at=created_at, completion="Paris", scores={"accuracy": 1.0})
+    writer.add(ids[1], created_at=created_at - timedelta(days=1), completion="Lyon", scores={"accuracy": 0.0})
+    writer.add(ids[2], completion="Nice")
+
+    writer.flush()
+
+    rows = stored(db)
+    assert [rows[evaluation_id].completion for evaluation_id in ids] == ["Paris", None, "Nice"]
+    assert [(s.evaluation_id, s.value) for s in db.query(EvaluationScore)] == [(ids[0], 1.0)]
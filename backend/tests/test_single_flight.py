@@ -0,0 +1,89 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pytest
+from app.services.completion_cache import CachedCompletion, CompletionCache
+from app.services.single_flight import SingleFlight
+
+def make_single_flight(backend: str, directory: str = "") -> SingleFlight:
+    cache = CompletionCache(backend=backend, directory=directory or None, max_temperature=0.0, enabled=True)
+    return SingleFlight(cache, enabled=True, lease_seconds=5, wait_seconds=10, result_ttl=5)
+
+def test_concurrent_calls_in_process_share_one_call():
+    single_flight = make_single_flight("memory")
+    calls = []
+
+    async def call() -> CachedCompletion:
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return CachedCompletion("Paris", 20, 5)
+
+    async def run():
+        return await asyncio.gather(*(single_flight.do("key", call) for _ in range(10)))
+
+    results = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert all(result.text == "Paris" for result in results)
+    assert single_flight.stats()["local_coalesced"] == 9
+
+def test_leader_error_reaches_local_waiters():
+    single_flight = make_single_flight("memory")
+
+    async def call() -> CachedCompletion:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    async def run():
+        return await asyncio.gather(*(single_flight.do("key", call) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert single_flight.stats()["upstream_calls"] == 1
+
+def test_workers_share_one_call_through_lease(tmp_path: Path):
+    calls = []
+
+    def worker(delay: float) -> str:
+        # Separate instances stand in for separate worker processes
+        single_flight = make_single_flight("filesystem", str(tmp_path))
+
+        async def call() -> CachedCompletion:
+            calls.append(1)
+            await asyncio.sleep(0.5)
+            return CachedCompletion("Paris")
+
+        async def run() -> str:
+            await asyncio.sleep(delay)
+            return (await single_flight.do("key", call)).text
+
+        return asyncio.run(run())
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(executor.map(worker, [0.0, 0.1, 0.1]))
+
+    assert results == ["Paris"] * 3
+    assert len(calls) == 1
+
+def test_waiter_takes_over_when_leader_fails(tmp_path: Path):
+    leader = make_single_flight("filesystem", str(tmp_path))
+    waiter = make_single_flight("filesystem", str(tmp_path))
+
+    async def failing() -> CachedCompletion:
+        await asyncio.sleep(0.2)
+        raise RuntimeError("provider down")
+
+    async def succeeding() -> CachedCompletion:
+        return CachedCompletion("Paris")
+
+    async def run():
+        first = asyncio.create_task(leader.do("key", failing))
+        await asyncio.sleep(0.05)
+        second = await waiter.do("key", succeeding)
+        with pytest.raises(RuntimeError):
+            await first
+        return second
+
+    assert asyncio.run(run()).text == "Paris"
+    assert waiter.stats()["takeovers"] == 1